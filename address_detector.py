@@ -0,0 +1,270 @@
+import hashlib
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+# -----------------------------------------------------------------------------
+# Contract address detection.
+#
+# Only whitespace-separated words long enough to hold an address are scanned
+# by a single precompiled pattern; each candidate is then classified by
+# prefix/length and confirmed by actually decoding it (hex + EIP-55 checksum,
+# base58/base58check, SS58, bech32). Candidates that don't decode are dropped,
+# so ordinary words never reach CoinGecko.
+# -----------------------------------------------------------------------------
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+
+_BASE58_INDEX = {c: i for i, c in enumerate(BASE58_ALPHABET)}
+_BECH32_INDEX = {c: i for i, c in enumerate(BECH32_CHARSET)}
+
+CANDIDATE_PATTERN = re.compile(
+    r"\b(?:"
+    r"0x[0-9a-fA-F]{40}"                                    # EVM
+    r"|addr(?:_test)?1[" + BECH32_CHARSET + r"]{38,}"       # Cardano (bech32)
+    r"|[1-9A-HJ-NP-Za-km-z]{32,48}"                         # base58: Solana/pump.fun, Tron, Tezos, Polkadot
+    r")\b"
+)
+
+# Shortest candidate the pattern can match (a Solana address); shorter words are skipped
+MIN_CANDIDATE_LENGTH = 32
+
+# Tezos KT1 originated-contract base58check prefix
+_TEZOS_KT1_PREFIX = bytes((2, 90, 121))
+
+# Confidence per classification, which ranks the addresses of a message.
+# Checksummed formats are near-certain. An EVM address is checksummed when
+# written in mixed case (EIP-55); all-lowercase/uppercase hex carries no
+# checksum and ties with a pump.fun mint, so the one posted first wins. A
+# failed EIP-55 checksum means a mistyped address. Solana addresses have no
+# checksum, only a 32-byte length check.
+CONFIDENCE = {
+    "ethereum-checksummed": 1.0,
+    "ethereum": 0.95,
+    "ethereum-bad-checksum": 0.5,
+    "tron": 1.0,
+    "tezos": 1.0,
+    "cardano": 1.0,
+    "polkadot": 1.0,
+    "pump-fun": 0.95,
+    "solana": 0.8,
+}
+
+
+class Detection(NamedTuple):
+    address: str
+    platform: str
+    confidence: float
+    position: int
+
+
+def b58decode(value: str) -> bytes:
+    """Decodes a base58 string (Bitcoin alphabet). Raises ValueError on invalid characters."""
+    number = 0
+    for char in value:
+        digit = _BASE58_INDEX.get(char)
+        if digit is None:
+            raise ValueError(f"invalid base58 character {char!r}")
+        number = number * 58 + digit
+    body = number.to_bytes((number.bit_length() + 7) // 8, "big") if number else b""
+    leading_zeros = len(value) - len(value.lstrip("1"))
+    return b"\x00" * leading_zeros + body
+
+
+def _double_sha256(data: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def _b58check_payload(value: str):
+    """Returns the payload of a base58check string, or None if the checksum fails."""
+    raw = b58decode(value)
+    if len(raw) < 5:
+        return None
+    payload, checksum = raw[:-4], raw[-4:]
+    if _double_sha256(payload)[:4] != checksum:
+        return None
+    return payload
+
+
+def _is_tron(value: str) -> bool:
+    payload = _b58check_payload(value)
+    return payload is not None and len(payload) == 21 and payload[0] == 0x41
+
+
+def _is_tezos_contract(value: str) -> bool:
+    payload = _b58check_payload(value)
+    return payload is not None and len(payload) == 23 and payload[:3] == _TEZOS_KT1_PREFIX
+
+
+def _is_ss58(value: str) -> bool:
+    raw = b58decode(value)
+    # 1- or 2-byte network prefix + 32-byte public key + 2-byte checksum
+    if len(raw) not in (35, 36):
+        return False
+    data, checksum = raw[:-2], raw[-2:]
+    return hashlib.blake2b(b"SS58PRE" + data, digest_size=64).digest()[:2] == checksum
+
+
+def _is_solana(value: str) -> bool:
+    return len(b58decode(value)) == 32
+
+
+# Keccak-256 (the pre-standard SHA-3 padding used by Ethereum; hashlib's sha3_256 differs)
+_KECCAK_ROUND_CONSTANTS = (
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+)
+# Rotation offset of lane (x, y), indexed x + 5 * y
+_KECCAK_ROTATIONS = (0, 1, 62, 28, 27, 36, 44, 6, 55, 20, 3, 10, 43, 25, 39, 41, 45, 15, 21, 8, 18, 2, 61, 56, 14)
+_LANE_MASK = (1 << 64) - 1
+
+
+def _keccak_f(lanes: list) -> list:
+    for round_constant in _KECCAK_ROUND_CONSTANTS:
+        # theta
+        columns = [lanes[x] ^ lanes[x + 5] ^ lanes[x + 10] ^ lanes[x + 15] ^ lanes[x + 20] for x in range(5)]
+        for x in range(5):
+            right = columns[(x + 1) % 5]
+            mix = columns[(x - 1) % 5] ^ ((right << 1 | right >> 63) & _LANE_MASK)
+            for y in range(0, 25, 5):
+                lanes[x + y] ^= mix
+        # rho and pi
+        moved = [0] * 25
+        for x in range(5):
+            for y in range(5):
+                lane, shift = lanes[x + 5 * y], _KECCAK_ROTATIONS[x + 5 * y]
+                moved[y + 5 * ((2 * x + 3 * y) % 5)] = (lane << shift | lane >> (64 - shift)) & _LANE_MASK
+        # chi and iota
+        lanes = [moved[i] ^ (~moved[(i + 1) % 5 + i - i % 5] & moved[(i + 2) % 5 + i - i % 5]) for i in range(25)]
+        lanes[0] ^= round_constant
+    return lanes
+
+
+def keccak256(data: bytes) -> bytes:
+    """Keccak-256 digest, as used for EIP-55 address checksums."""
+    rate = 136
+    padded = bytearray(data) + b"\x01" + bytes((-len(data) - 1) % rate)
+    padded[-1] |= 0x80
+    lanes = [0] * 25
+    for start in range(0, len(padded), rate):
+        for i in range(rate // 8):
+            lanes[i] ^= int.from_bytes(padded[start + 8 * i:start + 8 * i + 8], "little")
+        lanes = _keccak_f(lanes)
+    return b"".join(lane.to_bytes(8, "little") for lane in lanes[:4])
+
+
+def _evm_classification(address: str) -> str:
+    hex_digits = address[2:]
+    if hex_digits == hex_digits.lower() or hex_digits == hex_digits.upper():
+        return "ethereum"       # no checksum
+    digest = keccak256(hex_digits.lower().encode()).hex()
+    for char, nibble in zip(hex_digits, digest):
+        if char.isalpha() and char.isupper() != (int(nibble, 16) >= 8):
+            return "ethereum-bad-checksum"
+    return "ethereum-checksummed"
+
+
+def _bech32_polymod(values) -> int:
+    generator = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+    checksum = 1
+    for value in values:
+        top = checksum >> 25
+        checksum = (checksum & 0x1FFFFFF) << 5 ^ value
+        for i in range(5):
+            if (top >> i) & 1:
+                checksum ^= generator[i]
+    return checksum
+
+
+def _is_bech32(value: str) -> bool:
+    # Cardano addresses exceed BIP-173's 90-character limit, so no length cap here.
+    hrp, separator, data = value.rpartition("1")
+    if not separator or not hrp or len(data) < 6:
+        return False
+    try:
+        values = [_BECH32_INDEX[c] for c in data]
+    except KeyError:
+        return False
+    expanded = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+    return _bech32_polymod(expanded + values) == 1
+
+
+def classify(candidate: str):
+    """
+    Classifies a single address-shaped string.
+
+    Returns:
+        str: The detected platform ("ethereum", "tron", "tezos", "cardano",
+             "polkadot", "pump-fun" or "solana"), or None if it does not decode.
+    """
+    classification = _classify(candidate)
+    return _platform(classification) if classification is not None else None
+
+
+def _platform(classification: str) -> str:
+    return "ethereum" if classification.startswith("ethereum") else classification
+
+
+@lru_cache(maxsize=4096)
+def _classify(candidate: str):
+    """
+    Classification of one candidate, a CONFIDENCE key or None. Results are
+    memoised, since the same hot contracts are posted over and over again.
+    """
+    if candidate.startswith("0x"):
+        return _evm_classification(candidate) if len(candidate) == 42 else None
+    if candidate.startswith("addr"):
+        return "cardano" if _is_bech32(candidate) else None
+
+    try:
+        length = len(candidate)
+        if length == 36 and candidate.startswith("KT1") and _is_tezos_contract(candidate):
+            return "tezos"
+        if length == 34 and candidate[0] == "T" and _is_tron(candidate):
+            return "tron"
+        if length in (47, 48) and _is_ss58(candidate):
+            return "polkadot"
+        if length <= 44 and _is_solana(candidate):
+            # pump.fun mints are Solana addresses vanity-ground to end in "pump"
+            return "pump-fun" if candidate.endswith("pump") else "solana"
+    except ValueError:
+        return None
+    return None
+
+
+def detect_addresses(text: str) -> list:
+    """
+    Scans text once and returns every distinct, decodable contract address.
+
+    Returns:
+        list[Detection]: Sorted by confidence (highest first), then by position in the text.
+    """
+    if not text:
+        return []
+    detections = []
+    seen = set()
+    offset = 0
+    # str.split() is several times faster than running the pattern over the
+    # whole text; words are whitespace-delimited, so \b matches the same way
+    for word in text.split():
+        if len(word) < MIN_CANDIDATE_LENGTH:
+            continue
+        offset = text.find(word, offset)
+        for match in CANDIDATE_PATTERN.finditer(word):
+            candidate = match.group(0)
+            key = candidate.lower() if candidate.startswith("0x") else candidate
+            if key in seen:
+                continue
+            seen.add(key)
+            classification = _classify(candidate)
+            if classification is not None:
+                detections.append(Detection(candidate, _platform(classification), CONFIDENCE[classification],
+                                            offset + match.start()))
+        offset += len(word)
+    detections.sort(key=lambda d: (-d.confidence, d.position))
+    return detections
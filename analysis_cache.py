@@ -0,0 +1,224 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from prompt_builder import count_tokens
+
+# Analysis cache settings, overridable from the .env file
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "256"))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", "600"))
+ANALYSIS_CACHE_PRICE_TOLERANCE = float(os.getenv("ANALYSIS_CACHE_PRICE_TOLERANCE", "0.02"))      # relative
+ANALYSIS_CACHE_MCAP_TOLERANCE = float(os.getenv("ANALYSIS_CACHE_MCAP_TOLERANCE", "0.05"))        # relative
+ANALYSIS_CACHE_CHANGE_TOLERANCE = float(os.getenv("ANALYSIS_CACHE_CHANGE_TOLERANCE", "5"))       # percentage points
+# USD per 1K tokens, used to estimate the LLM spend saved by cache hits
+LLM_PROMPT_COST_PER_1K = float(os.getenv("LLM_PROMPT_COST_PER_1K", "0.0005"))
+LLM_COMPLETION_COST_PER_1K = float(os.getenv("LLM_COMPLETION_COST_PER_1K", "0.0015"))
+
+
+def _log_bucket(value, tolerance):
+    """Buckets a positive value so that values within ~tolerance (relative) share a bucket."""
+    if not value or value <= 0:
+        return None
+    return round(math.log(value) / math.log1p(tolerance))
+
+
+def _linear_bucket(value, tolerance):
+    if value is None:
+        return None
+    return round(value / tolerance)
+
+
+def _estimate_cost(prompt_tokens, completion_tokens):
+    return (prompt_tokens * LLM_PROMPT_COST_PER_1K + completion_tokens * LLM_COMPLETION_COST_PER_1K) / 1000
+
+
+class AnalysisCache:
+    """
+    Caches finished LLM analyses keyed on the contract plus a quantized
+    market state (price, market cap and 24h change buckets).
+
+    A repeat call for the same contract while the market has barely moved
+    reuses the stored analysis instead of paying for a new completion.
+    Concurrent misses for the same key share one completion. If the call
+    computing it is cancelled, a waiting caller takes over instead of
+    inheriting the cancellation.
+    """
+
+    def __init__(self, max_size=ANALYSIS_CACHE_SIZE, ttl=ANALYSIS_CACHE_TTL,
+                 price_tolerance=ANALYSIS_CACHE_PRICE_TOLERANCE, mcap_tolerance=ANALYSIS_CACHE_MCAP_TOLERANCE,
+                 change_tolerance=ANALYSIS_CACHE_CHANGE_TOLERANCE):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.price_tolerance = price_tolerance
+        self.mcap_tolerance = mcap_tolerance
+        self.change_tolerance = change_tolerance
+        self._entries = OrderedDict()   # key -> (analysis, created_at, cost)
+        self._inflight = {}             # key -> future resolved with the analysis text
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "handovers": 0, "evictions": 0,
+                      "saved_usd": 0.0}
+
+    def make_key(self, snapshot) -> tuple:
+        """Cache key for a TokenSnapshot: contract identity plus quantized market state."""
+        address = snapshot.contract_address or snapshot.coin_id or snapshot.name
+        if address and address.startswith("0x"):
+            address = address.lower()
+        return (
+            snapshot.platform,
+            address,
+            _log_bucket(snapshot.price, self.price_tolerance),
+            _log_bucket(snapshot.market_cap, self.mcap_tolerance),
+            _linear_bucket(snapshot.change_24h, self.change_tolerance),
+        )
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return (self.stats["hits"] + self.stats["coalesced"]) / lookups if lookups else 0.0
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, size=len(self._entries), hit_rate=self.hit_rate())
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[1] >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, analysis, prompt_tokens):
+        cost = _estimate_cost(prompt_tokens, count_tokens(analysis))
+        self._entries[key] = (analysis, time.time(), cost)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        return cost
+
+    @staticmethod
+    def with_cached_note(analysis: str, created_at: float) -> str:
+        stamp = datetime.fromtimestamp(created_at, timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+        return f"{analysis}\n\n♻️ Cached analysis from {stamp} - market state unchanged since."
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    async def _join(self, key, future) -> tuple:
+        """
+        Waits for the in-flight computation of key.
+
+        Returns:
+            tuple: (True, analysis) once it finished, or (False, None) if its caller was cancelled.
+        """
+        self.stats["coalesced"] += 1
+        try:
+            analysis = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise       # this caller was cancelled itself
+            self.stats["coalesced"] -= 1
+            self.stats["handovers"] += 1
+            return False, None
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.stats["saved_usd"] += entry[2]
+        return True, analysis
+
+    async def get_or_compute(self, key, compute, prompt_tokens: int = 0) -> str:
+        """
+        Returns the cached analysis for key, or awaits compute() to produce it.
+
+        Args:
+            key (tuple): From make_key().
+            compute (coroutine function): Zero-argument coroutine returning the analysis text.
+            prompt_tokens (int): Prompt size, used for the spend-saved estimate.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            self.stats["saved_usd"] += entry[2]
+            return self.with_cached_note(entry[0], entry[1])
+
+        # After a handover the first waiter to wake computes; the others join it
+        while key in self._inflight:
+            joined, analysis = await self._join(key, self._inflight[key])
+            if joined:
+                return analysis
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            analysis = await compute()
+            if analysis:
+                self._store(key, analysis, prompt_tokens)
+            future.set_result(analysis)
+            return analysis
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()      # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            if not future.done():
+                # Cancelled (or interrupted): waiters take over rather than inherit it
+                future.cancel()
+            self._inflight.pop(key, None)
+
+    async def stream_or_compute(self, key, stream, prompt_tokens: int = 0):
+        """
+        Streaming counterpart of get_or_compute().
+
+        Hits and coalesced misses yield the complete analysis as one chunk;
+        the leading miss yields chunks from stream() as they arrive and
+        stores the joined text once it completes.
+
+        Args:
+            key (tuple): From make_key().
+            stream (callable): Zero-argument callable returning an async iterator of text chunks.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            self.stats["saved_usd"] += entry[2]
+            yield self.with_cached_note(entry[0], entry[1])
+            return
+
+        while key in self._inflight:
+            joined, analysis = await self._join(key, self._inflight[key])
+            if joined:
+                if analysis:
+                    yield analysis
+                return
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        chunks = []
+        try:
+            async for chunk in stream():
+                chunks.append(chunk)
+                yield chunk
+            analysis = "".join(chunks)
+            if analysis:
+                self._store(key, analysis, prompt_tokens)
+            future.set_result(analysis)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                # Cancelled, or the generator was closed early by the consumer: waiters take over
+                future.cancel()
+            self._inflight.pop(key, None)
+
+
+# Shared cache used by gpt_actions
+analysis_cache = AnalysisCache()
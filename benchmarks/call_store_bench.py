@@ -0,0 +1,86 @@
+"""
+Benchmark for the call store.
+
+Records a large synthetic call history through the buffered write path,
+then times the performance queries (recent calls, returns since call,
+best/worst callers) and prints their query plans, to check that they
+stay fast with millions of rows.
+
+Usage (from the repository root):
+    python -m benchmarks.call_store_bench [--calls 2000000] [--contracts 50000] [--sources 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from call_store import CallStore
+from token_snapshot import TokenSnapshot
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(prefix="call_store_bench_"), "calls.sqlite3")
+    store = CallStore(db_path=path, batch_size=args.batch_size)
+    rng = random.Random(0)
+    contracts = ["0x%040x" % rng.getrandbits(160) for _ in range(args.contracts)]
+    base_prices = [10 ** rng.uniform(-8, 1) for _ in contracts]
+    now = time.time()
+
+    started = time.perf_counter()
+    for i in range(args.calls):
+        c = rng.randrange(args.contracts)
+        called_at = now - rng.uniform(0, args.days * 86400)
+        snapshot = TokenSnapshot(platform="ethereum", contract_address=contracts[c], coin_id=f"coin-{c}",
+                                 symbol=f"T{c}", price=base_prices[c] * rng.uniform(0.5, 2),
+                                 market_cap=1e6, total_volume=1e5, fetched_at=called_at)
+        store.record(rng.randrange(args.sources), i, snapshot, "analysis text", called_at)
+        if i % args.batch_size == 0:
+            await asyncio.sleep(0)      # let the background writer run, as the bot's event loop would
+    await store.flush()
+    elapsed = time.perf_counter() - started
+    print(f"recorded {args.calls} calls in {elapsed:.1f}s ({args.calls / elapsed:,.0f} calls/s, "
+          f"{store.stats['flushes']} batched writes)")
+
+    # Current prices, as the watchlist would report them
+    store.record_prices(("ethereum", contract, price * rng.uniform(0.2, 5), now)
+                        for contract, price in zip(contracts, base_prices))
+    await store.flush()
+    print(f"database size {os.path.getsize(path) / (1024 * 1024):.0f} MB")
+
+    queries = [
+        ("calls in the last 24h", store.recent_calls(24, limit=1000)),
+        ("calls by one chat, last 7 days", store.recent_calls(24 * 7, source_chat=7, limit=1000)),
+        ("returns since call, last 24h", store.call_returns(24, limit=1000)),
+        ("returns for one contract", store.call_returns(24 * args.days, contract=contracts[0])),
+        ("best callers, last 30 days", store.top_callers(24 * 30)),
+        ("worst callers, last 30 days", store.top_callers(24 * 30, worst=True)),
+    ]
+    for name, query in queries:
+        started = time.perf_counter()
+        rows = await query
+        print(f"{name:34s} {len(rows):5d} rows in {(time.perf_counter() - started) * 1000:8.1f}ms")
+
+    best = (await store.top_callers(24 * 30, limit=1))[0]
+    print(f"best caller: chat {best['source_chat']}, {best['calls']} calls, "
+          f"avg {best['avg_return_pct']:+.1f}%, win rate {best['win_rate']:.0%}")
+    for name, sql in (("recent", "SELECT * FROM calls WHERE called_at >= 0 ORDER BY called_at DESC LIMIT 10"),
+                      ("contract", "SELECT * FROM calls WHERE contract = 'x' AND called_at >= 0")):
+        plan = store._query("EXPLAIN QUERY PLAN " + sql)
+        print(f"plan ({name}):", "; ".join(row["detail"] for row in plan))
+    await store.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2_000_000)
+    parser.add_argument("--contracts", type=int, default=50_000)
+    parser.add_argument("--sources", type=int, default=200)
+    parser.add_argument("--days", type=float, default=90)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark of the chart backends: wall time and peak RSS per day/week/month chart set.
+
+The Selenium backend screenshots TradingView widgets in a pooled headless
+Chrome; the native backend draws candlesticks from CoinGecko OHLC in a
+process pool. Peak RSS covers this process and every child (Chrome,
+chromedriver, renderer processes) and needs psutil; without it only
+resource.getrusage figures are reported.
+
+Usage (from the repository root):
+    python -m benchmarks.chart_bench --backend native --symbol PEPEUSDT --runs 5
+    python -m benchmarks.chart_bench --backend native --synthetic --runs 20
+    python -m benchmarks.chart_bench --backend selenium --exchange BINANCE --symbol PEPEUSDT --runs 3
+    python -m benchmarks.chart_bench --backend native --symbol PEPEUSDT --runs 5 --cached
+"""
+import argparse
+import asyncio
+import random
+import resource
+import statistics
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+import chart_renderer
+
+
+class PeakRssSampler:
+    """Samples the RSS of this process tree in a background thread."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        root = psutil.Process()
+        total = 0
+        for process in [root] + root.children(recursive=True):
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        self.peak = max(self.peak, total)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if psutil is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if psutil is not None:
+            self._thread.join()
+
+
+def synthetic_ohlc(candles=180, start_price=1.0, seed=0):
+    rng = random.Random(seed)
+    rows, price, now = [], start_price, int(time.time() * 1000)
+    for i in range(candles):
+        open_ = price
+        close = max(1e-12, open_ * (1 + rng.gauss(0, 0.03)))
+        high = max(open_, close) * (1 + abs(rng.gauss(0, 0.01)))
+        low = min(open_, close) * (1 - abs(rng.gauss(0, 0.01)))
+        rows.append([now - (candles - i) * 4 * 3_600_000, open_, high, low, close])
+        price = close
+    return rows
+
+
+async def run_native_synthetic(symbol):
+    loop = asyncio.get_running_loop()
+    executor = chart_renderer._get_executor()
+    return await asyncio.gather(*(
+        loop.run_in_executor(executor, chart_renderer.render_candlestick_png, f"{symbol} - {suffix}",
+                             synthetic_ohlc(seed=i), chart_renderer.CHART_THEME)
+        for i, (suffix, _) in enumerate(chart_renderer.NATIVE_CHART_WINDOWS)))
+
+
+async def run_once(args):
+    if args.cached:
+        import get_charts
+        return await get_charts.generate_charts_async(args.exchange, args.symbol, backend=args.backend)
+    if args.backend == "native":
+        if args.synthetic:
+            return await run_native_synthetic(args.symbol)
+        return await chart_renderer.render_charts(args.symbol)
+    # Imported lazily: the Selenium backend pulls in selenium and webdriver_manager.
+    import get_charts
+    suffixes = tuple(suffix for _, suffix in get_charts.CHART_INTERVALS)
+    return await asyncio.to_thread(get_charts._render_tradingview, args.exchange, args.symbol, suffixes)
+
+
+async def main_async(args):
+    timings = []
+    with PeakRssSampler() as sampler:
+        for run in range(args.runs):
+            started = time.perf_counter()
+            result = await run_once(args)
+            timings.append(time.perf_counter() - started)
+            ok = sum(1 for chart in (result or ()) if chart)
+            print(f"run {run + 1}: {timings[-1]:.2f}s, {ok}/3 charts")
+    chart_renderer.shutdown()
+
+    mode = " (synthetic OHLC)" if args.synthetic else " (chart cache)" if args.cached else ""
+    print(f"\nBackend {args.backend}{mode}, {args.runs} runs")
+    print(f"  wall time: first {timings[0]:.2f}s, median {statistics.median(timings):.2f}s, "
+          f"max {max(timings):.2f}s")
+    if psutil is not None:
+        print(f"  peak RSS (process tree): {sampler.peak / (1024 * 1024):.0f} MB")
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(f"  getrusage max RSS: self {self_kb / 1024:.0f} MB, largest reaped child {children_kb / 1024:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("native", "selenium"), default="native")
+    parser.add_argument("--exchange", default="BINANCE")
+    parser.add_argument("--symbol", default="PEPEUSDT")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--synthetic", action="store_true", help="native only: render generated OHLC, no network")
+    parser.add_argument("--cached", action="store_true", help="go through the chart cache (repeat runs are hits)")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark for contract address detection.
+
+Compares the original per-pattern re.search loop from coin_info against the
+single-pass address_detector over a corpus of call messages (one JSON object
+per line with a "text" field) and reports the per-message cost.
+
+Usage (from the repository root):
+    python -m benchmarks.detector_bench [--corpus benchmarks/call_messages.jsonl] [--rounds 2000]
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+import address_detector
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "call_messages.jsonl")
+
+# The detection loop as it was in coin_info.get_token_info before address_detector.
+LEGACY_PATTERNS = {
+    "ethereum": r'\b0x[a-fA-F0-9]{40}\b',
+    "pump-fun":  r'\b[A-Za-z0-9]+pump\b',
+    "tezos":    r'\bKT1[1-9A-HJ-NP-Za-km-z]{33}\b',
+    "tron":     r'\bT[1-9A-HJ-NP-Za-km-z]{33}\b',
+    "cardano":  r'\b(?:addr1|addr_test1)[0-9a-z]{38,}\b',
+    "polkadot": r'\b[1-9A-HJ-NP-Za-km-z]{47,48}\b',
+    "solana":   r'\b[1-9A-HJ-NP-Za-km-z]{32,44}\b'
+}
+
+
+def legacy_detect(text):
+    for platform, pattern in LEGACY_PATTERNS.items():
+        match = re.search(pattern, text)
+        if match:
+            return [(match.group(0), platform)]
+    return []
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["text"] for line in f if line.strip()]
+
+
+def bench(name, detect, corpus, rounds):
+    found = sum(len(detect(text)) for text in corpus)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in corpus:
+            detect(text)
+    elapsed = time.perf_counter() - start
+    messages = rounds * len(corpus)
+    print(f"{name:<18} {elapsed / messages * 1e6:9.2f} us/message   "
+          f"{messages / elapsed:12.0f} messages/s   {found:4d} addresses per corpus pass")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    total_chars = sum(len(text) for text in corpus)
+    print(f"Corpus: {len(corpus)} messages, {total_chars / len(corpus):.0f} characters on average, {args.rounds} rounds")
+    bench("legacy re.search", legacy_detect, corpus, args.rounds)
+    bench("address_detector", address_detector.detect_addresses, corpus, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark for the indicator engine.
+
+Times a full computation over a long synthetic candle history and compares
+one-candle incremental updates against recomputing from scratch. The checks
+against loop-based reference implementations are in tests/test_indicators.py.
+
+Usage (from the repository root):
+    python -m benchmarks.indicator_bench [--candles 1000000] [--updates 1000]
+"""
+import argparse
+import time
+
+from indicators import IndicatorEngine
+from tests.synthetic import synthetic_ohlcv
+
+
+def bench(candles, updates, seed):
+    rows, volume = synthetic_ohlcv(candles + updates, seed)
+    history, history_volume = rows[:candles], volume[:candles]
+
+    started = time.perf_counter()
+    engine = IndicatorEngine()
+    engine.update(history, history_volume)
+    full = time.perf_counter() - started
+    print(f"\nFull computation, {candles} candles: {full * 1000:.1f} ms "
+          f"({full / candles * 1e9:.0f} ns/candle)")
+
+    started = time.perf_counter()
+    for i in range(candles, candles + updates):
+        engine.update(rows[i:i + 1], volume[i:i + 1])
+    incremental = (time.perf_counter() - started) / updates
+    print(f"Incremental update, 1 candle: {incremental * 1e6:.1f} µs "
+          f"(recomputing from scratch: {full * 1e6:.0f} µs, {full / incremental:.0f}x)")
+
+    started = time.perf_counter()
+    for _ in range(updates):
+        engine.table()
+    print(f"Prompt table: {(time.perf_counter() - started) / updates * 1e6:.1f} µs\n")
+    print(engine.table())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candles", type=int, default=1_000_000)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    bench(args.candles, args.updates, args.seed)
+
+
+if __name__ == "__main__":
+    main()
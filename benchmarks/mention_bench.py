@@ -0,0 +1,134 @@
+"""
+Benchmark and check for the local token-mention extractor.
+
+Builds a coin index the size of CoinGecko's coin list (synthetic coins plus
+a few well-known ones with shared symbols), times the automaton build and
+the per-message extraction over the call corpus, compares it with a naive
+scan that tests every vocabulary word against the message, and checks the
+expected resolution of a set of name-only messages.
+
+Usage (from the repository root):
+    python -m benchmarks.mention_bench [--coins 15000] [--rounds 200]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from coin_index import CoinIndex
+from mention_extractor import MentionExtractor
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "call_messages.jsonl")
+
+KNOWN_COINS = [
+    {"id": "ethereum", "symbol": "eth", "name": "Ethereum", "platforms": {}},
+    {"id": "binance-peg-ethereum", "symbol": "eth", "name": "Binance-Peg Ethereum",
+     "platforms": {"binance-smart-chain": "0x2170ed0880ac9a755fd29b2688956bd959f933f8"}},
+    {"id": "pepe", "symbol": "pepe", "name": "Pepe",
+     "platforms": {"ethereum": "0x6982508145454ce325ddbe47a25d4ec3d2311933"}},
+    {"id": "pepe-sol", "symbol": "pepe", "name": "Pepe (SOL)",
+     "platforms": {"solana": "F9CpWoyeBJfoRB8f2pBe2ZNPbPsEE76mWZWme3StsvHK"}},
+    {"id": "bonk", "symbol": "bonk", "name": "Bonk",
+     "platforms": {"solana": "DezXAZ8z7PHRQbb5NB7PZqU9rLXXhgbwSW7c7ZEL9qXP"}},
+    {"id": "dogwifcoin", "symbol": "wif", "name": "dogwifhat",
+     "platforms": {"solana": "EKpQGSJtjMFqKZ9KQanSqYXRcF8fBopzLHYxdM65zcjm"}},
+    {"id": "wif-on-eth", "symbol": "wif", "name": "WIF on ETH",
+     "platforms": {"ethereum": "0x4b2c3fa4e5b6c7d8e9f0a1b2c3d4e5f6a7b8c9d0"}},
+    {"id": "brett", "symbol": "brett", "name": "Brett",
+     "platforms": {"base": "0x532f27101965dd16442e59d40670faf5ebb142e4"}},
+    {"id": "tether", "symbol": "usdt", "name": "Tether",
+     "platforms": {"ethereum": "0xdac17f958d2ee523a2206206994597c13d831ec7",
+                   "tron": "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t"}},
+    {"id": "moon-token", "symbol": "moon", "name": "Moon Token", "platforms": {"base": "0x" + "1" * 40}},
+]
+RANKS = {"ethereum": 2, "tether": 3, "pepe": 25, "bonk": 60, "dogwifcoin": 80, "brett": 150,
+         "binance-peg-ethereum": 400, "pepe-sol": 3000}
+
+# (message, expected coin id or None, expected platform)
+EXPECTED = [
+    ("$PEPE just broke out, loading more", "pepe", "ethereum"),
+    ("Pepe on Solana is the play today", "pepe-sol", "solana"),
+    ("BONK reloading, bouncing off the 0.5 fib", "bonk", "solana"),
+    ("dogwifhat still has legs, ser", "dogwifcoin", "solana"),
+    ("$WIF on ETH sending", "wif-on-eth", "ethereum"),
+    ("Brett on Base looking strong, $BRETT to the moon", "brett", "base"),
+    ("Rotating into USDT on Tron", "tether", "tron"),
+    ("$ETH holding 3k, alts waiting", None, None),
+    ("gm ser, wen lambo, the chart is clean", None, None),
+    ("stealth launch of $MOON on Base in 10 minutes", "moon-token", "base"),
+]
+
+
+def synthetic_coins(count, rng):
+    syllables = ["ba", "ko", "ri", "zu", "me", "ta", "lo", "xi", "pu", "ne", "qua", "dor", "fin", "sol", "gra", "vex"]
+    platforms = ["ethereum", "solana", "binance-smart-chain", "base", "arbitrum-one", "tron"]
+    coins = []
+    for i in range(count):
+        word = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        name = word.capitalize() + rng.choice(["", " Inu", " Protocol", " AI", " Finance", " Token"])
+        coins.append({"id": f"{word}-{i}", "symbol": word[:rng.randint(3, 5)], "name": name,
+                      "platforms": {rng.choice(platforms): "0x%040x" % rng.getrandbits(160)}})
+    return coins
+
+
+def naive_extract(vocabulary, text):
+    # What a lookup without an automaton has to do: test every known word against the message
+    lowered = text.lower()
+    return [word for word in vocabulary if word in lowered]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--coins", type=int, default=15000)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    index = CoinIndex(snapshot_path="")
+    index.apply(synthetic_coins(args.coins, random.Random(0)) + KNOWN_COINS)
+    extractor = MentionExtractor(index=index)
+    extractor.ranks = dict(RANKS)
+
+    started = time.perf_counter()
+    extractor.build()
+    build_time = time.perf_counter() - started
+    print(f"{len(index)} coins: {extractor.automaton.patterns} patterns, {len(extractor.automaton)} nodes, "
+          f"built in {build_time:.2f}s")
+
+    with open(args.corpus, encoding="utf-8") as f:
+        messages = [json.loads(line)["text"] for line in f if line.strip()]
+    messages += [message for message, _, _ in EXPECTED]
+    chars = sum(len(message) for message in messages)
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        for message in messages:
+            extractor.extract(message)
+    per_message = (time.perf_counter() - started) / (args.rounds * len(messages))
+
+    vocabulary = extractor._vocabulary()
+    naive_rounds = max(1, args.rounds // 50)
+    started = time.perf_counter()
+    for _ in range(naive_rounds):
+        for message in messages:
+            naive_extract(vocabulary, message)
+    naive_per_message = (time.perf_counter() - started) / (naive_rounds * len(messages))
+    print(f"extraction: {per_message * 1e6:.1f}us per message ({chars / len(messages):.0f} chars avg), "
+          f"naive scan {naive_per_message * 1e6:.1f}us ({naive_per_message / per_message:.0f}x)")
+
+    failures = 0
+    for message, coin_id, platform in EXPECTED:
+        mentions = extractor.extract(message)
+        best = mentions[0] if mentions and mentions[0].confidence >= extractor.min_confidence else None
+        got = (best.coin_id, best.platform) if best else (None, None)
+        ok = got == (coin_id, platform)
+        failures += not ok
+        detail = f"{best.coin_id} on {best.platform} ({best.confidence})" if best else "no confident match"
+        print(f"{'ok  ' if ok else 'FAIL'} {message!r}: {detail}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
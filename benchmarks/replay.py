@@ -0,0 +1,473 @@
+"""
+Offline replay / load test of the full call pipeline.
+
+Replays a corpus of call messages (one JSON object per line with a "text"
+field, optionally "delay" = seconds after the previous message) through
+crypto_bot_handler.handler, exactly as Telethon would deliver them. Local
+stub servers (stub_servers.py) replace CoinGecko, DexScreener, the OpenAI
+API and the Telegram send path, each with its own latency / error distribution, so a
+run needs no network and no credentials.
+
+Reports throughput, end-to-end latency percentiles (call received ->
+analysis delivered; with summary cards, call received -> card delivered,
+and separately -> deep analysis delivered), the per-stage breakdown and
+peak memory. Runs can be
+saved as named baselines under benchmarks/baselines/ and later runs
+compared against them; a comparison exits with status 1 when a metric
+regresses by more than the tolerance.
+
+Usage (from the repository root):
+    python -m benchmarks.replay --repeat 20 --rate 10 --save main
+    python -m benchmarks.replay --repeat 20 --rate 10 --compare main
+    python -m benchmarks.replay --mode batch --llm-latency 1 4 --llm-distribution lognormal --llm-error-rate 0.05
+    python -m benchmarks.replay --processes 4 --workers 32 --rate 0
+    python -m benchmarks.replay --rate 0 --deep-workers 2 --deep-backlog 10 --llm-latency 2 6
+    python -m benchmarks.replay --coingecko-distribution lognormal --unlisted-rate 0.2 --providers coingecko
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import stub_servers  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "call_messages.jsonl")
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# (metric path in the report, True if higher is better)
+COMPARED_METRICS = (
+    (("throughput_per_s",), True),
+    (("latency", "p50"), False),
+    (("latency", "p95"), False),
+    (("latency", "p99"), False),
+    (("memory", "peak_rss_mb"), False),
+)
+
+
+def load_corpus(path, repeat):
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [record for _ in range(repeat) for record in records]
+
+
+def summarize(stats) -> dict:
+    """count / avg / p50 / p95 / p99 / max of a message_pipeline.LatencyStats."""
+    summary = stats.summary()
+    summary["p99"] = stats.percentile(99)
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in summary.items()}
+
+
+class StubTelegramClient:
+    """
+    The slice of TelegramClient the handler uses (forward_messages,
+    send_message, edit_message), sent to the telegram stub over the shared
+    HTTP pool. Per-method latency is recorded.
+    """
+
+    def __init__(self, base_url):
+        from message_pipeline import LatencyStats
+
+        self.base_url = base_url
+        self.latency = {action: LatencyStats(window=1 << 20) for action in ("forward", "send", "edit")}
+
+    async def _post(self, action, **body):
+        import http_pool
+
+        started = time.monotonic()
+        async with http_pool.get_session().post(f"{self.base_url}/{action}", json=body) as response:
+            data = await response.json(content_type=None)
+            if response.status != 200:
+                raise RuntimeError(f"telegram stub {action} failed with status code {response.status}")
+        self.latency[action].add(time.monotonic() - started)
+        return SimpleNamespace(id=data["id"])
+
+    async def forward_messages(self, entity, messages):
+        return await self._post("forward", chat=entity, source_id=messages.id)
+
+    async def send_message(self, entity, message, reply_to=None):
+        return await self._post("send", chat=entity, text=message,
+                                reply_to=getattr(reply_to, "id", reply_to))
+
+    async def edit_message(self, entity, message, text):
+        return await self._post("edit", chat=entity, message_id=message.id, text=text)
+
+
+def configure_environment(args, urls, workdir):
+    """Points the bot's modules at the stubs. Must run before they are imported."""
+    os.environ.update({
+        "COINGECKO_API_URL": urls["coingecko"] + "/api/v3",
+        "DEXSCREENER_API_URL": urls["dexscreener"],
+        "MARKET_DATA_PROVIDERS": args.providers,
+        "OPENAI_BASE_URL": urls["openai"] + "/v1",
+        "OPENAI_API_KEY": "stub",
+        "APP_API_ID": "1", "APP_API_HASH": "stub", "MY_USER_ID": "1", "CHAT_ID": "2",
+        "STREAM_ANALYSIS": "true" if args.mode == "stream" else "false",
+        "PIPELINE_WORKERS": str(args.workers),
+        "PIPELINE_STATS_INTERVAL": "0",
+        "COINGECKO_RATE_PER_MINUTE": str(args.coingecko_rate),
+        "COINGECKO_BURST": str(max(1, int(args.coingecko_rate / 60))),
+        # Start every run cold and leave nothing behind in the repository
+        "TOKEN_CACHE_DB": "",
+        "TV_SYMBOL_CACHE_DB": "",
+        "COIN_INDEX_SNAPSHOT": os.path.join(workdir, "coin_index.json.gz"),
+        "CHART_CACHE_DIR": os.path.join(workdir, "chart_cache"),
+        "CALL_STORE_DB": os.path.join(workdir, "calls.sqlite3"),
+    })
+    if args.no_analysis_cache:
+        os.environ["ANALYSIS_CACHE_SIZE"] = "0"
+    os.environ["ROUTE_DEDUP_WINDOW"] = str(args.dedup_window)
+    os.environ["SUMMARY_CARD"] = "true" if args.summary_card == "on" else "false"
+    os.environ["DEEP_ANALYSIS_WORKERS"] = str(args.deep_workers)
+    os.environ["DEEP_ANALYSIS_MAX_BACKLOG"] = str(args.deep_backlog)
+    os.environ["ANALYSIS_WORKERS"] = str(args.processes)
+    os.environ["WORKER_BACKEND"] = args.worker_backend
+    if args.sources > 1 or args.targets > 1:
+        # Every source chat feeds every target chat
+        routes_file = os.path.join(workdir, "routes.json")
+        with open(routes_file, "w", encoding="utf-8") as f:
+            json.dump({str(source): list(target_chats(args)) for source in source_chats(args)}, f)
+        os.environ["ROUTES_FILE"] = routes_file
+
+
+def source_chats(args) -> list:
+    return [1] if args.sources <= 1 and args.targets <= 1 else [1000 + i for i in range(args.sources)]
+
+
+def target_chats(args) -> list:
+    return [2] if args.sources <= 1 and args.targets <= 1 else [2000 + i for i in range(args.targets)]
+
+
+async def replay(args, records):
+    # Imported here: the modules read their settings from the environment at import time.
+    from benchmarks.chart_bench import PeakRssSampler, psutil
+    import crypto_bot_handler as bot
+    import http_pool
+    from coin_index import coin_index
+    from coingecko_gateway import gateway
+    from llm_client import llm_client
+    from market_data import market_data
+    from message_pipeline import LatencyStats
+    from telegram_stream import first_token_latency
+
+    bot.client = StubTelegramClient(args.urls["telegram"])
+    pipeline = bot.pipeline
+    pipeline.latency = {stage: LatencyStats(window=1 << 20) for stage in pipeline.latency}
+    received = {}
+    all_delivered = asyncio.Event()
+    deep = bot.deep_pipeline
+
+    def instrument(tier_pipeline, produced):
+        """
+        Times delivered calls of one pipeline and counts the others. Only calls
+        whose analysis ran and produced output (produced(call)), and whose
+        delivery did not raise, count as delivered and enter the latency.
+        """
+        outcome = {"latency": LatencyStats(window=1 << 20), "settled": 0, "delivered": 0,
+                   "failed": 0, "no_result": 0, "delivery_failed": 0}
+        raised = set()
+        original_analyze, original_deliver = tier_pipeline.analyze, tier_pipeline.deliver
+
+        async def tracked_analyze(call):
+            try:
+                return await original_analyze(call)
+            except Exception:
+                raised.add(id(call))
+                raise
+
+        async def timed_deliver(call, result):
+            try:
+                await original_deliver(call, result)
+            except Exception:
+                outcome["delivery_failed"] += 1
+                raise
+            else:
+                if id(call) in raised:
+                    outcome["failed"] += 1
+                elif not produced(call):
+                    outcome["no_result"] += 1
+                else:
+                    outcome["latency"].add(time.monotonic() - received[call.message.id])
+                    outcome["delivered"] += 1
+            finally:
+                raised.discard(id(call))
+                outcome["settled"] += 1
+                check_done()
+
+        tier_pipeline.analyze, tier_pipeline.deliver = tracked_analyze, timed_deliver
+        return outcome
+
+    # Tier 1 delivers the summary card when cards are on, the analysis otherwise
+    first = instrument(pipeline, (lambda call: call.card is not None) if deep is not None
+                       else (lambda call: call.result is not None))
+
+    def finished():
+        # Messages merged into another call are delivered along with it
+        return first["settled"] + pipeline.dropped + bot.router.stats["merged"] + bot.router.stats["duplicates"]
+
+    def check_done():
+        if finished() >= len(records) and (deep is None or second["settled"] >= bot.deep_analysis_stats["queued"]):
+            all_delivered.set()
+
+    second = None
+    if deep is not None:
+        deep.latency = {stage: LatencyStats(window=1 << 20) for stage in deep.latency}
+        second = instrument(deep, lambda call: call.result is not None)
+
+    await coin_index.ensure_loaded()
+    await bot.worker_pool.start()
+    await pipeline.start()
+    if deep is not None:
+        await deep.start()
+    handler_tasks = []
+    sources = source_chats(args)
+    with PeakRssSampler() as sampler:
+        started = time.monotonic()
+        for message_id, record in enumerate(records):
+            delay = record.get("delay") / args.speed if "delay" in record else (1 / args.rate if args.rate else 0)
+            if delay and message_id:
+                await asyncio.sleep(delay)
+            event = SimpleNamespace(chat_id=sources[message_id % len(sources)],
+                                    message=SimpleNamespace(id=message_id, message=record["text"]))
+            received[message_id] = time.monotonic()
+            # Telethon runs each update handler as its own task
+            handler_tasks.append(asyncio.create_task(bot.handler(event)))
+        await asyncio.gather(*handler_tasks)
+        check_done()
+        if not all_delivered.is_set():
+            try:
+                await asyncio.wait_for(all_delivered.wait(), args.timeout)
+            except asyncio.TimeoutError:
+                print(f"Timed out after {args.timeout}s with {len(records) - finished()} messages outstanding"
+                      + (f", {bot.deep_analysis_stats['queued'] - second['settled']} deep analyses" if deep else ""))
+        wall = time.monotonic() - started
+
+    await pipeline.stop()
+    if deep is not None:
+        await deep.stop()
+    await bot.worker_pool.stop()
+    await bot.call_store.stop()
+    await llm_client.close()
+    await http_pool.close_session()
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("urls", "save", "compare")},
+        "messages": len(records),
+        "delivered": first["delivered"],
+        "failed": first["failed"],
+        "no_result": first["no_result"],
+        "delivery_failed": first["delivery_failed"],
+        "dropped": pipeline.dropped,
+        "routing": dict(bot.router.stats),
+        "workers": bot.worker_pool.snapshot() if bot.worker_pool.enabled else None,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_s": round(first["delivered"] / wall, 3) if wall else 0.0,
+        "latency": summarize(first["latency"]),
+        "stages": {stage: summarize(stats) for stage, stats in pipeline.latency.items() if stage != "total"},
+        "deep_analysis": dict(bot.deep_analysis_stats, delivered=second["delivered"], failed=second["failed"],
+                              no_result=second["no_result"], delivery_failed=second["delivery_failed"],
+                              latency=summarize(second["latency"]),
+                              stages={stage: summarize(stats) for stage, stats in deep.latency.items()
+                                      if stage != "total"}) if deep is not None else None,
+        "llm": summarize(llm_client.latency),
+        "llm_first_chunk": summarize(llm_client.first_chunk_latency),
+        "telegram": {action: summarize(stats) for action, stats in bot.client.latency.items() if stats.count},
+        "coingecko_gateway": gateway.snapshot(),
+        "market_data": market_data.snapshot(),
+        "memory": {
+            "peak_rss_mb": round(sampler.peak / (1024 * 1024), 1) if psutil is not None else None,
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+    if first_token_latency.count:
+        report["first_visible_token"] = summarize(first_token_latency)
+    return report
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report):
+    latency = report["latency"]
+    delivered = "cards delivered" if report.get("deep_analysis") else "delivered"
+    print(f"\n{report['messages']} messages, {report['delivered']} {delivered}, {report['failed']} failed, "
+          f"{report.get('no_result', 0)} without result, {report.get('delivery_failed', 0)} delivery errors, "
+          f"{report['dropped']} dropped in {report['wall_seconds']:.2f}s ({report['throughput_per_s']:.2f} msg/s)")
+    routing = report.get("routing")
+    if routing and (routing["merged"] or routing["duplicates"]):
+        print(f"Routing: {routing['calls']} calls analysed, {routing['merged']} merged into an earlier call, "
+              f"{routing['duplicates']} duplicates skipped")
+    workers = report.get("workers")
+    if workers:
+        print(f"Workers: {workers['jobs']} jobs over {len(workers['per_shard'])} processes, "
+              f"{workers['errors']} errors, {workers['restarts']} restarts")
+    deep = report.get("deep_analysis")
+    print(f"End-to-end latency{' (summary card)' if deep else ''}: p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  "
+          f"p99 {latency['p99']:.3f}s  max {latency['max']:.3f}s")
+    if deep:
+        latency = deep["latency"]
+        print(f"Deep analysis: {deep['delivered']} delivered, {deep.get('failed', 0)} failed, "
+              f"{deep.get('no_result', 0)} without result, {deep['skipped']} skipped under load; "
+              f"end-to-end p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  p99 {latency['p99']:.3f}s")
+    print("Stages:")
+    rows = [(f"pipeline {stage}", stats) for stage, stats in report["stages"].items()]
+    if deep:
+        rows += [(f"deep {stage}", stats) for stage, stats in deep["stages"].items()]
+    rows.append(("llm call", report["llm"]))
+    rows.append(("llm first chunk", report["llm_first_chunk"]))
+    rows += [(f"telegram {action}", stats) for action, stats in report["telegram"].items()]
+    if "first_visible_token" in report:
+        rows.append(("first visible token", report["first_visible_token"]))
+    for name, stats in rows:
+        if not stats["count"]:
+            continue
+        print(f"  {name:<22} n={stats['count']:<6} avg {stats['avg']:.3f}s  p50 {stats['p50']:.3f}s  "
+              f"p95 {stats['p95']:.3f}s  p99 {stats['p99']:.3f}s")
+    market = report.get("market_data")
+    if market:
+        no_data = market["no_data"] / market["requests"] if market["requests"] else 0.0
+        print(f"Market data: {market['requests']} lookups, {market['no_data']} without data ({no_data:.1%}), "
+              f"{market['hedges']} hedged, {market['failovers']} failed over")
+        for name, provider in market["providers"].items():
+            print(f"  {name:<12} wins {provider['wins']:<5} not found {provider['not_found']:<5} "
+                  f"failures {provider['failures']:<4} cancelled {provider['cancelled']:<4} "
+                  f"p50 {provider['p50']:.3f}s  p90 {provider['p90']:.3f}s  breaker {provider['state']}")
+    gateway = report["coingecko_gateway"]
+    print(f"CoinGecko gateway: {json.dumps(gateway)}")
+    print(f"Stub servers: {json.dumps(report['stubs'])}")
+    memory = report["memory"]
+    peak = f"{memory['peak_rss_mb']} MB" if memory["peak_rss_mb"] is not None else "n/a (psutil not installed)"
+    print(f"Memory: peak RSS {peak}, max RSS {memory['max_rss_mb']} MB")
+
+
+def _metric(report, path):
+    value = report
+    for key in path:
+        value = (value or {}).get(key)
+    return value
+
+
+def compare(report, baseline, tolerance) -> bool:
+    """Prints the change of each compared metric. Returns False if any regressed beyond tolerance."""
+    print(f"\nAgainst baseline from {baseline.get('created_at')} (commit {baseline.get('commit')}):")
+    ok = True
+    for path, higher_is_better in COMPARED_METRICS:
+        current, previous = _metric(report, path), _metric(baseline, path)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        regressed = -change > tolerance if higher_is_better else change > tolerance
+        ok = ok and not regressed
+        print(f"  {'.'.join(path):<22} {previous:>10.3f} -> {current:>10.3f}  {change:+.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+async def main_async(args):
+    records = load_corpus(args.corpus, args.repeat)
+    behaviours = {
+        "coingecko": stub_servers.StubBehaviour(*args.coingecko_latency, args.coingecko_error_rate,
+                                                error_status=429, seed=args.seed,
+                                                distribution=args.coingecko_distribution),
+        "openai": stub_servers.StubBehaviour(*args.llm_latency, args.llm_error_rate, seed=args.seed,
+                                             distribution=args.llm_distribution),
+        "dexscreener": stub_servers.StubBehaviour(*args.dex_latency, args.dex_error_rate, error_status=429,
+                                                  seed=args.seed, distribution=args.dex_distribution),
+        "telegram": stub_servers.StubBehaviour(*args.telegram_latency, args.telegram_error_rate, seed=args.seed,
+                                               distribution=args.telegram_distribution),
+    }
+    runners, args.urls = [], {}
+    for name, behaviour in behaviours.items():
+        if name == "coingecko":
+            app = stub_servers.coingecko_app(behaviour, unlisted_rate=args.unlisted_rate)
+        else:
+            app = stub_servers.STUBS[name](behaviour)
+        runner, args.urls[name] = await stub_servers.start_app(app)
+        runners.append(runner)
+
+    workdir = tempfile.mkdtemp(prefix="replay_")
+    configure_environment(args, args.urls, workdir)
+    cwd = os.getcwd()
+    os.chdir(workdir)       # the Telethon session file and any caches land in the scratch directory
+    try:
+        report = await replay(args, records)
+    finally:
+        os.chdir(cwd)
+        for runner in runners:
+            await runner.cleanup()
+    report["stubs"] = {name: behaviour.snapshot() for name, behaviour in behaviours.items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=10, help="replay the corpus this many times")
+    parser.add_argument("--rate", type=float, default=5.0, help="messages per second (0 = all at once)")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed-up for corpora with recorded delays")
+    parser.add_argument("--mode", choices=("stream", "batch"), default="stream")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--no-analysis-cache", action="store_true")
+    parser.add_argument("--sources", type=int, default=1, help="source chats the messages are spread over")
+    parser.add_argument("--targets", type=int, default=1, help="target chats subscribed to every source")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="analysis worker processes (0 = analyse in the bot process)")
+    parser.add_argument("--worker-backend", choices=("multiprocessing", "broker"), default="multiprocessing")
+    parser.add_argument("--summary-card", choices=("on", "off"), default="on",
+                        help="post the summary card first and the LLM analysis as a second tier")
+    parser.add_argument("--deep-workers", type=int, default=4, help="concurrent LLM deep analyses")
+    parser.add_argument("--deep-backlog", type=int, default=20, help="queued deep analyses before new ones are skipped")
+    parser.add_argument("--dedup-window", type=float, default=0.0,
+                        help="seconds repeat calls of a contract are merged (0 = every message analysed)")
+    parser.add_argument("--providers", default="coingecko,dexscreener",
+                        help="market data providers, preferred first (MARKET_DATA_PROVIDERS)")
+    parser.add_argument("--unlisted-rate", type=float, default=0.0,
+                        help="share of contracts CoinGecko answers 404 for (pump.fun mints always are)")
+    parser.add_argument("--coingecko-rate", type=float, default=3000, help="gateway requests per minute")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    for name, latency in (("llm", (0.5, 2.0)), ("coingecko", (0.05, 0.3)), ("dex", (0.05, 0.2)),
+                          ("telegram", (0.02, 0.1))):
+        parser.add_argument(f"--{name}-latency", type=float, nargs=2, default=latency, metavar=("MIN", "MAX"))
+        parser.add_argument(f"--{name}-distribution", choices=stub_servers.LATENCY_DISTRIBUTIONS, default="uniform")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+    parser.add_argument("--save", metavar="NAME", help="save the report as benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare against benchmarks/baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+
+    ok = True
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json"), encoding="utf-8") as f:
+            ok = compare(report, json.load(f), args.tolerance)
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline {path}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
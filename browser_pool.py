@@ -0,0 +1,169 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:     # optional - memory-based recycling is skipped without it
+    psutil = None
+
+# Browser pool settings, overridable from the .env file
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", "50"))
+BROWSER_MAX_RSS_MB = float(os.getenv("BROWSER_MAX_RSS_MB", "1024"))
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def _chromedriver_path() -> str:
+    """Resolves the ChromeDriver binary once per process instead of once per chart."""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+def _chrome_options():
+    from selenium import webdriver
+
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument("--headless")            # Run Chrome in headless mode.
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    # Keep background tabs rendering at full speed so charts render in parallel.
+    chrome_options.add_argument("--disable-background-timer-throttling")
+    chrome_options.add_argument("--disable-renderer-backgrounding")
+    chrome_options.add_argument("--disable-backgrounding-occluded-windows")
+    chrome_options.add_argument("--window-size=1280,1024")
+    return chrome_options
+
+
+class PooledBrowser:
+    """A warm Chrome instance plus its usage count."""
+
+    def __init__(self):
+        # selenium and webdriver_manager are imported when the first browser starts, not with the module
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service as ChromeService
+
+        service = ChromeService(_chromedriver_path())
+        self.driver = webdriver.Chrome(service=service, options=_chrome_options())
+        self.uses = 0
+
+    def rss_mb(self) -> float:
+        """Resident memory of chromedriver and every Chrome process it spawned, in MB."""
+        if psutil is None:
+            return 0.0
+        try:
+            root = psutil.Process(self.driver.service.process.pid)
+            processes = [root] + root.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes if p.is_running()) / (1024 * 1024)
+        except (psutil.Error, AttributeError):
+            return 0.0
+
+    def reset(self):
+        """Closes every tab but one so the next user starts from a clean window."""
+        handles = self.driver.window_handles
+        for handle in handles[1:]:
+            self.driver.switch_to.window(handle)
+            self.driver.close()
+        self.driver.switch_to.window(handles[0])
+        self.driver.get("about:blank")
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+
+
+class BrowserPool:
+    """
+    Long-lived pool of headless Chrome instances.
+
+    Browsers are started on first use and handed out one caller at a time.
+    A browser is recycled (quit and replaced on next demand) after max_uses
+    checkouts, when its process tree exceeds max_rss_mb, or when a caller
+    failed while using it.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_uses=BROWSER_MAX_USES, max_rss_mb=BROWSER_MAX_RSS_MB):
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self._idle = queue.LifoQueue()       # most recently used first = warmest caches
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._all = set()
+        self.stats = {"started": 0, "recycled": 0, "checkouts": 0}
+
+    def _needs_recycling(self, browser: PooledBrowser) -> bool:
+        if browser.uses >= self.max_uses:
+            return True
+        return self.max_rss_mb > 0 and browser.rss_mb() > self.max_rss_mb
+
+    def _discard(self, browser: PooledBrowser):
+        with self._lock:
+            self._all.discard(browser)
+        self.stats["recycled"] += 1
+        browser.quit()
+
+    @contextmanager
+    def browser(self):
+        """Checks out a warm browser for the duration of the with-block."""
+        self._slots.acquire()
+        browser = None
+        try:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                browser = PooledBrowser()
+                with self._lock:
+                    self._all.add(browser)
+                self.stats["started"] += 1
+            browser.uses += 1
+            self.stats["checkouts"] += 1
+            healthy = False
+            try:
+                yield browser
+                browser.reset()
+                healthy = True
+            finally:
+                if healthy and not self._needs_recycling(browser):
+                    self._idle.put(browser)
+                else:
+                    self._discard(browser)
+        finally:
+            self._slots.release()
+
+    def warm_up(self, count: int = None):
+        """Starts browsers ahead of the first chart request."""
+        browsers = []
+        for _ in range(min(self.size, count or self.size)):
+            with self._lock:
+                if len(self._all) >= self.size:
+                    break
+            browser = PooledBrowser()
+            with self._lock:
+                self._all.add(browser)
+            self.stats["started"] += 1
+            browsers.append(browser)
+        for browser in browsers:
+            self._idle.put(browser)
+
+    def close(self):
+        with self._lock:
+            browsers, self._all = list(self._all), set()
+        for browser in browsers:
+            browser.quit()
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+
+# Shared pool used by get_charts
+browser_pool = BrowserPool()
@@ -0,0 +1,141 @@
+import json
+import os
+import time
+from collections import OrderedDict
+
+# Routing settings, overridable from the .env file
+ROUTES_FILE = os.getenv("ROUTES_FILE", "")       # JSON subscription table; empty = MY_USER_ID -> CHAT_ID only
+ROUTE_DEDUP_WINDOW = float(os.getenv("ROUTE_DEDUP_WINDOW", "300"))   # seconds; 0 disables deduplication
+
+
+def load_routes(path: str = ROUTES_FILE, default_source=None, default_target=None) -> dict:
+    """
+    Reads the subscription table: which target chats receive calls from which source chats.
+
+    The file is a JSON object mapping each source chat ID to the target chat
+    IDs subscribed to it:
+
+        {"-1001111111111": [-1002222222222, -1003333333333],
+         "-1004444444444": [-1002222222222]}
+
+    Args:
+        path (str): Path of the JSON file; when empty, the single default route is used.
+        default_source (int): Source chat of the default route.
+        default_target (int): Target chat of the default route.
+
+    Returns:
+        dict: source chat ID -> tuple of target chat IDs.
+    """
+    if not path:
+        return {default_source: (default_target,)}
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+    routes = {}
+    for source, targets in table.items():
+        targets = [targets] if isinstance(targets, (int, str)) else targets
+        routes[int(source)] = tuple(dict.fromkeys(int(target) for target in targets))
+    return routes
+
+
+class Call:
+    """
+    One analysis shared by every (message, target) delivery of the same contract.
+
+    deliveries are the (message, target chat) pairs the analysis goes to; the
+    first message is the one that was analysed. Pairs added after the analysis
+    started wait in pending until it is delivered. callers lists every
+    message that called the contract, duplicates included, for the call store.
+    """
+
+    __slots__ = ("key", "message", "created_at", "targets", "deliveries", "pending", "callers", "reply",
+                 "detections", "token_info", "card", "cards", "result", "finished")
+
+    def __init__(self, key, message):
+        self.key = key
+        self.message = message
+        self.created_at = time.monotonic()
+        self.targets = set()        # target chats already covered by this call
+        self.deliveries = []
+        self.pending = []
+        self.callers = []           # (source chat, message, unix time) of every message calling it
+        self.reply = None           # streaming mode: the FanOutReply being streamed into
+        self.detections = None      # address_detector Detections found in the message, None if not run yet
+        self.token_info = None      # TokenSnapshot the analysis used, once resolved
+        self.card = None            # summary card text, when the token has market data
+        self.cards = []             # (target chat, card message or None) the deep analysis replies to
+        self.result = None          # analysis text once finished
+        self.finished = False
+
+
+class CallRouter:
+    """
+    Fans calls in from many source chats and out to the target chats
+    subscribed to each source.
+
+    A contract address seen again within the dedup window joins the call
+    already made for it instead of starting a new analysis: its new targets
+    get the same analysis, and targets that already have it get nothing.
+    Messages without a detected address are never merged.
+    """
+
+    def __init__(self, routes: dict, window: float = ROUTE_DEDUP_WINDOW):
+        self.routes = routes
+        self.window = window
+        self._calls = OrderedDict()     # contract address -> Call, oldest first
+        self.stats = {"calls": 0, "merged": 0, "duplicates": 0}
+
+    @property
+    def sources(self) -> list:
+        return list(self.routes)
+
+    def targets_for(self, source) -> tuple:
+        return self.routes.get(source, ())
+
+    def _expire(self, now):
+        while self._calls:
+            key, call = next(iter(self._calls.items()))
+            if now - call.created_at < self.window:
+                break
+            del self._calls[key]
+
+    def route(self, source, message, key=None):
+        """
+        Routes one incoming message.
+
+        Args:
+            source: Chat ID the message came from.
+            message: The message (e.g. a Telethon message).
+            key (str): Contract address the message calls, or None.
+
+        Returns:
+            tuple: (call, deliveries, is_new). deliveries are the (message, target)
+                   pairs this message adds; is_new is True if the call needs analysing.
+                   No deliveries means every subscribed target already has this call.
+        """
+        if key is not None and key.startswith("0x"):
+            key = key.lower()       # EVM addresses are case-insensitive; checksummed and lowercased calls match
+        call = None
+        if key is not None and self.window > 0:
+            self._expire(time.monotonic())
+            call = self._calls.get(key)
+        is_new = call is None
+        if is_new:
+            call = Call(key, message)
+            self.stats["calls"] += 1
+            if key is not None and self.window > 0:
+                self._calls[key] = call
+
+        call.callers.append((source, message, time.time()))
+        deliveries = [(message, target) for target in self.targets_for(source) if target not in call.targets]
+        call.targets.update(target for _, target in deliveries)
+        if not is_new:
+            self.stats["merged" if deliveries else "duplicates"] += 1
+        return call, deliveries, is_new
+
+    def discard(self, call):
+        """Forgets a call that will never finish, so the next call of its contract starts a new one."""
+        if self._calls.get(call.key) is call:
+            del self._calls[call.key]
+
+    def active_calls(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Call store settings, overridable from the .env file
+CALL_STORE_DB = os.getenv("CALL_STORE_DB", "calls.sqlite3")                  # empty string disables the store
+CALL_STORE_FLUSH_SECONDS = float(os.getenv("CALL_STORE_FLUSH_SECONDS", "1"))  # max delay before buffered rows are written
+CALL_STORE_BATCH_SIZE = int(os.getenv("CALL_STORE_BATCH_SIZE", "500"))       # buffered rows that force a write
+
+# Snapshot fields that are not market state and are left out of the stored snapshot
+_SNAPSHOT_SKIP = ("description", "exchanges")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS calls ("
+    " id INTEGER PRIMARY KEY,"
+    " called_at REAL NOT NULL, source_chat INTEGER, message_id INTEGER,"
+    " platform TEXT, contract TEXT, coin_id TEXT, symbol TEXT,"
+    " price REAL, market_cap REAL, volume_24h REAL,"
+    " snapshot TEXT, analysis TEXT)",
+    "CREATE INDEX IF NOT EXISTS calls_time ON calls (called_at)",
+    "CREATE INDEX IF NOT EXISTS calls_contract ON calls (contract, called_at)",
+    # Covers the caller ranking (grouped by chat, joined on contract) without touching the table
+    "CREATE INDEX IF NOT EXISTS calls_source ON calls (source_chat, called_at, platform, contract, price)",
+    "CREATE TABLE IF NOT EXISTS latest_prices ("
+    " platform TEXT NOT NULL, contract TEXT NOT NULL, price REAL NOT NULL, updated_at REAL NOT NULL,"
+    " PRIMARY KEY (platform, contract)) WITHOUT ROWID",
+)
+
+_RETURN = "(lp.price / c.price - 1) * 100"
+
+
+def _contract_key(address):
+    # EVM addresses are case-insensitive, base58 addresses are not.
+    return address.lower() if address and address.startswith("0x") else address
+
+
+class CallStore:
+    """
+    SQLite history of every call: who called what, when, at which market
+    state, and the analysis that was posted.
+
+    record() only appends to an in-memory buffer; rows are written in
+    batches by a background task in a worker thread, at least every
+    flush_interval seconds. Current prices (from the watchlist) go into a
+    separate latest_prices table, so returns since each call are a join
+    rather than a fetch. Queries run off the event loop too.
+    """
+
+    def __init__(self, db_path=CALL_STORE_DB, flush_interval=CALL_STORE_FLUSH_SECONDS,
+                 batch_size=CALL_STORE_BATCH_SIZE):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._db = None
+        self._lock = threading.Lock()   # one connection, used from worker threads
+        self._calls = []                # buffered call rows
+        self._prices = {}               # (platform, contract) -> (price, updated_at), newest wins
+        self._flush_task = None
+        self._wake = None
+        self.stats = {"calls": 0, "flushes": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.db_path)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                self._db.execute(statement)
+            self._db.commit()
+        return self._db
+
+    def _write(self, calls, prices):
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.executemany(
+                    "INSERT INTO calls (called_at, source_chat, message_id, platform, contract, coin_id, symbol,"
+                    " price, market_cap, volume_24h, snapshot, analysis) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    calls)
+                db.executemany(
+                    "INSERT INTO latest_prices (platform, contract, price, updated_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (platform, contract) DO UPDATE SET price = excluded.price,"
+                    " updated_at = excluded.updated_at WHERE excluded.updated_at >= latest_prices.updated_at",
+                    [key + value for key, value in prices.items()])
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            cursor = self._connect().execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # ------------------------------------------------------------------
+    # Buffered writes
+    # ------------------------------------------------------------------
+    def record(self, source_chat, message_id, snapshot=None, analysis: str = None, called_at: float = None,
+               contract: str = None):
+        """
+        Buffers one call for writing.
+
+        Args:
+            source_chat (int): Chat the call was made in.
+            message_id (int): The call message's ID.
+            snapshot (TokenSnapshot): Market state the analysis used, or None if no data was found.
+            analysis (str): The analysis text that was posted.
+            called_at (float): Unix time of the call (defaults to now).
+            contract (str): Contract address, for calls without a snapshot.
+        """
+        if not self.enabled:
+            return
+        called_at = called_at or time.time()
+        if snapshot is not None:
+            contract = snapshot.contract_address or contract
+            market = {field: value for field, value in snapshot.to_dict().items()
+                      if value is not None and field not in _SNAPSHOT_SKIP}
+            row = (called_at, source_chat, message_id, snapshot.platform, _contract_key(contract),
+                   snapshot.coin_id, snapshot.symbol, snapshot.price, snapshot.market_cap, snapshot.total_volume,
+                   json.dumps(market, default=str), analysis)
+            if snapshot.platform and contract and snapshot.price:
+                self._prices_update(snapshot.platform, contract, snapshot.price, snapshot.fetched_at)
+        else:
+            row = (called_at, source_chat, message_id, None, _contract_key(contract), None, None, None, None, None,
+                   None, analysis)
+        self._calls.append(row)
+        self.stats["calls"] += 1
+        self._schedule()
+
+    def record_prices(self, updates):
+        """
+        Buffers current prices, e.g. from a watchlist poll.
+
+        Args:
+            updates (iterable): (platform, contract, price, unix time) tuples.
+        """
+        if not self.enabled:
+            return
+        for platform, contract, price, updated_at in updates:
+            self._prices_update(platform, contract, price, updated_at)
+        self._schedule()
+
+    def _prices_update(self, platform, contract, price, updated_at):
+        key = (platform, _contract_key(contract))
+        current = self._prices.get(key)
+        if current is None or updated_at >= current[1]:
+            self._prices[key] = (price, updated_at)
+
+    def _schedule(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._wake = asyncio.Event()
+            self._flush_task = asyncio.get_running_loop().create_task(self._drain())
+        if len(self._calls) >= self.batch_size:
+            self._wake.set()
+
+    def _take(self):
+        calls, prices = self._calls, self._prices
+        self._calls, self._prices = [], {}
+        return calls, prices
+
+    async def _drain(self):
+        while self._calls or self._prices:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Writes everything buffered so far."""
+        calls, prices = self._take()
+        if not calls and not prices:
+            return
+        try:
+            await asyncio.to_thread(self._write, calls, prices)
+            self.stats["flushes"] += 1
+        except sqlite3.Error as e:
+            self.stats["errors"] += 1
+            print(f"Call store write of {len(calls)} calls failed: {e}")
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        if self.enabled:
+            await self.flush()
+            self.close()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    async def recent_calls(self, hours: float = 24, source_chat: int = None, limit: int = 100) -> list:
+        """
+        Calls made in the last `hours`, newest first.
+
+        Returns:
+            list: dicts with called_at, source_chat, message_id, platform, contract, symbol, price and market_cap.
+        """
+        sql = ("SELECT called_at, source_chat, message_id, platform, contract, symbol, price, market_cap"
+               " FROM calls WHERE called_at >= ?")
+        params = [time.time() - hours * 3600]
+        if source_chat is not None:
+            sql += " AND source_chat = ?"
+            params.append(source_chat)
+        sql += " ORDER BY called_at DESC LIMIT ?"
+        params.append(limit)
+        return await asyncio.to_thread(self._query, sql, params)
+
+    async def call_returns(self, hours: float = 24, source_chat: int = None, contract: str = None,
+                           limit: int = 100) -> list:
+        """
+        Return since call (percent, against the latest known price) for the calls made in the last `hours`.
+
+        Returns:
+            list: dicts with the call fields plus current_price, priced_at and return_pct, newest call first.
+        """
+        sql = (f"SELECT c.called_at, c.source_chat, c.message_id, c.platform, c.contract, c.symbol, c.price,"
+               f" lp.price AS current_price, lp.updated_at AS priced_at, {_RETURN} AS return_pct"
+               f" FROM calls c JOIN latest_prices lp ON lp.platform = c.platform AND lp.contract = c.contract"
+               f" WHERE c.called_at >= ? AND c.price > 0")
+        params = [time.time() - hours * 3600]
+        if source_chat is not None:
+            sql += " AND c.source_chat = ?"
+            params.append(source_chat)
+        if contract is not None:
+            sql += " AND c.contract = ?"
+            params.append(_contract_key(contract))
+        sql += " ORDER BY c.called_at DESC LIMIT ?"
+        params.append(limit)
+        return await asyncio.to_thread(self._query, sql, params)
+
+    async def top_callers(self, hours: float = 24 * 30, min_calls: int = 3, limit: int = 10,
+                          worst: bool = False) -> list:
+        """
+        Ranks source chats by the average return since their calls in the last `hours`.
+
+        Args:
+            hours (float): Look-back window.
+            min_calls (int): Chats with fewer priced calls are left out.
+            limit (int): Number of chats returned.
+            worst (bool): Rank from the worst average return instead of the best.
+
+        Returns:
+            list: dicts with source_chat, calls, avg_return_pct, best_return_pct, worst_return_pct and win_rate.
+        """
+        sql = (f"SELECT c.source_chat, COUNT(*) AS calls, AVG({_RETURN}) AS avg_return_pct,"
+               f" MAX({_RETURN}) AS best_return_pct, MIN({_RETURN}) AS worst_return_pct,"
+               f" AVG(lp.price > c.price) AS win_rate"
+               f" FROM calls c JOIN latest_prices lp ON lp.platform = c.platform AND lp.contract = c.contract"
+               f" WHERE c.called_at >= ? AND c.price > 0"
+               f" GROUP BY c.source_chat HAVING COUNT(*) >= ?"
+               f" ORDER BY avg_return_pct {'ASC' if worst else 'DESC'} LIMIT ?")
+        return await asyncio.to_thread(self._query, sql, (time.time() - hours * 3600, min_calls, limit))
+
+
+# Shared store written by crypto_bot_handler
+call_store = CallStore()
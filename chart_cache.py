@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict
+
+from singleflight import SingleFlight
+
+# Chart cache settings, overridable from the .env file
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", "chart_cache")
+CHART_CACHE_MAX_MB = float(os.getenv("CHART_CACHE_MAX_MB", "200"))
+# Seconds a chart stays valid, per interval: a 1-day chart goes stale much sooner than a 1-month one
+CHART_CACHE_TTLS = {
+    "1day": float(os.getenv("CHART_CACHE_TTL_1DAY", "300")),
+    "1week": float(os.getenv("CHART_CACHE_TTL_1WEEK", "1800")),
+    "1month": float(os.getenv("CHART_CACHE_TTL_1MONTH", "7200")),
+}
+
+_CHART_FILE = re.compile(r"^[0-9a-f]{32}\.png$")
+
+
+class ChartCache:
+    """
+    Disk cache of rendered chart images keyed on
+    (backend, exchange, symbol, interval, theme).
+
+    Images are stored once under the hash of their content, written to a
+    temporary file and renamed into place, so a reader never sees a partial
+    file and two keys with identical images share one file. Entries expire
+    after a per-interval TTL; the least recently used are evicted once the
+    files exceed the disk budget. Concurrent misses for the same chart set
+    share one render. The index is kept in SQLite next to the images.
+
+    Lookups return the image bytes, not paths: a file is pinned while it is
+    read, and one evicted meanwhile is only deleted once the read is done.
+    """
+
+    def __init__(self, directory=CHART_CACHE_DIR, max_bytes=CHART_CACHE_MAX_MB * 1024 * 1024,
+                 ttls=CHART_CACHE_TTLS, default_ttl=300.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()   # (backend, exchange, symbol, interval, theme) -> (path, size, created_at)
+        self._refs = {}                 # path -> number of entries pointing at it
+        self._pins = {}                 # path -> reads in progress; the file outlives its eviction until 0
+        self._bytes = 0                 # size of the distinct files referenced
+        self._flights = SingleFlight()
+        self._db = None
+        self._loaded = False
+        self.stats = {"hits": 0, "misses": 0, "renders": 0, "evictions": 0}
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS charts ("
+                " backend TEXT NOT NULL, exchange TEXT NOT NULL, symbol TEXT NOT NULL,"
+                " interval TEXT NOT NULL, theme TEXT NOT NULL,"
+                " path TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (backend, exchange, symbol, interval, theme))"
+            )
+        return self._db
+
+    def load(self):
+        """Rebuilds the index from SQLite, dropping expired rows and unreferenced image files."""
+        self._loaded = True
+        db = self._connect()
+        now = time.time()
+        rows = db.execute(
+            "SELECT backend, exchange, symbol, interval, theme, path, size, created_at FROM charts"
+            " ORDER BY created_at").fetchall()
+        for *key, path, size, created_at in rows:
+            key = tuple(key)
+            if now - created_at >= self._ttl(key) or not os.path.exists(path):
+                self._delete(key)
+                continue
+            self._add(key, (path, size, created_at))
+        db.commit()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if (_CHART_FILE.match(name) and path not in self._refs) or name.endswith(".png.tmp"):
+                os.remove(path)
+        print(f"Chart cache loaded {len(self._entries)} charts ({self._bytes / (1024 * 1024):.1f} MB)")
+
+    def _persist(self, key, entry):
+        path, size, created_at = entry
+        self._connect().execute(
+            "INSERT OR REPLACE INTO charts (backend, exchange, symbol, interval, theme, path, size, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", key + (path, size, created_at))
+
+    def _delete(self, key):
+        self._connect().execute(
+            "DELETE FROM charts WHERE backend = ? AND exchange = ? AND symbol = ?"
+            " AND interval = ? AND theme = ?", key)
+
+    def _write_file(self, content: bytes):
+        """Stores content under its hash (atomic rename); returns (path, size)."""
+        path = os.path.join(self.directory, hashlib.sha256(content).hexdigest()[:32] + ".png")
+        if not os.path.exists(path):
+            with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".png.tmp", delete=False) as f:
+                f.write(content)
+            os.replace(f.name, path)
+        return path, len(content)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # ------------------------------------------------------------------
+    # Index bookkeeping
+    # ------------------------------------------------------------------
+    def _ttl(self, key) -> float:
+        return self.ttls.get(key[3], self.default_ttl)
+
+    def _add(self, key, entry):
+        self._entries[key] = entry
+        path, size, _ = entry
+        if self._refs.get(path, 0) == 0:
+            self._bytes += size
+        self._refs[path] = self._refs.get(path, 0) + 1
+
+    def _remove(self, key):
+        path, size, _ = self._entries.pop(key)
+        self._release(path, size)
+
+    def _release(self, path, size):
+        self._refs[path] -= 1
+        if self._refs[path] == 0:
+            del self._refs[path]
+            self._bytes -= size
+            if path not in self._pins:
+                self._remove_file(path)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _read_file(path):
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError as e:
+            print(f"Cached chart {path} unreadable: {e!r}")
+            return None
+
+    async def _read(self, path):
+        """Reads a cached image, pinning its file so an eviction meanwhile cannot delete it."""
+        if path is None:
+            return None
+        self._pins[path] = self._pins.get(path, 0) + 1
+        try:
+            return await asyncio.to_thread(self._read_file, path)
+        finally:
+            self._pins[path] -= 1
+            if self._pins[path] == 0:
+                del self._pins[path]
+                if path not in self._refs:
+                    self._remove_file(path)
+
+    def _enforce_budget(self, keep):
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            self._remove(key)
+            self._delete(key)
+            self.stats["evictions"] += 1
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry[2] >= self._ttl(key):
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    async def _render_and_store(self, chart, intervals, render) -> set:
+        """Renders and caches the given intervals; returns the ones that rendered and were stored."""
+        self.stats["renders"] += 1
+        images = await render(intervals)
+        stored = set()
+        for interval, content in zip(intervals, images):
+            if not content:
+                continue
+            path, size = await asyncio.to_thread(self._write_file, content)
+            if path not in self._refs and not os.path.exists(path):
+                # Same image evicted for another key while we were writing it
+                path, size = self._write_file(content)
+            key = chart[:3] + (interval, chart[3])     # (backend, exchange, symbol, interval, theme)
+            previous = self._entries.pop(key, None)
+            entry = (path, size, time.time())
+            self._add(key, entry)
+            if previous is not None:
+                # Released after adding, so an unchanged image keeps its file
+                self._release(previous[0], previous[1])
+            self._persist(key, entry)
+            stored.add(key)
+        self._enforce_budget(keep=stored)
+        await asyncio.to_thread(self._connect().commit)
+        return {key[3] for key in stored}
+
+    async def get(self, backend: str, exchange: str, symbol: str, theme: str, intervals, render) -> tuple:
+        """
+        Returns cached chart images, rendering only the intervals that are missing or expired.
+
+        Args:
+            backend (str): Renderer name, part of the key since backends draw different images.
+            exchange (str): Exchange the chart is for.
+            symbol (str): Chart symbol, e.g. "PEPEUSDT".
+            theme (str): Chart theme.
+            intervals (tuple): Interval names ("1day", "1week", "1month") to return.
+            render (coroutine function): Called as `await render(intervals)` with the missing
+                intervals; returns PNG bytes (or None on failure) per interval, same order.
+
+        Returns:
+            tuple: PNG bytes per interval, same order; None for a chart that failed to render.
+        """
+        if not self._loaded:
+            await asyncio.to_thread(self.load)
+
+        chart = (backend, exchange, symbol, theme)
+        keys = [(backend, exchange, symbol, interval, theme) for interval in intervals]
+        paths = [self._lookup(key) for key in keys]
+        missing = tuple(interval for interval, path in zip(intervals, paths) if path is None)
+        self.stats["hits"] += len(intervals) - len(missing)
+        if not missing:
+            return tuple(await asyncio.gather(*(self._read(path) for path in paths)))
+
+        self.stats["misses"] += len(missing)
+        ours = []
+
+        async def render_missing(intervals):
+            ours.append(intervals)
+            return await self._render_and_store(chart, intervals, render)
+
+        # A render already in flight for this chart may cover other intervals than
+        # the ones we need; render what it did not store once it has finished.
+        # Intervals that failed in our own render are not retried.
+        stored = await self._flights.do(chart, lambda: render_missing(missing))
+        remaining = tuple(interval for interval in missing if interval not in stored)
+        if remaining and not ours:
+            await self._flights.do(chart, lambda: render_missing(remaining))
+        return tuple(await asyncio.gather(*(self._read(self._lookup(key)) for key in keys)))
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, charts=len(self._entries), files=len(self._refs),
+                    mb=round(self._bytes / (1024 * 1024), 1), coalesced=self._flights.coalesced)
+
+
+# Shared cache used by get_charts
+chart_cache = ChartCache()
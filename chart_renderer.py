@@ -0,0 +1,143 @@
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from coingecko_gateway import gateway
+from coin_index import coin_index
+
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+
+# Native renderer settings, overridable from the .env file
+CHART_RENDER_PROCESSES = int(os.getenv("CHART_RENDER_PROCESSES", "2"))
+CHART_THEME = os.getenv("CHART_THEME", "light")
+
+# (file suffix, CoinGecko OHLC window in days). CoinGecko picks the candle size:
+# 30 minutes for 1 day, 4 hours for 7-30 days.
+NATIVE_CHART_WINDOWS = (("1day", 1), ("1week", 7), ("1month", 30))
+
+# Quote currencies stripped from TradingView-style symbols ("PEPEUSDT" -> "PEPE")
+QUOTE_SUFFIXES = ("USDT", "USDC", "USD")
+
+THEMES = {
+    "light": {"background": "#ffffff", "text": "#131722", "grid": "#e0e3eb", "up": "#26a69a", "down": "#ef5350"},
+    "dark": {"background": "#131722", "text": "#d1d4dc", "grid": "#2a2e39", "up": "#26a69a", "down": "#ef5350"},
+}
+
+_executor = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=CHART_RENDER_PROCESSES)
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def render_candlestick_png(title: str, ohlc: list, theme: str = CHART_THEME) -> bytes:
+    """
+    Draws a candlestick chart and returns it as PNG bytes.
+
+    Runs inside the renderer process pool, so it imports matplotlib itself
+    and touches nothing but its arguments.
+
+    Args:
+        title (str): Chart title.
+        ohlc (list): [timestamp_ms, open, high, low, close] rows, as returned by CoinGecko /ohlc.
+        theme (str): "light" or "dark".
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    colors = THEMES.get(theme, THEMES["light"])
+    data = np.asarray(ohlc, dtype=float)
+    times = mdates.date2num(data[:, 0].astype("int64").astype("datetime64[ms]"))
+    opens, highs, lows, closes = data[:, 1], data[:, 2], data[:, 3], data[:, 4]
+    up = closes >= opens
+    width = np.median(np.diff(times)) * 0.7 if len(times) > 1 else 0.02
+
+    fig, ax = plt.subplots(figsize=(10, 4), dpi=100)
+    fig.patch.set_facecolor(colors["background"])
+    ax.set_facecolor(colors["background"])
+    for mask, color in ((up, colors["up"]), (~up, colors["down"])):
+        ax.vlines(times[mask], lows[mask], highs[mask], color=color, linewidth=0.8)
+        ax.bar(times[mask], np.abs(closes[mask] - opens[mask]), width, bottom=np.minimum(opens, closes)[mask],
+               color=color, edgecolor=color, linewidth=0.5)
+
+    ax.set_title(title, color=colors["text"], fontsize=11, loc="left")
+    ax.grid(True, color=colors["grid"], linewidth=0.5)
+    ax.tick_params(colors=colors["text"], labelsize=8)
+    ax.yaxis.tick_right()
+    for spine in ax.spines.values():
+        spine.set_color(colors["grid"])
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(mdates.AutoDateLocator()))
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", facecolor=fig.get_facecolor())
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def resolve_coin_id(symbol: str):
+    """Maps a TradingView-style symbol ("PEPEUSDT") to a CoinGecko coin id via the coin index."""
+    base = symbol.upper()
+    for suffix in QUOTE_SUFFIXES:
+        if base.endswith(suffix) and len(base) > len(suffix):
+            base = base[:-len(suffix)]
+            break
+    ids = coin_index.find_coin_ids(base)
+    return ids[0] if ids else None
+
+
+async def fetch_ohlc(coin_id: str, days: int):
+    """Fetches [timestamp_ms, open, high, low, close] candles from CoinGecko."""
+    url = f"{COINGECKO_API_URL}/coins/{coin_id}/ohlc"
+    status, data, _ = await gateway.get_json(url, params={"vs_currency": "usd", "days": str(days)})
+    if status != 200 or not data:
+        print(f"Error: OHLC request for {coin_id} ({days}d) failed with status code {status}")
+        return None
+    return data
+
+
+async def render_charts(symbol: str, coin_id: str = None, theme: str = CHART_THEME, intervals=None) -> tuple:
+    """
+    Renders the 1-day, 1-week and 1-month candlestick charts for a symbol.
+
+    Args:
+        intervals (tuple): Optional subset of the NATIVE_CHART_WINDOWS names to render.
+
+    Returns:
+        tuple: PNG bytes per chart (day, week, month, or the requested intervals) that can be
+               passed straight to TelegramClient.send_file; None for a chart that failed.
+    """
+    windows = [(suffix, days) for suffix, days in NATIVE_CHART_WINDOWS if intervals is None or suffix in intervals]
+    await coin_index.ensure_loaded()
+    coin_id = coin_id or resolve_coin_id(symbol)
+    if coin_id is None:
+        print(f"No CoinGecko coin found for chart symbol {symbol}")
+        return (None,) * len(windows)
+
+    series = await asyncio.gather(*(fetch_ohlc(coin_id, days) for _, days in windows))
+
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+
+    async def render(suffix, ohlc):
+        if not ohlc:
+            return None
+        return await loop.run_in_executor(
+            executor, render_candlestick_png, f"{symbol} - {suffix}", ohlc, theme)
+
+    return tuple(await asyncio.gather(
+        *(render(suffix, ohlc) for (suffix, _), ohlc in zip(windows, series))))
@@ -0,0 +1,65 @@
+import time
+
+
+class LazyClient:
+    """
+    Stands in for a registered client until it is needed: the first
+    attribute access builds the real client, later ones go straight to it.
+    """
+
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self._registry.get(self._name), attribute)
+
+    def __repr__(self):
+        state = "built" if self._registry.is_built(self._name) else "not built yet"
+        return f"<LazyClient {self._name!r}, {state}>"
+
+
+class ClientRegistry:
+    """
+    Builds the bot's heavy clients on first use instead of at import time,
+    so importing a module (in tests, scripts or spawned worker processes)
+    neither pulls in the client library nor opens sessions. Records how long
+    each client took to build.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._clients = {}
+        self.init_seconds = {}      # name -> seconds its factory took
+
+    def register(self, name: str, factory) -> LazyClient:
+        """
+        Registers a client factory.
+
+        Args:
+            name (str): Registry name, e.g. "telegram".
+            factory (callable): Zero-argument callable building the client; it should import its library itself.
+
+        Returns:
+            LazyClient: A stand-in that can be used like the client and builds it on first use.
+        """
+        self._factories[name] = factory
+        return LazyClient(self, name)
+
+    def get(self, name: str):
+        """Returns the named client, building it first if needed."""
+        client = self._clients.get(name)
+        if client is None:
+            started = time.perf_counter()
+            client = self._clients[name] = self._factories[name]()
+            self.init_seconds[name] = time.perf_counter() - started
+        return client
+
+    def is_built(self, name: str) -> bool:
+        return name in self._clients
+
+
+# Shared registry used by crypto_bot_handler
+clients = ClientRegistry()
@@ -0,0 +1,207 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+
+from coingecko_gateway import gateway, PRIORITY_LOW
+
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+
+# Index settings, overridable from the .env file
+COIN_INDEX_SNAPSHOT = os.getenv("COIN_INDEX_SNAPSHOT", "coin_index.json.gz")
+COIN_INDEX_REFRESH_SECONDS = float(os.getenv("COIN_INDEX_REFRESH_SECONDS", "3600"))
+
+
+class CoinIndex:
+    """
+    Locally held copy of CoinGecko's /coins/list?include_platform=true.
+
+    Provides O(1) lookups by lowercase id, name and symbol, and a
+    (coin_id, platform) -> contract address map, so resolving a token name
+    to a contract address needs no network call.
+    """
+
+    def __init__(self, snapshot_path=COIN_INDEX_SNAPSHOT):
+        self.snapshot_path = snapshot_path
+        self.coins = {}        # coin_id -> (symbol, name, platforms)
+        self.by_name = {}      # lowercase name -> [coin_id, ...]
+        self.by_symbol = {}    # lowercase symbol -> [coin_id, ...]
+        self.updated_at = 0.0
+        self.version = 0       # bumped on every change, so derived indexes know to rebuild
+        self._refresh_task = None
+        self._loading = None   # the first load, shared by concurrent callers
+
+    # ------------------------------------------------------------------
+    # Index maintenance
+    # ------------------------------------------------------------------
+    def _add(self, coin_id, symbol, name, platforms):
+        self.coins[coin_id] = (symbol, name, platforms)
+        self.version += 1
+        self.by_name.setdefault(name.lower(), []).append(coin_id)
+        self.by_symbol.setdefault(symbol.lower(), []).append(coin_id)
+
+    def _remove(self, coin_id):
+        symbol, name, _ = self.coins.pop(coin_id)
+        self.version += 1
+        for table, key in ((self.by_name, name.lower()), (self.by_symbol, symbol.lower())):
+            ids = table.get(key, [])
+            if coin_id in ids:
+                ids.remove(coin_id)
+            if not ids:
+                table.pop(key, None)
+
+    def apply(self, coin_list: list) -> tuple:
+        """
+        Merges a /coins/list payload into the index, touching only coins that
+        were added, changed or removed since the last refresh.
+
+        Returns:
+            tuple: (added, changed, removed) counts.
+        """
+        added = changed = 0
+        seen = set()
+        for coin in coin_list:
+            coin_id = coin.get("id")
+            if not coin_id:
+                continue
+            seen.add(coin_id)
+            # Drop empty platform entries ("" addresses are common in the list).
+            platforms = {p: a for p, a in (coin.get("platforms") or {}).items() if p and a}
+            record = (coin.get("symbol") or "", coin.get("name") or "", platforms)
+            current = self.coins.get(coin_id)
+            if current == record:
+                continue
+            if current is None:
+                added += 1
+            else:
+                changed += 1
+                self._remove(coin_id)
+            self._add(coin_id, *record)
+
+        removed_ids = [coin_id for coin_id in self.coins if coin_id not in seen]
+        for coin_id in removed_ids:
+            self._remove(coin_id)
+
+        self.updated_at = time.time()
+        return added, changed, len(removed_ids)
+
+    def load_snapshot(self) -> bool:
+        """Loads the compact on-disk snapshot. Returns False if there is none."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with gzip.open(self.snapshot_path, "rt", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Coin index snapshot could not be read: {e}")
+            return False
+        for coin_id, symbol, name, platforms in snapshot["coins"]:
+            self._add(coin_id, symbol, name, platforms)
+        self.updated_at = snapshot.get("updated_at", 0.0)
+        print(f"Coin index loaded {len(self.coins)} coins from {self.snapshot_path}")
+        return True
+
+    def save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        snapshot = {
+            "updated_at": self.updated_at,
+            "coins": [[coin_id, *record] for coin_id, record in self.coins.items()],
+        }
+        tmp_path = self.snapshot_path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(tmp_path, self.snapshot_path)
+
+    async def refresh(self) -> bool:
+        """Fetches the full coin list and applies it incrementally."""
+        url = f"{COINGECKO_API_URL}/coins/list"
+        try:
+            status, coin_list, _ = await gateway.get_json(
+                url, params={"include_platform": "true"}, priority=PRIORITY_LOW, timeout=60)
+        except Exception as e:
+            print(f"Coin index refresh failed: {e}")
+            return False
+        if status != 200 or not isinstance(coin_list, list):
+            print(f"Coin index refresh failed with status code {status}")
+            return False
+        added, changed, removed = self.apply(coin_list)
+        print(f"Coin index refreshed - {added} added, {changed} changed, {removed} removed")
+        if added or changed or removed:
+            await asyncio.to_thread(self.save_snapshot)
+        return True
+
+    async def ensure_loaded(self):
+        """Loads the snapshot on first use, fetching the list if none exists. Concurrent callers share one load."""
+        if self._loading is None or self._loading.done():
+            if self.coins:
+                return
+            self._loading = asyncio.ensure_future(self._load())
+        await asyncio.shield(self._loading)
+
+    async def _load(self):
+        loaded = await asyncio.to_thread(self.load_snapshot)
+        if not loaded:
+            await self.refresh()
+
+    async def _refresh_loop(self, interval):
+        while True:
+            await asyncio.sleep(max(0.0, self.updated_at + interval - time.time()))
+            if not await self.refresh():
+                # Back off instead of hammering the API while it is failing.
+                await asyncio.sleep(min(interval, 300))
+
+    def start_refresh(self, interval=COIN_INDEX_REFRESH_SECONDS):
+        """Schedules periodic refreshes on the running event loop."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop(interval))
+        return self._refresh_task
+
+    def stop_refresh(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def find_coin_ids(self, query: str) -> list:
+        """
+        Returns candidate coin ids for a name, symbol or id, best match first:
+        exact id, then exact name, then symbol.
+        """
+        key = query.strip().lower().lstrip("$")
+        ids = []
+        if key in self.coins:
+            ids.append(key)
+        for coin_id in self.by_name.get(key, []) + self.by_symbol.get(key, []):
+            if coin_id not in ids:
+                ids.append(coin_id)
+        return ids
+
+    def get_address(self, coin_id: str, platform: str):
+        record = self.coins.get(coin_id)
+        if record is None:
+            return None
+        return record[2].get(platform.lower())
+
+    def lookup_address(self, token_name: str, blockchain: str):
+        """
+        Resolves a token name/symbol on a blockchain to a contract address.
+
+        Returns:
+            str: The contract address, or None if the index has no match.
+        """
+        for coin_id in self.find_coin_ids(token_name):
+            address = self.get_address(coin_id, blockchain)
+            if address:
+                return address
+        return None
+
+    def __len__(self):
+        return len(self.coins)
+
+
+# Shared index used by coin_info
+coin_index = CoinIndex()
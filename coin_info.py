@@ -1,90 +1,137 @@
-import re
-import requests
-import json
+import asyncio
+import os
+
+import address_detector
+import http_pool
+from coingecko_gateway import gateway
+from token_cache import token_cache
+from coin_index import coin_index
+from market_data import market_data
+from metrics import metrics
+
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+
+# Map the detected platform to CoinGecko's expected platform identifier.
+PLATFORM_MAPPING = {
+    "ethereum": "ethereum",
+    "pump-fun": "solana",      # pump.fun tokens are Solana SPL mints
+    "tezos": "tezos",
+    "tron": "tron",
+    "cardano": "cardano",
+    "polkadot": "polkadot",
+    "solana": "solana"
+}
 
 def get_token_info(text: str):
     """
-    Given an input string that may contain a crypto token contract address,
+    Synchronous wrapper around get_token_info_async, kept for scripts and
+    callers that are not running inside an event loop.
+    """
+    return http_pool.run_sync(get_token_info_async(text))
+
+async def get_token_info_async(text: str, detections: list = None):
+    """
+    Given an input string that may contain crypto token contract addresses,
     this function will:
-      1. Scan the string for a contract address matching one of several blockchain formats:
-           - EVM-compatible (e.g., Ethereum, BSC):    \b0x[a-fA-F0-9]{40}\b
-           - Pumpfun tokens:                           \bPF[a-fA-F0-9]{40}\b
-           - Tezos:                                    \bKT1[1-9A-HJ-NP-Za-km-z]{33}\b
-           - Tron:                                     \bT[1-9A-HJ-NP-Za-km-z]{33}\b
-           - Cardano:                                  \b(?:addr1|addr_test1)[0-9a-z]{38,}\b
-           - Polkadot/Substrate:                       \b[1-9A-HJ-NP-Za-km-z]{47,48}\b
-           - Solana:                                   \b[1-9A-HJ-NP-Za-km-z]{32,44}\b
-      2. Identify the blockchain platform based on the matched regex.
-      3. Use a mapping to convert that platform to the corresponding CoinGecko API platform identifier.
-      4. Query the CoinGecko API for token information via:
+      1. Scan the string once for every contract address (see address_detector):
+           - EVM-compatible (e.g., Ethereum, BSC):    0x + 40 hex characters
+           - Pumpfun tokens:                           Solana mint ending in "pump"
+           - Tezos:                                    KT1 base58check contract
+           - Tron:                                     T base58check address
+           - Cardano:                                  addr1 / addr_test1 bech32 address
+           - Polkadot/Substrate:                       SS58 address
+           - Solana:                                   base58 32-byte public key
+      2. Use a mapping to convert each platform to the corresponding CoinGecko API platform identifier.
+      3. Query the CoinGecko API (through the token cache) for the candidates in
+         confidence order via:
          https://api.coingecko.com/api/v3/coins/<platform>/contract/<contract_address>
          
-    If successful, returns the token data in JSON format.
-    Otherwise, returns an error dictionary.
+    If successful, returns a TokenSnapshot for the best-ranked address CoinGecko knows.
+    Otherwise, returns None. Pass `detections` when the text was already run
+    through address_detector.detect_addresses() so it is not scanned twice.
     """
-    # Dictionary of regex patterns for each blockchain's contract address format.
-    patterns = {
-        "ethereum": r'\b0x[a-fA-F0-9]{40}\b',             # EVM-compatible tokens
-        "pump-fun":  r'\b[A-Za-z0-9]+pump\b',              # Pumpfun tokens (assumed format)
-        "tezos":    r'\bKT1[1-9A-HJ-NP-Za-km-z]{33}\b',     # Tezos
-        "tron":     r'\bT[1-9A-HJ-NP-Za-km-z]{33}\b',        # Tron
-        "cardano":  r'\b(?:addr1|addr_test1)[0-9a-z]{38,}\b',  # Cardano
-        "polkadot": r'\b[1-9A-HJ-NP-Za-km-z]{47,48}\b',       # Polkadot/Substrate
-        "solana":   r'\b[1-9A-HJ-NP-Za-km-z]{32,44}\b'         # Solana
-    }
-    data = None
-    detected_platform = None
-    contract_address = None
-    
-    # Scan the input text for a matching contract address.
-    for platform, pattern in patterns.items():
-        match = re.search(pattern, text)
-        if match:
-            contract_address = match.group(0)
-            detected_platform = platform
-            print(str(f'Contract address detected: {contract_address} (platform: {detected_platform})'))
-            break
-    
-    if not contract_address:
+    if detections is None:
+        with metrics.stage("address_detection_resolve"):
+            detections = address_detector.detect_addresses(text)
+    if not detections:
         print(f"========\nerror - No valid contract address found in the input text.\n Input Text - {text}\n========")
         return None
-    
-    # Map the detected platform to CoinGecko's expected platform identifier.
-    platform_mapping = {
-        "ethereum": "ethereum",
-        "pump-fun": "pump-fun",    # Support for Pumpfun tokens
-        "tezos": "tezos",
-        "tron": "tron",
-        "cardano": "cardano",
-        "polkadot": "polkadot",
-        "solana": "solana"
-    }
-    
-    if detected_platform not in platform_mapping:
+
+    for detection in detections:
+        data = await _get_detected_token_info(detection)
+        if data is not None:
+            return data
+    return None
+
+async def get_all_token_info_async(text: str, detections: list = None) -> list:
+    """
+    Resolves every distinct contract address in the text concurrently.
+
+    Args:
+        text (str): The message text.
+        detections (list): The text's Detections, if already detected.
+
+    Returns:
+        list: (Detection, TokenSnapshot) pairs for each address CoinGecko returned data for,
+              in detection-confidence order.
+    """
+    if detections is None:
+        with metrics.stage("address_detection_resolve"):
+            detections = address_detector.detect_addresses(text)
+    results = await asyncio.gather(*(_get_detected_token_info(d) for d in detections))
+    return [(d, data) for d, data in zip(detections, results) if data is not None]
+
+async def _get_detected_token_info(detection):
+    print(str(f'Contract address detected: {detection.address} (platform: {detection.platform})'))
+
+    coingecko_platform = PLATFORM_MAPPING.get(detection.platform)
+    if coingecko_platform is None:
         print("PLATFORM NOT SUPPORTED")
         return None
-    
-    coingecko_platform = platform_mapping[detected_platform]
-    
-    # Construct the CoinGecko API URL.
-    base_url = "https://api.coingecko.com/api/v3/coins"
-    api_url = f"{base_url}/{coingecko_platform}/contract/{contract_address}"
-    
+
+    # Served from the (platform, address) cache when possible.
+    return await token_cache.get(coingecko_platform, detection.address, fetch_contract_info_async,
+                                 market_data.refresh_market)
+
+async def get_contract_info_async(coingecko_platform: str, contract_address: str):
+    """
+    Token data for an already known (platform, address) pair, e.g. one resolved
+    from a token name, through the token cache.
+
+    Returns:
+        TokenSnapshot: The token data, or None if CoinGecko has no data for it.
+    """
+    return await token_cache.get(coingecko_platform, contract_address, fetch_contract_info_async,
+                                 market_data.refresh_market)
+
+async def fetch_contract_info_async(coingecko_platform: str, contract_address: str):
+    """
+    Fetches market data for a contract directly, bypassing the token cache.
+    CoinGecko and the DEX aggregator are raced by market_data (hedged,
+    first valid answer wins), so tokens too new for CoinGecko still resolve.
+
+    Returns:
+        TokenSnapshot: The token data, or None if no provider has the token.
+    """
     try:
-        response = requests.get(api_url)
-        if response.status_code != 200:
-            print( "error - Token not found or API error")
-            return None
-        data = response.json()
-        return data
+        return await market_data.fetch(coingecko_platform, contract_address)
     except Exception as e:
         print( {"error": str(e)})
         return None
 
 def get_contract_address(token_name: str, blockchain: str) -> str:
+    """
+    Synchronous wrapper around get_contract_address_async.
+    """
+    return http_pool.run_sync(get_contract_address_async(token_name, blockchain))
+
+async def get_contract_address_async(token_name: str, blockchain: str) -> str:
     """
     Given a token's name and a blockchain (e.g., "ethereum", "binance-smart-chain"),
-    queries the CoinGecko API and returns the token's contract address.
+    returns the token's contract address.
+
+    The local coin index is consulted first; the CoinGecko search + details
+    round trips are only made when the index has no match.
 
     Args:
         token_name (str): The name of the token to search for.
@@ -93,15 +140,20 @@ def get_contract_address(token_name: str, blockchain: str) -> str:
     Returns:
         str: The contract address if found, otherwise None.
     """
+    # Step 0: Resolve locally from the coin-list index.
+    await coin_index.ensure_loaded()
+    contract_address = coin_index.lookup_address(token_name, blockchain)
+    if contract_address:
+        return contract_address
+
     # Step 1: Search for the token using the CoinGecko search endpoint.
-    search_url = "https://api.coingecko.com/api/v3/search"
+    search_url = f"{COINGECKO_API_URL}/search"
     params = {"query": token_name}
-    response = requests.get(search_url, params=params)
-    if response.status_code != 200:
-        print(f"Error: Search API request failed with status code {response.status_code}")
+    status, search_data, _ = await gateway.get_json(search_url, params=params)
+    if status != 200:
+        print(f"Error: Search API request failed with status code {status}")
         return None
 
-    search_data = response.json()
     coins = search_data.get("coins", [])
     if not coins:
         print(f"No coins found for token name: {token_name}")
@@ -117,7 +169,7 @@ def get_contract_address(token_name: str, blockchain: str) -> str:
         coin_id = coins[0].get("id")
     
     # Step 2: Retrieve detailed coin information to access the platforms data.
-    details_url = f"https://api.coingecko.com/api/v3/coins/{coin_id}"
+    details_url = f"{COINGECKO_API_URL}/coins/{coin_id}"
     # Limit data to only what we need to reduce payload.
     details_params = {
         "localization": "false",
@@ -127,12 +179,11 @@ def get_contract_address(token_name: str, blockchain: str) -> str:
         "developer_data": "false",
         "sparkline": "false"
     }
-    details_response = requests.get(details_url, params=details_params)
-    if details_response.status_code != 200:
-        print(f"Error: Details API request failed with status code {details_response.status_code}")
+    status, details_data, _ = await gateway.get_json(details_url, params=details_params)
+    if status != 200:
+        print(f"Error: Details API request failed with status code {status}")
         return None
 
-    details_data = details_response.json()
     platforms = details_data.get("platforms", {})
 
     # Step 3: Extract the contract address for the specified blockchain.
@@ -0,0 +1,177 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import http_pool
+from singleflight import SingleFlight
+
+# Gateway settings, overridable from the .env file
+COINGECKO_RATE_PER_MINUTE = float(os.getenv("COINGECKO_RATE_PER_MINUTE", "30"))
+COINGECKO_BURST = int(os.getenv("COINGECKO_BURST", "5"))
+COINGECKO_MAX_RETRIES = int(os.getenv("COINGECKO_MAX_RETRIES", "4"))
+COINGECKO_BACKOFF_BASE = float(os.getenv("COINGECKO_BACKOFF_BASE", "1.0"))
+COINGECKO_BACKOFF_MAX = float(os.getenv("COINGECKO_BACKOFF_MAX", "60"))
+
+# Lower value = served first when requests are queued for a token.
+PRIORITY_HIGH = 0     # a user is waiting on the answer
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2      # background refreshes
+
+
+class TokenBucket:
+    """
+    Async token bucket with a priority wait queue.
+
+    Callers that find the bucket empty are queued (not rejected) and released
+    in (priority, arrival) order as tokens refill. pause() holds every caller
+    back until a deadline, e.g. after a 429 with Retry-After.
+    """
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._waiters = []      # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._dispatcher = None
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def scale(self, share: float):
+        """Keeps only `share` of the rate and burst, for processes that split one API limit between them."""
+        self.rate *= share
+        self.capacity = max(1, int(self.capacity * share))
+        self.tokens = min(self.tokens, float(self.capacity))
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL):
+        now = time.monotonic()
+        self._refill(now)
+        if not self._waiters and now >= self.paused_until and self.tokens >= 1:
+            self.tokens -= 1
+            return
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is not None and self._dispatcher.get_loop() is not loop:
+            # Left over from a loop that has since been closed (sync wrappers).
+            self._dispatcher = None
+            self._waiters = []
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        while self._waiters:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():       # caller was cancelled while queued
+                continue
+            self.tokens -= 1
+            future.set_result(None)
+
+
+def _retry_after_seconds(headers: dict):
+    """Parses a Retry-After header (delta-seconds or HTTP date). Returns None if absent."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CoinGeckoGateway:
+    """
+    Single outbound path for every CoinGecko request.
+
+      - identical concurrent requests share one in-flight call (singleflight)
+      - requests wait on a token bucket instead of tripping the API's rate limit
+      - 429 / 5xx responses are retried, honouring Retry-After, with jittered
+        exponential backoff; a 429 also pauses the bucket for everyone
+    """
+
+    def __init__(self, rate_per_minute=COINGECKO_RATE_PER_MINUTE, burst=COINGECKO_BURST,
+                 max_retries=COINGECKO_MAX_RETRIES):
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.max_retries = max_retries
+        self._flight = SingleFlight()
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0,
+                      "queue_wait_total": 0.0, "queue_wait_max": 0.0, "queue_waits": 0}
+
+    @property
+    def coalesced(self) -> int:
+        return self._flight.coalesced
+
+    def snapshot(self) -> dict:
+        """Returns the gateway counters, including average queue wait and coalesced requests."""
+        stats = dict(self.stats, coalesced=self.coalesced, queue_depth=self.bucket.queue_depth())
+        stats["queue_wait_avg"] = stats["queue_wait_total"] / stats["queue_waits"] if stats["queue_waits"] else 0.0
+        return stats
+
+    async def get_json(self, url: str, params: dict = None, priority: int = PRIORITY_NORMAL,
+                       timeout: float = None) -> tuple:
+        """
+        Performs a rate-limited, coalesced GET against CoinGecko.
+
+        Returns:
+            tuple: (status_code, parsed JSON body or None, response headers), as http_pool.request_json.
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        return await self._flight.do(key, lambda: self._request(url, params, priority, timeout))
+
+    async def _request(self, url, params, priority, timeout):
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            await self.bucket.acquire(priority)
+            waited = time.monotonic() - queued_at
+            self.stats["queue_waits"] += 1
+            self.stats["queue_wait_total"] += waited
+            self.stats["queue_wait_max"] = max(self.stats["queue_wait_max"], waited)
+
+            self.stats["requests"] += 1
+            status, data, headers = await http_pool.request_json(url, params=params, timeout=timeout)
+            if (status != 429 and status < 500) or attempt >= self.max_retries:
+                return status, data, headers
+
+            delay = _retry_after_seconds(headers)
+            if delay is None:
+                delay = min(COINGECKO_BACKOFF_MAX, COINGECKO_BACKOFF_BASE * 2 ** attempt)
+            delay *= random.uniform(1.0, 1.5)   # jitter so queued callers don't stampede together
+            if status == 429:
+                self.stats["rate_limited"] += 1
+                self.bucket.pause(delay)
+            self.stats["retries"] += 1
+            attempt += 1
+            print(f"CoinGecko returned {status}, retrying in {delay:.1f}s (attempt {attempt}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+
+# Shared gateway used by coin_info and coin_index
+gateway = CoinGeckoGateway()
@@ -1,10 +1,27 @@
-import nest_asyncio
-nest_asyncio.apply()  # Allow nested event loops (useful in VS Code)
+# Settings are read when modules are imported, so the .env file is loaded first
+from dotenv import load_dotenv
+load_dotenv()
 
-from telethon import TelegramClient, events
-from openai import OpenAI
-from gpt_actions import gpt_client, call_chatgpt, extract_token_name_and_platform, gpt_cryptoanalysis
+import http_pool
+from coin_index import coin_index
+from mention_extractor import mention_extractor
+from address_detector import detect_addresses
+from message_pipeline import MessagePipeline
+from llm_client import llm_client
+from analysis_cache import analysis_cache
+from gpt_actions import resolve_token_info, analyze_token, analyze_token_stream
+from telegram_stream import StreamingReply, FanOutReply, stream_to_telegram, first_token_latency
+from call_router import CallRouter, load_routes
+from call_store import call_store
+from worker_pool import worker_pool
+from summary_card import SUMMARY_CARD, DEEP_ANALYSIS_WORKERS, DEEP_ANALYSIS_MAX_BACKLOG, SKIPPED_NOTE, render_card
+from metrics import metrics, new_correlation_id
+from clients import clients
+import argparse
+import asyncio
+import contextlib
 import os
+import sys
 
 # Replace with your own credentials from my.telegram.org
 api_id = int(os.getenv("APP_API_ID"))          # e.g., 1234567 (as an integer)
@@ -12,58 +29,488 @@ api_hash = os.getenv("APP_API_HASH")             # e.g., 'abcdef1234567890abcdef
 session_name = 'user_session'                    # Session file name
 
 # Configure the source and target chats:
-# Pass numeric IDs as integers.
+# Pass numeric IDs as integers. These form the only route unless ROUTES_FILE
+# lists more (see call_router.load_routes).
 #source_chat = int(os.getenv("ALGORA_BOT_USERID"))  # The source chat's numeric ID
 source_chat = int(os.getenv("MY_USER_ID"))  # The source chat's numeric ID
 target_chat = int(os.getenv("CHAT_ID"))            # The target group chat's numeric ID
 
+# Stream the analysis into Telegram via progressive edits instead of one final message
+stream_analysis = os.getenv("STREAM_ANALYSIS", "true").lower() in ("1", "true", "yes")
 
+# Seconds between pipeline stats reports (0 disables them)
+pipeline_stats_interval = float(os.getenv("PIPELINE_STATS_INTERVAL", "60"))
 
-# gpt_client = OpenAI(
-#     api_key=os.getenv("OPENAI_API_KEY"),  # This is the default and can be omitted
-# )
-# Create the Telegram client (logs in as a user)
-client = TelegramClient(session_name, api_id, api_hash)
+# Shown in the placeholders of a call the pipeline dropped (PIPELINE_OVERFLOW drop_oldest / drop_duplicates)
+DROPPED_NOTE = "Analysis dropped - the bot is under heavy load."
 
 
-@client.on(events.NewMessage(chats=source_chat))
+def build_telegram_client():
+    """Creates the Telegram client (logs in as a user) and subscribes handler() to the source chats."""
+    from telethon import TelegramClient, events
+
+    telegram = TelegramClient(session_name, api_id, api_hash)
+    telegram.add_event_handler(handler, events.NewMessage(chats=router.sources))
+    return telegram
+
+
+# The Telegram client, built on first use - importing this module neither loads Telethon nor opens the session
+client = clients.register("telegram", build_telegram_client)
+
+
+async def analyze_message(call):
+    """Pipeline analysis stage: runs the CoinGecko + ChatGPT analysis for one call."""
+    if worker_pool.enabled:
+        call.token_info, text = await worker_pool.analyze(call.message.message, call.key,
+                                                          detections=call.detections)
+        if call.token_info is not None:
+            from watchlist import watchlist     # numpy-backed, imported on first use
+            watchlist.watch(call.token_info)    # the worker's watchlist is not polled
+        return text
+    call.token_info = await resolve_token_info(call.message.message, call.detections)
+    return await analyze_token(call.message.message, call.token_info)
+
+
+def record_callers(call):
+    """Writes the messages that made a finished call to the call store."""
+    if call.token_info is None and call.key is None:
+        call.callers.clear()    # no token found - not a call
+        return
+    while call.callers:
+        source, message, called_at = call.callers.pop(0)
+        call_store.record(source, message.id, call.token_info, call.result, called_at, contract=call.key)
+
+
+async def deliver_to(message, target, text, card=None):
+    """
+    Forwards a call message to one target chat and sends the analysis after it.
+    With a summary card, the card comes first and the analysis (if any) replies to it.
+    """
+    # Forward the original message to the target group
+    with metrics.stage("telegram_forward"):
+        await client.forward_messages(entity=target, messages=message)
+    print(f"Forwarded message {message.id} to {target}")
+
+    reply_to = None
+    if card is not None:
+        with metrics.stage("telegram_send"):
+            reply_to = await client.send_message(entity=target, message=card)
+        metrics.event("card_delivered")
+    if text is None:
+        return
+
+    # Send ChatGPT's response to the target group
+    with metrics.stage("telegram_send"):
+        await client.send_message(entity=target, message=text, reply_to=reply_to)
+    metrics.event("delivered")
+    print(f"Sent ChatGPT response to {target}.")
+
+
+async def deliver_pending(call):
+    """Sends a finished analysis, after its summary card, to the targets that joined the call while it was running."""
+    # A skipped deep analysis leaves the card as the result; it is only sent once
+    card = call.card if call.card is not call.result else None
+    while call.pending:
+        message, target = call.pending.pop(0)
+        if call.result is None and card is None:
+            print(f"No analysis produced for message {message.id}; skipping delivery to {target}.")
+            continue
+        try:
+            await deliver_to(message, target, call.result, card=card)
+        except Exception as e:
+            print(f"Error delivering to {target}: {e}")
+
+
+async def deliver_analysis(call, chatgpt_response):
+    """
+    Pipeline delivery stage, called in source-message order. For every
+    (message, target) pair routed to the call:
+      1. Forwards the original message to the target chat.
+      2. Sends ChatGPT's response to the target chat.
+    """
+    call.result = chatgpt_response
+    call.finished = True
+    record_callers(call)
+    call.pending[:0] = call.deliveries
+    await deliver_pending(call)
+
+
+async def stream_analysis_message(call):
+    """Streaming pipeline stage: streams the analysis into the reply placeholders sent by handler()."""
+    if worker_pool.enabled:
+        remote = worker_pool.analyze_stream(call.message.message, call.key, detections=call.detections)
+        reply = await stream_to_telegram(client, None, remote, reply=call.reply)
+        call.token_info = remote.token_info
+        if call.token_info is not None:
+            from watchlist import watchlist     # numpy-backed, imported on first use
+            watchlist.watch(call.token_info)    # the worker's watchlist is not polled
+        return reply
+    call.token_info = await resolve_token_info(call.message.message, call.detections)
+    chunks = analyze_token_stream(call.message.message, call.token_info)
+    return await stream_to_telegram(client, None, chunks, reply=call.reply)
+
+
+async def finish_streamed_analysis(call, reply):
+    """Streaming delivery stage - the replies are already visible; late subscribers get the final text."""
+    call.result = reply.text if reply is not None and reply.text.strip() else None
+    call.finished = True
+    record_callers(call)
+    if reply is not None:
+        metrics.event("delivered")
+        print(f"Streamed ChatGPT response for message {call.message.id} in {len(reply.messages)} message(s).")
+    await deliver_pending(call)
+
+
+async def resolve_call(call):
+    """Tier 1 pipeline stage: finds the call's token and renders its summary card - no LLM analysis."""
+    if worker_pool.enabled:
+        # Lookups stay in the shard worker; the ingester only renders the card
+        call.token_info = await worker_pool.resolve(call.message.message, call.key, call.detections)
+    else:
+        call.token_info = await resolve_token_info(call.message.message, call.detections)
+    if call.token_info is None:
+        return None
+    with metrics.stage("summary_card"):
+        return render_card(call.token_info)
+
+
+async def drop_call(call):
+    """Pipeline on_drop hook: a dropped call will never be analysed, so its placeholders say so."""
+    router.discard(call)        # the next call of the contract starts a new call
+    if call.pending:
+        # Targets merged into the call were not forwarded anything yet; they get nothing rather than wait forever
+        print(f"Dropping {len(call.pending)} merged delivery(ies) of the call in message {call.message.id}.")
+    call.pending.clear()
+    call.deliveries = []
+    if call.reply is not None:
+        await call.reply.finish(DROPPED_NOTE)
+        call.reply = None
+    print(f"Pipeline dropped the call in message {call.message.id}.")
+
+
+async def send_each(targets, text):
+    """Sends one text to several (target chat, message to reply to or None) pairs, skipping failing targets."""
+    sent = []
+    for target, reply_to in targets:
+        try:
+            with metrics.stage("telegram_send"):
+                sent.append((target, await client.send_message(entity=target, message=text, reply_to=reply_to)))
+        except Exception as e:
+            print(f"Error sending to {target}: {e}")
+    return sent
+
+
+async def deliver_card(call, card):
+    """
+    Tier 1 delivery stage: shows the summary card in every target chat, then
+    queues the LLM deep dive. In streaming mode the card replaces the
+    placeholder; without market data there is no card and the deep dive goes
+    where it would have been.
+    """
+    call.card = card
+    if call.token_info is not None:
+        from watchlist import watchlist
+        watchlist.watch(call.token_info)    # follow the price after the call
+    if stream_analysis:
+        if card is not None:
+            await call.reply.replace(card)
+            call.cards = [(reply.entity, reply.messages[-1]) for reply in call.reply.replies]
+            call.reply = None
+    else:
+        for message, target in call.deliveries:
+            try:
+                with metrics.stage("telegram_forward"):
+                    await client.forward_messages(entity=target, messages=message)
+                print(f"Forwarded message {message.id} to {target}")
+            except Exception as e:
+                print(f"Error forwarding to {target}: {e}")
+                continue
+            if card is None:
+                call.cards.append((target, None))
+            else:
+                call.cards += await send_each([(target, None)], card)
+        call.deliveries = []
+    if card is not None:
+        metrics.event("card_delivered")
+        print(f"Sent summary card for message {call.message.id}.")
+    await queue_deep_analysis(call)
+
+
+async def queue_deep_analysis(call):
+    """Queues the tier 2 analysis, or skips it when the deep analysis backlog is full."""
+    if deep_pipeline.queue_depth() >= deep_pipeline.max_queue:
+        deep_analysis_stats["skipped"] += 1
+        metrics.event("deep_analysis_skipped")
+        print(f"Deep analysis backlog full; skipping the LLM analysis of message {call.message.id}.")
+        if call.reply is not None:
+            await call.reply.finish(SKIPPED_NOTE)
+        elif call.card is None:
+            await send_each(call.cards, SKIPPED_NOTE)
+        call.result = call.card
+        call.finished = True
+        record_callers(call)
+        await deliver_pending(call)
+        return
+    deep_analysis_stats["queued"] += 1
+    await deep_pipeline.submit(call)
+
+
+async def deep_analyze(call):
+    """Tier 2 pipeline stage: the LLM analysis of an already resolved call."""
+    if worker_pool.enabled:
+        _, text = await worker_pool.analyze(call.message.message, call.key, token_info=call.token_info)
+        return text
+    return await analyze_token(call.message.message, call.token_info)
+
+
+async def deliver_deep_analysis(call, text):
+    """Tier 2 delivery stage: sends the analysis in reply to each target's card."""
+    call.result = text
+    call.finished = True
+    record_callers(call)
+    if text is not None:
+        await send_each(call.cards, text)
+        metrics.event("delivered")
+        print(f"Sent ChatGPT response for message {call.message.id} to {len(call.cards)} target(s).")
+    await deliver_pending(call)
+
+
+async def stream_deep_analysis(call):
+    """Streaming tier 2 stage: streams the analysis into replies to the cards, or into the placeholders."""
+    reply = call.reply
+    if reply is None:
+        replies = [StreamingReply(client, target, reply_to=card) for target, card in call.cards]
+        for result in await asyncio.gather(*(r.start() for r in replies), return_exceptions=True):
+            if isinstance(result, Exception):
+                print(f"Error starting the deep analysis reply: {result}")
+        reply = FanOutReply(r for r in replies if r.messages)
+    if worker_pool.enabled:
+        chunks = worker_pool.analyze_stream(call.message.message, call.key, token_info=call.token_info)
+    else:
+        chunks = analyze_token_stream(call.message.message, call.token_info)
+    return await stream_to_telegram(client, None, chunks, reply=reply)
+
+
+# Two tiers: the card pipeline resolves the token and posts the summary card,
+# the deep analysis pipeline runs the LLM analysis with its own, smaller worker
+# pool and a bounded backlog, so a burst of calls still gets every card.
+deep_pipeline = None
+deep_analysis_stats = {"queued": 0, "skipped": 0}
+if SUMMARY_CARD:
+    pipeline = MessagePipeline(resolve_call, deliver_card, on_drop=drop_call)
+    deep_pipeline = MessagePipeline(stream_deep_analysis if stream_analysis else deep_analyze,
+                                    finish_streamed_analysis if stream_analysis else deliver_deep_analysis,
+                                    workers=DEEP_ANALYSIS_WORKERS, max_queue=DEEP_ANALYSIS_MAX_BACKLOG,
+                                    overflow="block", name="deep_analysis")
+elif stream_analysis:
+    pipeline = MessagePipeline(stream_analysis_message, finish_streamed_analysis, on_drop=drop_call)
+else:
+    pipeline = MessagePipeline(analyze_message, deliver_analysis, on_drop=drop_call)
+
+async def post_watchlist_alert(text):
+    """Sends a watchlist price alert for an earlier call to the target chat."""
+    with metrics.stage("telegram_send"):
+        await client.send_message(entity=target_chat, message=text)
+    print(f"Sent watchlist alert to {target_chat}.")
+
+
+# Which targets receive calls from which sources; repeat calls of a contract share one analysis
+router = CallRouter(load_routes(default_source=source_chat, default_target=target_chat))
 
 
 async def handler(event):
     """
-    When a new message arrives from the source chat:
-      1. It calls ChatGPT to get a response based on the message.
-      2. Forwards the original message to the target chat.
-      3. Sends ChatGPT's response to the target chat.
+    When a new message arrives from a source chat it is routed to the target
+    chats subscribed to that source. A contract already called in the dedup
+    window joins the existing call - its new targets get the same analysis -
+    otherwise the call is queued on the analysis pipeline; workers run the
+    ChatGPT analysis concurrently and the results are forwarded/sent to the
+    target chats in arrival order.
+
+    In streaming mode the message is forwarded and a placeholder reply is
+    posted immediately to each target, and the worker edits the analysis into
+    them as it streams.
+
+    Each message gets a correlation ID that tags its stage metrics and JSON logs.
     """
     try:
         message_text = event.message.message
         if not message_text:
             print("No text found in the message; skipping.")
             return
+        new_correlation_id(event.message.id)
+        metrics.event("received")
 
-        # Get ChatGPT's response asynchronously
-        #chatgpt_response = await gpt_cryptoanalysis(message_text)
-        chatgpt_response = await gpt_cryptoanalysis(message_text)
+        # Key on the best detected contract address so repeat calls can be merged/dropped
+        with metrics.stage("address_detection"):
+            detections = detect_addresses(message_text)
+        address = detections[0].address if detections else None
 
-        # Forward the original message to the target group
-        await client.forward_messages(entity=target_chat, messages=event.message)
-        print(f"Forwarded message {event.message.id} from {source_chat} to {target_chat}")
+        call, deliveries, is_new = router.route(event.chat_id, event.message, address)
+        if call.finished:
+            record_callers(call)
+        if not deliveries:
+            metrics.event("deduplicated")
+            print(f"Message {event.message.id} repeats a call of {address} every target already has; skipping.")
+            return
+        if not is_new:
+            metrics.event("merged")
+            print(f"Message {event.message.id} joins the call of {address} for {len(deliveries)} more target(s).")
+            call.pending.extend(deliveries)
+            if call.finished:
+                await deliver_pending(call)
+            return
 
-        # Send ChatGPT's response to the target group
-        await client.send_message(entity=target_chat, message=chatgpt_response)
-        print("Sent ChatGPT response to the target chat.")
+        call.deliveries = deliveries
+        call.detections = detections    # resolving the token reuses them instead of detecting again
+        try:
+            if stream_analysis:
+                replies = []
+                for message, target in deliveries:
+                    # A failing target is dropped, the way FanOutReply drops it; the others still get the call
+                    try:
+                        with metrics.stage("telegram_forward"):
+                            await client.forward_messages(entity=target, messages=message)
+                        print(f"Forwarded message {message.id} to {target}")
+                        reply = StreamingReply(client, target)
+                        await reply.start()
+                    except Exception as e:
+                        print(f"Error starting the reply in {target}: {e}")
+                        call.targets.discard(target)    # a later call of the contract may reach it
+                        continue
+                    replies.append(reply)
+                call.deliveries = []
+                call.reply = FanOutReply(replies)
+            await pipeline.submit(call, key=address or message_text)     # drop_call() runs if it is dropped
+        except BaseException:
+            # The call will never be analysed; it must not swallow later calls of its contract
+            router.discard(call)
+            raise
 
     except Exception as e:
         print(f"Error in handler: {e}")
 
 
+async def report_pipeline_stats(interval):
+    """Periodically prints live queue depth and per-stage latency."""
+    while True:
+        await asyncio.sleep(interval)
+        stats = pipeline.stats()
+        stages = " | ".join(
+            f"{stage} p50={s['p50']:.2f}s p95={s['p95']:.2f}s" for stage, s in stats["latency"].items() if s["count"]
+        )
+        if stream_analysis and first_token_latency.count:
+            ttft = first_token_latency.summary()
+            stages += f" | first visible token p50={ttft['p50']:.2f}s p95={ttft['p95']:.2f}s"
+        cache = analysis_cache.snapshot()
+        routed = router.stats
+        stages += f" | calls {routed['calls']}, merged {routed['merged']}, duplicates skipped {routed['duplicates']}"
+        stages += f" | analysis cache hit rate {cache['hit_rate']:.0%}, LLM spend saved ${cache['saved_usd']:.4f}"
+        if deep_pipeline is not None:
+            stages += f" | deep analysis backlog {deep_pipeline.queue_depth()}, " \
+                      f"skipped {deep_analysis_stats['skipped']} of {sum(deep_analysis_stats.values())}"
+        if worker_pool.enabled:
+            workers = worker_pool.snapshot()
+            stages += f" | worker jobs in flight {workers['per_shard']}, errors {workers['errors']}, " \
+                      f"restarts {workers['restarts']}"
+        print(f"Pipeline - queue depth {stats['queue_depth']}, awaiting delivery {stats['awaiting_delivery']}, "
+              f"dropped {stats['dropped']}, failed {stats['failed']} | {stages}")
+
+
+async def warm_up():
+    """Loads the coin index and builds the mention automaton in the background, off the startup path."""
+    try:
+        await coin_index.ensure_loaded()
+        coin_index.start_refresh()
+        await mention_extractor.ensure_ready()
+    except Exception as e:
+        print(f"Warm-up failed, continuing cold: {e}")
+
+
+def _untimed(step):
+    return contextlib.nullcontext()
+
+
+async def start_services(timed=_untimed):
+    """
+    Starts everything needed before the first message can be processed.
+    Calls that need the coin index before the warm-up is done wait for it.
+
+    Args:
+        timed (callable): timed(step name) returns a context manager wrapped around each step (see startup_profile).
+
+    Returns:
+        asyncio.Task: The background warm-up.
+    """
+    with timed("watchlist polling"):
+        # numpy-backed, so imported here rather than with the module
+        from watchlist import watchlist
+        watchlist.on_alert = post_watchlist_alert
+        watchlist.on_prices = call_store.record_prices     # current prices for returns since each call
+        watchlist.start_polling()
+    with timed("worker processes"):
+        await worker_pool.start()
+    with timed("pipelines"):
+        await pipeline.start()
+        if deep_pipeline is not None:
+            await deep_pipeline.start()
+    if deep_pipeline is not None:
+        metrics.register_gauge("deep_analysis_queue_depth", "Calls waiting for their LLM deep analysis",
+                               deep_pipeline.queue_depth)
+    metrics.register_gauge("pipeline_queue_depth", "Messages waiting for an analysis worker", pipeline.queue_depth)
+    metrics.register_gauge("pipeline_awaiting_delivery", "Analysed messages waiting for in-order delivery",
+                           lambda: pipeline.stats()["awaiting_delivery"])
+    metrics.register_gauge("watchlist_tokens", "Called tokens whose price is followed", watchlist.__len__)
+    metrics.register_gauge("router_active_calls", "Contracts inside the dedup window", router.active_calls)
+    if worker_pool.enabled:
+        metrics.register_gauge("worker_jobs_in_flight", "Analyses running in worker processes", worker_pool.in_flight)
+    with timed("metrics server"):
+        await metrics.serve()
+    return asyncio.create_task(warm_up())
+
+
+async def stop_services(warm_up_task=None):
+    """Stops what start_services() started and flushes the call store."""
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+        await asyncio.gather(warm_up_task, return_exceptions=True)
+    await pipeline.stop()
+    if deep_pipeline is not None:
+        await deep_pipeline.stop()
+    await worker_pool.stop()
+    await metrics.stop()
+    coin_index.stop_refresh()
+    if "watchlist" in sys.modules:
+        sys.modules["watchlist"].watchlist.stop_polling()
+    await call_store.stop()
+    await llm_client.close()
+    await http_pool.close_session()
+
 
 async def main():
     """Starts the client and keeps it running until disconnected."""
     print("Client is running. Press Ctrl+C to stop.")
-    await client.run_until_disconnected()
+    warm_up_task = await start_services()
+    stats_task = None
+    if pipeline_stats_interval > 0:
+        stats_task = asyncio.create_task(report_pipeline_stats(pipeline_stats_interval))
+    try:
+        await client.run_until_disconnected()
+    finally:
+        if stats_task is not None:
+            stats_task.cancel()
+        await stop_services(warm_up_task)
 
 if __name__ == "__main__":
-    client.start()  # Logs in and creates session if needed
-    client.loop.run_until_complete(main())
+    parser = argparse.ArgumentParser(description="Forwards crypto calls from the source chats with an analysis.")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print where startup time goes (imports, client and service init) and exit")
+    args = parser.parse_args()
+    if args.profile_startup:
+        import startup_profile
+        startup_profile.profile(sys.modules[__name__])
+    else:
+        import nest_asyncio
+        nest_asyncio.apply()  # Allow nested event loops (useful in VS Code)
+        client.start()  # Logs in and creates session if needed
+        client.loop.run_until_complete(main())
@@ -0,0 +1,50 @@
+import asyncio
+import json
+import os
+
+# Path for debug dumps of the data sent to ChatGPT; empty (default) disables dumping
+TOKEN_INFO_DUMP = os.getenv("TOKEN_INFO_DUMP", "")
+
+
+class AsyncJsonWriter:
+    """
+    Writes JSON debug dumps off the event loop.
+
+    write() never blocks the caller: the latest document is handed to a
+    background task which writes it in a worker thread. If several dumps
+    arrive while a write is in progress only the newest one is written.
+    """
+
+    def __init__(self, path=TOKEN_INFO_DUMP):
+        self.path = path
+        self._pending = None
+        self._task = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def write(self, document):
+        if not self.enabled:
+            return
+        self._pending = document
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    def _write_file(self, document):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as outfile:
+            json.dump(document, outfile, indent=4, default=str)
+        os.replace(tmp_path, self.path)
+
+    async def _drain(self):
+        while self._pending is not None:
+            document, self._pending = self._pending, None
+            try:
+                await asyncio.to_thread(self._write_file, document)
+            except OSError as e:
+                print(f"Debug dump to {self.path} failed: {e}")
+
+
+# Shared writer for the token data dump (formerly token_info.json)
+token_info_writer = AsyncJsonWriter()
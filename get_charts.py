@@ -1,192 +1,215 @@
+import asyncio
 import os
-import time
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service as ChromeService
+import tempfile
 from string import Template
 
+from browser_pool import browser_pool
+from chart_cache import chart_cache
+import chart_renderer
+
+from http_pool import run_sync
+from tradingview_symbols import symbol_resolver
 
-import requests
 
 def get_tradingview_symbol(query, exchange='BINANCE', asset_type='crypto', lang='en'):
     """
-    Query TradingView's symbol search endpoint to get symbol details for a crypto token.
+    Look up the TradingView symbol for a crypto token (cached, see tradingview_symbols.py).
 
     Parameters:
         query (str): The search term (e.g., "PEPE", "BTC").
-        exchange (str): The exchange to filter by (default is 'BINANCE').
+        exchange (str): The preferred exchange (default is 'BINANCE').
         asset_type (str): The asset type (default is 'crypto').
         lang (str): The language for the results (default is 'en').
 
     Returns:
-        dict or None: The first matching symbol's details as a dictionary, or None if no match is found.
+        dict or None: The best matching symbol's details as a dictionary, or None if no match is found.
     """
-    url = "https://symbol-search.tradingview.com/symbol_search/"
-    params = {
-        'text': query,
-        'exchange': exchange,
-        'lang': lang,
-        'type': asset_type,
-    }
-    # It can help to set a common browser User-Agent header.
-    headers = {
-        'User-Agent': 'Mozilla/5.0'
-    }
-    
-    try:
-        response = requests.get(url, params=params, headers=headers)
-        response.raise_for_status()  # Raises HTTPError if the request returned an unsuccessful status code.
-        results = response.json()
-        
-        if results:
-            # Return the first match (or modify this logic to select the best match)
-            return results[0]
-        else:
-            print("No matching symbols found for query:", query)
-            return None
-
-    except requests.RequestException as e:
-        print("An error occurred during the request:", e)
-        return None
+    return run_sync(symbol_resolver.resolve(query, exchange, asset_type, lang))
 
 
+async def get_tradingview_symbols_async(queries, exchange='BINANCE', asset_type='crypto', lang='en'):
+    """Resolves a basket of tickers concurrently. Returns a dict of query -> symbol details (or None)."""
+    return await symbol_resolver.resolve_many(queries, exchange, asset_type, lang)
 
 
+# Chart intervals rendered for each symbol: (TradingView interval, file suffix)
+CHART_INTERVALS = (("D", "1day"), ("W", "1week"), ("M", "1month"))
 
+# Chart backend used by generate_charts_async: "selenium" (TradingView widgets) or "native" (chart_renderer)
+CHART_BACKEND = os.getenv("CHART_BACKEND", "selenium")
 
-# -----------------------------------------------------------------------------
-# 1. Create an HTML file that embeds TradingView widgets for the PEPE token.
-# 2. Saves the 1 day, 1 week, and 1 month charts as .png files in local directory, and local variables
-# Returns the local variables for the charts (TradingView Containers)
-# -----------------------------------------------------------------------------
-
-def generate_charts(exchange, symbol):
+# Seconds to wait for a widget to finish rendering before giving up on it
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "30"))
 
-    html_content = Template("""
+CHART_TEMPLATE = Template("""
     <!DOCTYPE html>
     <html>
     <head>
     <meta charset="UTF-8">
-    <title>PEPE TradingView Charts</title>
+    <title>$symbol TradingView Chart</title>
     <!-- Load TradingView's widget library -->
     <script type="text/javascript" src="https://s3.tradingview.com/tv.js"></script>
     </head>
     <body>
-    <!-- Container for 1-Day Chart -->
-    <div id="tradingview_chart_day" style="height: 400px; margin-bottom: 20px;"></div>
-    <!-- Container for 1-Week Chart -->
-    <div id="tradingview_chart_week" style="height: 400px; margin-bottom: 20px;"></div>
-    <!-- Container for 1-Month Chart -->
-    <div id="tradingview_chart_month" style="height: 400px; margin-bottom: 20px;"></div>
-    
+    <div id="tradingview_chart" style="height: 400px; margin-bottom: 20px;"></div>
     <script type="text/javascript">
-        // 1-Day (Daily) Chart Widget
         new TradingView.widget({
         "width": "100%",
         "height": 400,
         "symbol": "$exchange:$symbol",
-        "interval": "D",
+        "interval": "$interval",
         "timezone": "Etc/UTC",
-        "theme": "light",
+        "theme": "$theme",
         "style": "1",
         "locale": "en",
         "toolbar_bg": "#f1f3f6",
         "enable_publishing": false,
-        "container_id": "tradingview_chart_day"
-        });
-        
-        // 1-Week (Weekly) Chart Widget
-        new TradingView.widget({
-        "width": "100%",
-        "height": 400,
-        "symbol": "$exchange:$symbol",
-        "interval": "W",
-        "timezone": "Etc/UTC",
-        "theme": "light",
-        "style": "1",
-        "locale": "en",
-        "toolbar_bg": "#f1f3f6",
-        "enable_publishing": false,
-        "container_id": "tradingview_chart_week"
-        });
-        
-        // 1-Month (Monthly) Chart Widget
-        new TradingView.widget({
-        "width": "100%",
-        "height": 400,
-        "symbol": "$exchange:$symbol",
-        "interval": "M",
-        "timezone": "Etc/UTC",
-        "theme": "light",
-        "style": "1",
-        "locale": "en",
-        "toolbar_bg": "#f1f3f6",
-        "enable_publishing": false,
-        "container_id": "tradingview_chart_month"
+        "container_id": "tradingview_chart"
         });
     </script>
     </body>
     </html>
-    """).substitute(exchange=exchange, symbol=symbol)
-
-    # Write the HTML content to a local file.
-    html_file = f"tradingview_{symbol}.html"
-    with open(html_file, "w", encoding="utf-8") as f:
-        f.write(html_content)
-
-    # -----------------------------------------------------------------------------
-    # 2. Set up Selenium to open the HTML file in a headless Chrome browser.
-    # -----------------------------------------------------------------------------
-    chrome_options = webdriver.ChromeOptions()
-    chrome_options.add_argument("--headless")            # Run Chrome in headless mode.
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-
-    # Use webdriver-manager to automatically handle the ChromeDriver binary.
-    service = ChromeService(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-
-    # Construct the file URL for the HTML file.
-    file_url = "file://" + os.path.abspath(html_file)
-    driver.get(file_url)
-
-    # -----------------------------------------------------------------------------
-    # 3. Wait for the TradingView widgets to load.
-    #    (Adjust the sleep duration if necessary.)
-    # -----------------------------------------------------------------------------
-    print("Waiting for charts to render...")
-    time.sleep(20)  # Waiting 20 seconds for the widgets to fully load.
-
-    # -----------------------------------------------------------------------------
-    # 4. Locate each chart container and take a screenshot.
-    # -----------------------------------------------------------------------------
+    """)
+
+
+def _chart_rendered(driver):
+    """
+    Readiness check for a TradingView widget: its iframe exists and the chart
+    canvases inside it have been drawn. Leaves the driver in the top-level document.
+    """
+    from selenium.webdriver.common.by import By
+
+    frames = driver.find_elements(By.CSS_SELECTOR, "#tradingview_chart iframe")
+    if not frames:
+        return False
+    driver.switch_to.frame(frames[0])
+    try:
+        return driver.execute_script(
+            "if (document.readyState !== 'complete') return false;"
+            "var canvases = document.querySelectorAll('canvas');"
+            "if (canvases.length < 2) return false;"
+            "for (var i = 0; i < canvases.length; i++) {"
+            "  if (canvases[i].width > 0 && canvases[i].height > 0) return true;"
+            "}"
+            "return false;"
+        )
+    finally:
+        driver.switch_to.default_content()
+
+
+# -----------------------------------------------------------------------------
+# 1. Writes one HTML page per interval embedding a TradingView widget.
+# 2. Loads the pages in parallel tabs of a warm pooled browser.
+# 3. Screenshots each chart as soon as it has rendered.
+# Returns PNG bytes per requested interval; None for a chart that failed to render.
+# -----------------------------------------------------------------------------
+
+def _render_tradingview(exchange, symbol, intervals, theme=chart_renderer.CHART_THEME):
+    # Selenium is only imported when this backend is used
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    intervals = [(interval, suffix) for interval, suffix in CHART_INTERVALS if suffix in intervals]
+    html_files = []
     try:
-        # Find the container elements by their IDs.
-        day_chart = driver.find_element(By.ID, "tradingview_chart_day")
-        week_chart = driver.find_element(By.ID, "tradingview_chart_week")
-        month_chart = driver.find_element(By.ID, "tradingview_chart_month")
-        
-        # Capture screenshots of each chart container.
-        day_chart.screenshot(f"./charts/{symbol}_chart_1day.png")
-        week_chart.screenshot(f"./charts/{symbol}_chart_1week.png")
-        month_chart.screenshot(f"./charts/{symbol}_chart_1month.png")
-        
-        print("Screenshots saved as:")
-        print(f" - ./charts/{symbol}_chart_1day.png")
-        print(f" - ./charts/{symbol}_chart_1week.png")
-        print(f" - ./charts/{symbol}_chart_1month.png")
-
-        return day_chart, week_chart, month_chart
+        for interval, suffix in intervals:
+            html_content = CHART_TEMPLATE.substitute(exchange=exchange, symbol=symbol, interval=interval,
+                                                     theme=theme)
+            # Write the HTML content to a local file.
+            with tempfile.NamedTemporaryFile("w", suffix=".html", prefix=f"tradingview_{symbol}_{suffix}_",
+                                             delete=False, encoding="utf-8") as f:
+                f.write(html_content)
+            html_files.append(f.name)
+
+        with browser_pool.browser() as browser:
+            driver = browser.driver
+
+            # Start every chart loading in its own tab so they render concurrently.
+            handles = []
+            for i, html_file in enumerate(html_files):
+                if i:
+                    driver.switch_to.new_window("tab")
+                driver.get("file://" + os.path.abspath(html_file))
+                handles.append(driver.current_window_handle)
+
+            print("Waiting for charts to render...")
+            charts = []
+            for handle, (_, suffix) in zip(handles, intervals):
+                driver.switch_to.window(handle)
+                try:
+                    WebDriverWait(driver, CHART_RENDER_TIMEOUT, poll_frequency=0.25).until(_chart_rendered)
+                    charts.append(driver.find_element(By.ID, "tradingview_chart").screenshot_as_png)
+                    print(f" - {symbol} {suffix}")
+                except TimeoutException:
+                    print(f"Chart {symbol} {suffix} did not render within {CHART_RENDER_TIMEOUT}s")
+                    charts.append(None)
+            return tuple(charts)
     except Exception as e:
         print("An error occurred while taking screenshots:", e)
+        return (None,) * len(intervals)
     finally:
-        # Close the browser.
-        driver.quit()
+        for html_file in html_files:
+            try:
+                os.remove(html_file)
+            except OSError:
+                pass
+
+
+async def generate_charts_async(exchange, symbol, backend=None, theme=None):
+    """
+    Generates the day/week/month charts without blocking the bot's event loop.
+
+    Charts come from the chart cache (chart_cache.py) when a fresh copy
+    exists; only missing or expired intervals are rendered. The backend is
+    chosen by CHART_BACKEND (or the backend argument):
+      - "selenium": TradingView widget screenshots, in a worker thread
+      - "native":   candlesticks drawn from CoinGecko OHLC in a process pool
+
+    Returns:
+        tuple: PNG bytes (day, week, month) that can be passed straight to
+               TelegramClient.send_file; None for a chart that failed to render.
+    """
+    backend = backend or CHART_BACKEND
+    theme = theme or chart_renderer.CHART_THEME
+    intervals = tuple(suffix for _, suffix in CHART_INTERVALS)
+
+    async def render(missing):
+        if backend == "native":
+            return await chart_renderer.render_charts(symbol, theme=theme, intervals=missing)
+        return await asyncio.to_thread(_render_tradingview, exchange, symbol, missing, theme)
+
+    return await chart_cache.get(backend, exchange, symbol, theme, intervals, render)
+
+
+async def generate_basket_charts_async(tickers, exchange='BINANCE', backend=None):
+    """
+    Charts for a basket of called tokens: resolves every ticker's TradingView
+    symbol in one batch, then generates the charts concurrently.
+
+    Returns:
+        dict: ticker -> chart images (day, week, month); None for tickers without a TradingView symbol.
+    """
+    symbols = await get_tradingview_symbols_async(tickers, exchange)
+
+    async def charts_for(symbol):
+        if symbol is None:
+            return None
+        return await generate_charts_async(symbol["exchange"], symbol["symbol"], backend=backend)
+
+    charts = await asyncio.gather(*(charts_for(symbol) for symbol in symbols.values()))
+    return dict(zip(symbols, charts))
+
+
+def generate_charts(exchange, symbol):
+    """Synchronous generate_charts_async with the Selenium backend; returns the PNG bytes (day, week, month)."""
+    return asyncio.run(generate_charts_async(exchange, symbol, backend="selenium"))
 
 def main():
     exchange = 'CRYPTO'
     symbol = 'XCN'
-    result = generate_charts(exchange,f"{symbol}USD")
+    generate_charts(exchange,f"{symbol}USD")
+    browser_pool.close()
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
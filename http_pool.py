@@ -0,0 +1,86 @@
+import asyncio
+import os
+import weakref
+
+import aiohttp
+
+# Pool / timeout settings, overridable from the .env file
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+HTTP_MAX_CONCURRENCY = int(os.getenv("HTTP_MAX_CONCURRENCY", "16"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30"))
+
+# One keep-alive session + concurrency cap per event loop.
+# aiohttp sessions are bound to the loop they were created on, and the sync
+# wrappers in coin_info run their own short-lived loop via run_sync().
+_pools = weakref.WeakKeyDictionary()
+
+
+def _current_pool():
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None or pool[0].closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=300,
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        pool = (session, asyncio.Semaphore(HTTP_MAX_CONCURRENCY))
+        _pools[loop] = pool
+    return pool
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Returns the shared keep-alive ClientSession for the running event loop,
+    creating it on first use.
+    """
+    return _current_pool()[0]
+
+
+async def request_json(url: str, params: dict = None, headers: dict = None, timeout: float = None) -> tuple:
+    """
+    Performs a GET request through the shared connection pool.
+
+    At most HTTP_MAX_CONCURRENCY requests are in flight per event loop; callers
+    beyond that wait for a free slot instead of opening new connections.
+
+    Args:
+        url (str): The URL to request.
+        params (dict): Optional query string parameters.
+        headers (dict): Optional request headers.
+        timeout (float): Per-request timeout in seconds (defaults to HTTP_TIMEOUT_SECONDS).
+
+    Returns:
+        tuple: (status_code, parsed JSON body or None, response headers)
+    """
+    session, semaphore = _current_pool()
+    client_timeout = aiohttp.ClientTimeout(total=timeout or HTTP_TIMEOUT_SECONDS)
+    async with semaphore:
+        async with session.get(url, params=params, headers=headers, timeout=client_timeout) as response:
+            data = None
+            if response.status == 200:
+                data = await response.json(content_type=None)
+            return response.status, data, dict(response.headers)
+
+
+async def close_session():
+    """Closes the shared session of the running event loop, if any."""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None and not pool[0].closed:
+        await pool[0].close()
+
+
+def run_sync(coro):
+    """
+    Runs an async lookup to completion from synchronous code and releases the
+    connection pool that was opened for it.
+    """
+    async def _runner():
+        try:
+            return await coro
+        finally:
+            await close_session()
+
+    return asyncio.run(_runner())
@@ -0,0 +1,476 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from chart_renderer import fetch_ohlc
+from coingecko_gateway import gateway
+from singleflight import SingleFlight
+
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+
+# Indicator settings, overridable from the .env file
+INDICATOR_OHLC_DAYS = int(os.getenv("INDICATOR_OHLC_DAYS", "30"))              # 30 days = 4h candles on CoinGecko
+INDICATOR_CACHE_SIZE = int(os.getenv("INDICATOR_CACHE_SIZE", "256"))           # coins whose engines are kept warm
+
+# Rows per chunk when materialising rolling windows, bounds temporary memory on long histories
+_WINDOW_CHUNK = 1 << 16
+
+
+def _ema(x: np.ndarray, alpha: float, prev: float) -> np.ndarray:
+    """
+    Exponential moving average of x continuing from prev, without a Python loop.
+
+    Uses the closed form e[t] = d^(t+1) * (prev + sum(alpha * x[i] / d^(i+1)))
+    with d = 1 - alpha, evaluated in blocks short enough that d^-block
+    cannot overflow.
+    """
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        return x.astype(float, copy=True)
+    out = np.empty(len(x))
+    block = max(1, int(250 / -math.log10(decay)))
+    for start in range(0, len(x), block):
+        chunk = x[start:start + block]
+        weights = decay ** np.arange(1, len(chunk) + 1)
+        values = weights * (prev + np.cumsum(alpha * chunk / weights))
+        out[start:start + len(chunk)] = values
+        prev = values[-1]
+    return out
+
+
+def _rolling_mean_std(x: np.ndarray, period: int):
+    """Rolling mean and population standard deviation; one value per full window."""
+    windows = sliding_window_view(x, period)
+    means = np.empty(len(windows))
+    stds = np.empty(len(windows))
+    for start in range(0, len(windows), _WINDOW_CHUNK):
+        chunk = windows[start:start + _WINDOW_CHUNK]
+        means[start:start + len(chunk)] = chunk.mean(axis=1)
+        stds[start:start + len(chunk)] = chunk.std(axis=1)
+    return means, stds
+
+
+def _rolling_sum(x: np.ndarray, period: int) -> np.ndarray:
+    sums = np.cumsum(np.concatenate(([0.0], x)))
+    return sums[period:] - sums[:-period]
+
+
+class _RunningEma:
+    """
+    EMA state that can be fed in batches.
+
+    Seeded with the simple average of the first `period` values (the
+    TA-Lib / Wilder convention); values before the seed are NaN.
+    """
+
+    __slots__ = ("period", "alpha", "value", "_seed")
+
+    def __init__(self, period: int, alpha: float = None):
+        self.period = period
+        self.alpha = alpha if alpha is not None else 2.0 / (period + 1)
+        self.value = None
+        self._seed = []
+
+    def copy(self):
+        other = _RunningEma(self.period, self.alpha)
+        other.value = self.value
+        other._seed = list(self._seed)
+        return other
+
+    def update(self, x: np.ndarray) -> np.ndarray:
+        out = np.full(len(x), np.nan)
+        start = 0
+        if self.value is None:
+            start = min(len(x), self.period - len(self._seed))
+            self._seed.extend(x[:start].tolist())
+            if len(self._seed) < self.period:
+                return out
+            self.value = sum(self._seed) / self.period
+            self._seed = []
+            out[start - 1] = self.value
+        if start < len(x):
+            out[start:] = _ema(x[start:], self.alpha, self.value)
+            self.value = out[-1]
+        return out
+
+
+class _Column:
+    """Growable float64 array (amortised O(1) appends)."""
+
+    __slots__ = ("data", "size")
+
+    def __init__(self, capacity: int = 256):
+        self.data = np.full(capacity, np.nan)
+        self.size = 0
+
+    def extend(self, values):
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            grown = np.full(max(needed, 2 * len(self.data)), np.nan)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = values
+        self.size = needed
+
+    def truncate(self, size: int):
+        self.data[size:self.size] = np.nan
+        self.size = size
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+
+class IndicatorEngine:
+    """
+    Technical indicators over an OHLCV candle series, kept up to date incrementally.
+
+    update() appends only candles newer than the last one seen and computes
+    indicator values for just those candles: rolling indicators (SMA,
+    Bollinger bands, VWAP) look back at most one window, recursive ones
+    (EMA, RSI, MACD, ATR) continue from their saved state. A candle that
+    arrives again with the same timestamp (the still-forming candle) is
+    replaced by rolling the state back one step.
+
+    Conventions: EMAs, Wilder RSI and ATR are seeded with a simple average
+    of their first `period` inputs; Bollinger bands use the population
+    standard deviation; VWAP is a rolling window over the typical price.
+    """
+
+    SERIES = ("sma_fast", "sma_slow", "ema_fast", "ema_slow", "rsi", "macd", "macd_signal", "macd_hist",
+              "bb_upper", "bb_lower", "atr", "vwap")
+
+    def __init__(self, sma_periods=(20, 50), macd_periods=(12, 26, 9), rsi_period=14, bb_period=20, bb_k=2.0,
+                 atr_period=14, vwap_period=42, pivot_window=6):
+        self.sma_periods = sma_periods
+        self.macd_periods = macd_periods
+        self.rsi_period = rsi_period
+        self.bb_period = bb_period
+        self.bb_k = bb_k
+        self.atr_period = atr_period
+        self.vwap_period = vwap_period
+        self.pivot_window = pivot_window
+        self._columns = {name: _Column() for name in ("time", "open", "high", "low", "close", "volume")}
+        self._series = {name: _Column() for name in self.SERIES}
+        self._state = self._initial_state()
+        self._state_before_last = None
+        self.updated_at = 0.0
+
+    def _initial_state(self) -> dict:
+        fast, slow, signal = self.macd_periods
+        return {
+            "ema_fast": _RunningEma(fast),
+            "ema_slow": _RunningEma(slow),
+            "macd_signal": _RunningEma(signal),
+            "rsi_gain": _RunningEma(self.rsi_period, alpha=1.0 / self.rsi_period),
+            "rsi_loss": _RunningEma(self.rsi_period, alpha=1.0 / self.rsi_period),
+            "atr": _RunningEma(self.atr_period, alpha=1.0 / self.atr_period),
+        }
+
+    def __len__(self):
+        return self._columns["time"].size
+
+    def column(self, name: str) -> np.ndarray:
+        """Candle column ("time", "open", "high", "low", "close", "volume") as a view."""
+        return self._columns[name].view()
+
+    def series(self, name: str) -> np.ndarray:
+        """Indicator series aligned with the candles (NaN until enough history), as a view."""
+        return self._series[name].view()
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    def update(self, ohlc, volume=None) -> int:
+        """
+        Feeds candles into the engine.
+
+        Args:
+            ohlc: [timestamp_ms, open, high, low, close] rows in time order, as returned by CoinGecko /ohlc.
+            volume: Optional per-candle volumes aligned with ohlc; VWAP stays NaN without them.
+
+        Returns:
+            int: Number of candles appended or replaced.
+        """
+        rows = np.asarray(ohlc, dtype=float).reshape(-1, 5)
+        volumes = np.full(len(rows), np.nan) if volume is None else np.asarray(volume, dtype=float)
+        times = self.column("time")
+        if len(times):
+            last = times[-1]
+            keep = rows[:, 0] >= last
+            rows, volumes = rows[keep], volumes[keep]
+            if len(rows) and rows[0, 0] == last:
+                self._rollback_last()
+        if not len(rows):
+            return 0
+
+        # Process all but the newest candle, checkpoint, then the newest one,
+        # so a revised newest candle can be replaced without recomputing.
+        if len(rows) > 1:
+            self._append(rows[:-1], volumes[:-1])
+        self._state_before_last = {name: state.copy() for name, state in self._state.items()}
+        self._append(rows[-1:], volumes[-1:])
+        self.updated_at = time.time()
+        return len(rows)
+
+    def _rollback_last(self):
+        size = len(self) - 1
+        for column in list(self._columns.values()) + list(self._series.values()):
+            column.truncate(size)
+        self._state = self._state_before_last
+        self._state_before_last = None
+
+    def _append(self, rows: np.ndarray, volumes: np.ndarray):
+        start = len(self)
+        for index, name in enumerate(("time", "open", "high", "low", "close")):
+            self._columns[name].extend(rows[:, index])
+        self._columns["volume"].extend(volumes)
+
+        high, low, close = self.column("high"), self.column("low"), self.column("close")
+        new_close, new_high, new_low = close[start:], high[start:], low[start:]
+        prev_close = close[start - 1:-1] if start else np.concatenate(([np.nan], close[:-1]))
+        state = self._state
+        series = self._series
+
+        # Moving averages
+        for name, period in zip(("sma_fast", "sma_slow"), self.sma_periods):
+            series[name].extend(self._rolling_tail(start, period, lambda c, p: _rolling_sum(c, p) / p, close))
+        ema_fast = state["ema_fast"].update(new_close)
+        ema_slow = state["ema_slow"].update(new_close)
+        series["ema_fast"].extend(ema_fast)
+        series["ema_slow"].extend(ema_slow)
+
+        # MACD - the signal line only starts once the slow EMA is seeded
+        macd = ema_fast - ema_slow
+        signal = np.full(len(macd), np.nan)
+        valid = ~np.isnan(macd)
+        signal[valid] = state["macd_signal"].update(macd[valid])
+        series["macd"].extend(macd)
+        series["macd_signal"].extend(signal)
+        series["macd_hist"].extend(macd - signal)
+
+        # Wilder RSI - the very first candle has no change to measure
+        delta = new_close - prev_close
+        has_delta = ~np.isnan(delta)
+        gains = np.full(len(delta), np.nan)
+        losses = np.full(len(delta), np.nan)
+        gains[has_delta] = state["rsi_gain"].update(np.maximum(delta[has_delta], 0.0))
+        losses[has_delta] = state["rsi_loss"].update(np.maximum(-delta[has_delta], 0.0))
+        total = gains + losses
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rsi = np.where(total > 0, 100.0 * gains / total, 50.0)
+        series["rsi"].extend(np.where(np.isnan(total), np.nan, rsi))
+
+        # Bollinger bands (the middle band is the SMA over bb_period)
+        def bands(c, period):
+            mean, std = _rolling_mean_std(c, period)
+            return np.stack((mean + self.bb_k * std, mean - self.bb_k * std), axis=1)
+        upper_lower = self._rolling_tail(start, self.bb_period, bands, close, width=2)
+        series["bb_upper"].extend(upper_lower[:, 0])
+        series["bb_lower"].extend(upper_lower[:, 1])
+
+        # Average true range (fmax skips the missing previous close of the first candle)
+        true_range = np.fmax(new_high - new_low,
+                             np.fmax(np.abs(new_high - prev_close), np.abs(new_low - prev_close)))
+        series["atr"].extend(state["atr"].update(true_range))
+
+        # Rolling VWAP over the typical price
+        def vwap(h, l, c, v, period):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return _rolling_sum((h + l + c) / 3.0 * v, period) / _rolling_sum(v, period)
+        series["vwap"].extend(self._rolling_tail(start, self.vwap_period, vwap,
+                                                 high, low, close, self.column("volume")))
+
+    def _rolling_tail(self, start: int, period: int, compute, *columns, width: int = None) -> np.ndarray:
+        """
+        Runs a full-window rolling computation over just enough history to
+        produce values for the candles from index start on, NaN-padding
+        candles that do not have a full window yet.
+        """
+        count = len(self) - start
+        out = np.full((count,) if width is None else (count, width), np.nan)
+        seg_start = max(0, start - period + 1)
+        if len(self) - seg_start >= period:
+            computed = compute(*(column[seg_start:] for column in columns), period)
+            out[count - len(computed):] = computed
+        return out
+
+    # ------------------------------------------------------------------
+    # Readouts
+    # ------------------------------------------------------------------
+    def pivots(self) -> dict:
+        """
+        Classic floor-trader pivot levels from the pivot_window candles before
+        the newest (still forming) one, or None without enough history.
+        """
+        if len(self) < self.pivot_window + 1:
+            return None
+        window = slice(-self.pivot_window - 1, -1)
+        high = float(self.column("high")[window].max())
+        low = float(self.column("low")[window].min())
+        close = float(self.column("close")[window][-1])
+        pivot = (high + low + close) / 3.0
+        return {
+            "pivot": pivot,
+            "r1": 2 * pivot - low, "r2": pivot + (high - low),
+            "s1": 2 * pivot - high, "s2": pivot - (high - low),
+        }
+
+    def latest(self) -> dict:
+        """Newest value of every indicator (None where there is not enough history yet)."""
+        if not len(self):
+            return {}
+        values = {name: self.series(name)[-1] for name in self.SERIES}
+        values["close"] = self.column("close")[-1]
+        values = {name: None if np.isnan(value) else float(value) for name, value in values.items()}
+        values["pivots"] = self.pivots()
+        return values
+
+    def candle_hours(self) -> float:
+        times = self.column("time")
+        if len(times) < 2:
+            return None
+        return float(np.median(np.diff(times[-50:]))) / 3_600_000
+
+    def table(self) -> str:
+        """Compact text table of the latest values, sized for the analysis prompt."""
+        values = self.latest()
+        if not values:
+            return ""
+
+        def fmt(*names):
+            return " / ".join("n/a" if values[name] is None else f"{values[name]:.6g}" for name in names)
+
+        fast, slow, signal = self.macd_periods
+        hours = self.candle_hours()
+        interval = f"{hours:g}h candles" if hours else "candles"
+        lines = [
+            f"Technical Indicators ({interval}, {len(self)} candles) :",
+            f"Close : {fmt('close')}",
+            f"SMA {self.sma_periods[0]} / {self.sma_periods[1]} : {fmt('sma_fast', 'sma_slow')}",
+            f"EMA {fast} / {slow} : {fmt('ema_fast', 'ema_slow')}",
+            f"RSI {self.rsi_period} : {fmt('rsi')}",
+            f"MACD {fast},{slow},{signal} (line / signal / histogram) : {fmt('macd', 'macd_signal', 'macd_hist')}",
+            f"Bollinger {self.bb_period},{self.bb_k:g} (lower / upper) : {fmt('bb_lower', 'bb_upper')}",
+            f"ATR {self.atr_period} : {fmt('atr')}",
+            f"VWAP {self.vwap_period} : {fmt('vwap')}",
+        ]
+        pivots = values["pivots"]
+        if pivots:
+            lines.append("Pivot Support S2 / S1 : {s2:.6g} / {s1:.6g}".format(**pivots))
+            lines.append("Pivot Point : {pivot:.6g}".format(**pivots))
+            lines.append("Pivot Resistance R1 / R2 : {r1:.6g} / {r2:.6g}".format(**pivots))
+        return "\n".join(lines) + "\n"
+
+
+async def fetch_candle_volumes(coin_id: str, days: int, candle_times: np.ndarray):
+    """
+    Approximates per-candle USD volume from CoinGecko /market_chart.
+
+    CoinGecko only publishes rolling 24h volume, so each candle gets the
+    24h volume at its close time scaled by the candle length.
+    Returns None on failure.
+    """
+    url = f"{COINGECKO_API_URL}/coins/{coin_id}/market_chart"
+    status, data, _ = await gateway.get_json(url, params={"vs_currency": "usd", "days": str(days)})
+    if status != 200 or not data or not data.get("total_volumes"):
+        print(f"Error: volume request for {coin_id} ({days}d) failed with status code {status}")
+        return None
+    points = np.asarray(data["total_volumes"], dtype=float)
+    daily = np.interp(candle_times, points[:, 0], points[:, 1])
+    span = np.median(np.diff(candle_times)) if len(candle_times) > 1 else 86_400_000
+    return daily * (span / 86_400_000)
+
+
+class Candles(NamedTuple):
+    """A coin's fetched candle series and how long it stays current."""
+    ohlc: np.ndarray            # [timestamp_ms, open, high, low, close] rows
+    volumes: np.ndarray         # per-candle volumes, or None if /market_chart failed
+    fetched_at: float
+    expires_at: float           # one candle length after fetched_at
+
+
+class IndicatorStore:
+    """
+    Keeps each coin's candle series and an IndicatorEngine fed from it.
+
+    The /ohlc and /market_chart series are cached per coin for one candle
+    length (4h for the default 30 days), since CoinGecko publishes no new
+    candle before then; concurrent misses for a coin share one fetch. A
+    fresh series only feeds the candles the engine has not seen yet. The
+    least recently used coins are dropped beyond max_size.
+    """
+
+    def __init__(self, days=INDICATOR_OHLC_DAYS, max_size=INDICATOR_CACHE_SIZE):
+        self.days = days
+        self.max_size = max_size
+        self._candles = OrderedDict()   # coin_id -> Candles
+        self._engines = OrderedDict()   # coin_id -> IndicatorEngine
+        self._flights = SingleFlight()
+        self.stats = {"fetches": 0, "hits": 0}
+
+    async def _fetch_candles(self, coin_id: str):
+        self.stats["fetches"] += 1
+        ohlc = await fetch_ohlc(coin_id, self.days)
+        if not ohlc:
+            return None
+        ohlc = np.asarray(ohlc, dtype=float).reshape(-1, 5)
+        volumes = await fetch_candle_volumes(coin_id, self.days, ohlc[:, 0])
+        # Candle length; CoinGecko's shortest is 30 minutes
+        span = float(np.median(np.diff(ohlc[:, 0]))) / 1000 if len(ohlc) > 1 else 1800.0
+        now = time.time()
+        candles = self._candles[coin_id] = Candles(ohlc, volumes, now, now + span)
+        while len(self._candles) > self.max_size:
+            self._candles.popitem(last=False)
+        return candles
+
+    async def candles(self, coin_id: str):
+        """
+        Returns:
+            Candles: The coin's cached series, fetched again once a candle length old;
+                     the previous series if the refresh failed, None if there is none.
+        """
+        cached = self._candles.get(coin_id)
+        if cached is not None and time.time() < cached.expires_at:
+            self._candles.move_to_end(coin_id)
+            self.stats["hits"] += 1
+            return cached
+        return await self._flights.do(coin_id, lambda: self._fetch_candles(coin_id)) or cached
+
+    async def get_engine(self, coin_id: str):
+        """
+        Returns an up-to-date IndicatorEngine for a CoinGecko coin id, or None
+        if no candles could be fetched.
+        """
+        candles = await self.candles(coin_id)
+        engine = self._engines.get(coin_id)
+        if candles is None:
+            return engine
+        if engine is None:
+            engine = self._engines[coin_id] = IndicatorEngine()
+            while len(self._engines) > self.max_size:
+                self._engines.popitem(last=False)
+        else:
+            self._engines.move_to_end(coin_id)
+        if engine.updated_at < candles.fetched_at:
+            engine.update(candles.ohlc, candles.volumes)
+        return engine
+
+    async def table_for(self, coin_id: str) -> str:
+        """Indicator table for the analysis prompt, or an empty string if unavailable."""
+        if not coin_id:
+            return ""
+        try:
+            engine = await self.get_engine(coin_id)
+        except Exception as e:
+            print(f"Error computing indicators for {coin_id}: {e}")
+            return ""
+        return engine.table() if engine is not None else ""
+
+
+# Shared store used by gpt_actions
+indicator_store = IndicatorStore()
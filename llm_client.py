@@ -0,0 +1,323 @@
+import asyncio
+import os
+import random
+import time
+
+from message_pipeline import LatencyStats
+from metrics import metrics
+
+# LLM client settings, overridable from the .env file
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+LLM_BASE_URL = os.getenv("OPENAI_BASE_URL") or None      # point at stub_servers.py for local testing
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "90"))           # overall deadline per call, retries included
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+
+def _transient_errors() -> tuple:
+    """Errors worth retrying: the request may well succeed a moment later."""
+    # openai is imported on first use; importing it takes most of a second
+    import openai
+
+    return (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    )
+
+
+def _remaining(deadline_at: float) -> float:
+    return max(0.0, deadline_at - asyncio.get_running_loop().time())
+
+
+class _StreamAttempt:
+    """
+    One streaming request, holding a concurrency slot from start() until close().
+
+    The slot is not released when the first chunk arrives: the provider keeps
+    generating and the pooled connection stays busy until the stream has been
+    read to the end or closed, so releasing early would let more than
+    max_concurrency generations run at once.
+    """
+
+    def __init__(self, client, semaphore: asyncio.Semaphore, request: dict):
+        self._client = client
+        self._semaphore = semaphore
+        self._request = request
+        self._holding = False
+        self._stream = None
+        self._chunks = None
+        self.started = None
+        self.first_chunk_at = None
+
+    async def start(self, deadline_at: float):
+        """Sends the request and returns the first text chunk (None if the reply was empty)."""
+        await asyncio.wait_for(self._semaphore.acquire(), _remaining(deadline_at))
+        self._holding = True
+        self.started = time.monotonic()
+        self._stream = await asyncio.wait_for(self._client.chat.completions.create(**self._request),
+                                              _remaining(deadline_at))
+        self._chunks = self._stream.__aiter__()
+        text = await self.next(deadline_at)
+        self.first_chunk_at = time.monotonic()
+        return text
+
+    async def next(self, deadline_at: float):
+        """Returns the next text chunk, or None at the end of the stream."""
+        while True:
+            try:
+                chunk = await asyncio.wait_for(self._chunks.__anext__(), _remaining(deadline_at))
+            except StopAsyncIteration:
+                return None
+            if chunk.choices and chunk.choices[0].delta.content:
+                return chunk.choices[0].delta.content
+
+    async def close(self):
+        """Closes the response and frees the slot; safe to call more than once."""
+        stream, self._stream = self._stream, None
+        try:
+            if stream is not None:
+                await stream.close()
+        finally:
+            if self._holding:
+                self._holding = False
+                self._semaphore.release()
+
+
+class LLMClient:
+    """
+    Async, concurrency-limited chat-completion client.
+
+      - one pooled AsyncOpenAI/httpx client, created (and openai imported) on first use
+      - at most max_concurrency requests in flight (semaphore)
+      - an overall deadline per call, retries on transient errors with jittered backoff
+      - optional hedging: if a request is still running after the observed
+        p95 latency (time to first chunk when streaming), a duplicate is started
+        and whichever answers first wins; the other one is cancelled
+    """
+
+    def __init__(self, model=LLM_MODEL, base_url=LLM_BASE_URL, max_concurrency=LLM_MAX_CONCURRENCY,
+                 timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, hedge=LLM_HEDGE,
+                 hedge_percentile=LLM_HEDGE_PERCENTILE, hedge_min_samples=LLM_HEDGE_MIN_SAMPLES):
+        self.model = model
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyStats()                 # full completion time, drives hedging
+        self.first_chunk_latency = LatencyStats()     # streaming time to first chunk
+        self.stats = {"calls": 0, "retries": 0, "hedged": 0, "hedge_wins": 0, "timeouts": 0, "errors": 0}
+        self._client = None
+        self._semaphore = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_concurrency * 2,
+                                    max_keepalive_connections=self.max_concurrency),
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+            )
+            self._client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=self.base_url,
+                max_retries=0,          # retries are handled here, against our own deadline
+                http_client=http_client,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    # ------------------------------------------------------------------
+    # Completions
+    # ------------------------------------------------------------------
+    async def _attempt(self, messages, model):
+        client = self._get_client()
+        async with self._semaphore:
+            started = time.monotonic()
+            with metrics.stage("llm_total", mode="complete"):
+                completion = await client.chat.completions.create(messages=messages, model=model or self.model)
+            self.latency.add(time.monotonic() - started)
+            return completion.choices[0].message.content
+
+    async def _hedged_attempt(self, messages, model):
+        if not self.hedge or self.latency.count < self.hedge_min_samples:
+            return await self._attempt(messages, model)
+
+        primary = asyncio.create_task(self._attempt(messages, model))
+        done, _ = await asyncio.wait({primary}, timeout=self.latency.percentile(self.hedge_percentile))
+        if done:
+            return primary.result()
+
+        self.stats["hedged"] += 1
+        backup = asyncio.create_task(self._attempt(messages, model))
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+            # Both attempts failed; surface the primary's error.
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _complete_with_retries(self, messages, model):
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged_attempt(messages, model)
+            except _transient_errors() as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                delay = min(10.0, 0.5 * 2 ** attempt) * random.uniform(1.0, 1.5)
+                print(f"LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s (attempt {attempt}/{self.max_retries})")
+                await asyncio.sleep(delay)
+
+    async def complete(self, messages: list, model: str = None, deadline: float = None) -> str:
+        """
+        Runs a chat completion and returns the assistant's reply text.
+
+        Args:
+            messages (list): OpenAI chat messages.
+            model (str): Model name (defaults to LLM_MODEL).
+            deadline (float): Seconds allowed for the whole call, retries included (defaults to LLM_TIMEOUT).
+
+        Raises:
+            asyncio.TimeoutError: The deadline passed.
+            openai.OpenAIError: A non-transient error, or retries were exhausted.
+        """
+        self.stats["calls"] += 1
+        try:
+            return await asyncio.wait_for(self._complete_with_retries(messages, model), deadline or self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+    async def _first_chunk(self, request: dict, deadline_at: float) -> tuple:
+        """
+        Starts a streaming request and waits for its first text chunk.
+
+        With hedging on, a duplicate request is started if no chunk has arrived
+        after the observed p95 time to first chunk; whichever streams first is
+        kept and the other one is cancelled and closed.
+
+        Returns:
+            tuple: (the open _StreamAttempt, its first chunk or None if the reply was empty).
+        """
+        primary = _StreamAttempt(self._client, self._semaphore, request)
+        if not self.hedge or self.first_chunk_latency.count < self.hedge_min_samples:
+            try:
+                return primary, await primary.start(deadline_at)
+            except BaseException:
+                await primary.close()
+                raise
+
+        attempts = {asyncio.create_task(primary.start(deadline_at)): primary}
+        winner = None
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self.first_chunk_latency.percentile(self.hedge_percentile))
+            if not done:
+                self.stats["hedged"] += 1
+                backup = _StreamAttempt(self._client, self._semaphore, request)
+                attempts[asyncio.create_task(backup.start(deadline_at))] = backup
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = attempts[task]
+                        if winner is not primary:
+                            self.stats["hedge_wins"] += 1
+                        return winner, task.result()
+            # Every attempt failed; surface the primary's error.
+            return primary, next(task for task, attempt in attempts.items() if attempt is primary).result()
+        finally:
+            losers = [task for task, attempt in attempts.items() if attempt is not winner]
+            for task in losers:
+                task.cancel()
+            await asyncio.gather(*losers, return_exceptions=True)
+            for task in losers:
+                await attempts[task].close()
+
+    async def stream(self, messages: list, model: str = None, deadline: float = None):
+        """
+        Streams a chat completion, yielding text chunks as they arrive.
+
+        Transient errors are retried only until the first chunk has arrived,
+        and hedging (see _first_chunk) applies to the first chunk only; the
+        deadline applies to the whole stream. The concurrency slot is held
+        until the stream ends or is closed by the caller.
+        """
+        self.stats["calls"] += 1
+        self._get_client()
+        deadline_at = asyncio.get_running_loop().time() + (deadline or self.timeout)
+        request = {"messages": messages, "model": model or self.model, "stream": True}
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response, text = await self._first_chunk(request, deadline_at)
+                break
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                metrics.record_stage("llm_total", time.monotonic() - started, ok=False, mode="stream")
+                raise
+            except _transient_errors() as e:
+                metrics.record_stage("llm_total", time.monotonic() - started, ok=False, mode="stream")
+                if attempt >= self.max_retries:
+                    self.stats["errors"] += 1
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                print(f"LLM stream failed ({type(e).__name__}), retrying (attempt {attempt}/{self.max_retries})")
+                await asyncio.sleep(min(10.0, 0.5 * 2 ** attempt) * random.uniform(1.0, 1.5))
+            except Exception:
+                self.stats["errors"] += 1
+                metrics.record_stage("llm_total", time.monotonic() - started, ok=False, mode="stream")
+                raise
+
+        try:
+            if text is not None:
+                self.first_chunk_latency.add(response.first_chunk_at - response.started)
+                metrics.record_stage("llm_first_token", response.first_chunk_at - started)
+            while text is not None:
+                yield text
+                text = await response.next(deadline_at)
+            metrics.record_stage("llm_total", time.monotonic() - started, mode="stream")
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            metrics.record_stage("llm_total", time.monotonic() - started, ok=False, mode="stream")
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            metrics.record_stage("llm_total", time.monotonic() - started, ok=False, mode="stream")
+            raise
+        finally:
+            await response.close()
+
+
+# Shared client used by gpt_actions
+llm_client = LLMClient()
@@ -0,0 +1,360 @@
+import asyncio
+import itertools
+import os
+import time
+
+import http_pool
+from coingecko_gateway import gateway, TokenBucket
+from message_pipeline import LatencyStats
+from metrics import metrics
+from token_snapshot import TokenSnapshot, COINGECKO_SLIM_PARAMS
+
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+DEXSCREENER_API_URL = os.getenv("DEXSCREENER_API_URL", "https://api.dexscreener.com")
+
+# Market data settings, overridable from the .env file
+MARKET_DATA_PROVIDERS = os.getenv("MARKET_DATA_PROVIDERS", "coingecko,dexscreener")  # preferred first
+MARKET_DATA_TIMEOUT = float(os.getenv("MARKET_DATA_TIMEOUT", "10"))             # per provider request
+MARKET_DATA_HEDGE_DELAY = float(os.getenv("MARKET_DATA_HEDGE_DELAY", "1.0"))    # until a provider's latency is known
+MARKET_DATA_HEDGE_PERCENTILE = float(os.getenv("MARKET_DATA_HEDGE_PERCENTILE", "90"))
+MARKET_DATA_HEDGE_MIN_SAMPLES = int(os.getenv("MARKET_DATA_HEDGE_MIN_SAMPLES", "20"))
+MARKET_DATA_PREFERENCE = float(os.getenv("MARKET_DATA_PREFERENCE", "0.5"))      # seconds of handicap per list position
+MARKET_DATA_BREAKER_FAILURES = int(os.getenv("MARKET_DATA_BREAKER_FAILURES", "5"))
+MARKET_DATA_BREAKER_COOLDOWN = float(os.getenv("MARKET_DATA_BREAKER_COOLDOWN", "30"))
+DEXSCREENER_RATE_PER_MINUTE = float(os.getenv("DEXSCREENER_RATE_PER_MINUTE", "300"))
+
+# CoinGecko platform id -> DexScreener chain id
+DEX_CHAINS = {
+    "ethereum": "ethereum",
+    "solana": "solana",
+    "binance-smart-chain": "bsc",
+    "base": "base",
+    "arbitrum-one": "arbitrum",
+    "optimistic-ethereum": "optimism",
+    "polygon-pos": "polygon",
+    "avalanche": "avalanche",
+    "tron": "tron",
+    "the-open-network": "ton",
+    "sui": "sui",
+    "fantom": "fantom",
+    "blast": "blast",
+    "linea": "linea",
+}
+_DEX_PLATFORMS = {chain: platform for platform, chain in DEX_CHAINS.items()}
+
+
+class ProviderError(Exception):
+    """A provider could not answer (transport error, 5xx, rate limit...). Counts against its circuit breaker."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a failing provider.
+
+    After `failures` consecutive failures the circuit opens for `cooldown`
+    seconds; then a single trial request is let through (half-open), and
+    its outcome closes or re-opens the circuit.
+
+    allow() hands each admitted request a ticket that it passes back with
+    its outcome, so only the trial itself can end the trial - a request
+    started before the circuit opened cannot release it.
+    """
+
+    def __init__(self, failures=MARKET_DATA_BREAKER_FAILURES, cooldown=MARKET_DATA_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial = None           # ticket of the half-open trial request in flight
+        self.trips = 0
+        self._tickets = itertools.count(1)
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        """
+        Returns:
+            int: A ticket for the request to pass to record_success/record_failure/release,
+                 or None if the circuit does not let it through.
+        """
+        state = self.state
+        if state == "closed":
+            return next(self._tickets)
+        if state == "half_open" and self.trial is None:
+            self.trial = next(self._tickets)
+            return self.trial
+        return None
+
+    def record_success(self, ticket):
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial = None
+
+    def record_failure(self, ticket):
+        self.consecutive += 1
+        if ticket == self.trial or (self.opened_at is None and self.consecutive >= self.failures):
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+        self.release(ticket)
+
+    def release(self, ticket):
+        """The request was abandoned (e.g. another provider won); it tells nothing about health."""
+        if ticket == self.trial:
+            self.trial = None
+
+
+class MarketDataProvider:
+    """
+    One source of token market data. fetch() returns a TokenSnapshot, None
+    if the provider does not know the token, and raises ProviderError when
+    it cannot answer.
+    """
+
+    name = "provider"
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyStats()       # successful answers (found or not)
+        self.stats = {"requests": 0, "wins": 0, "not_found": 0, "failures": 0, "cancelled": 0, "skipped": 0}
+
+    def supports(self, platform: str) -> bool:
+        return True
+
+    async def fetch(self, platform: str, address: str):
+        raise NotImplementedError
+
+
+class CoinGeckoProvider(MarketDataProvider):
+    """The CoinGecko contract endpoint, through the shared rate-limited gateway."""
+
+    name = "coingecko"
+
+    async def fetch(self, platform: str, address: str):
+        with metrics.stage("coingecko_fetch"):
+            status, data, _ = await gateway.get_json(
+                f"{COINGECKO_API_URL}/coins/{platform}/contract/{address}", params=COINGECKO_SLIM_PARAMS)
+        if status == 404:
+            return None
+        if status != 200 or not isinstance(data, dict):
+            raise ProviderError(f"status code {status}")
+        return TokenSnapshot.from_coingecko(data, address)
+
+    async def fetch_market(self, platform: str, address: str):
+        """Price, market cap, 24h volume and change from /simple/token_price; None if CoinGecko has no quote."""
+        params = {"contract_addresses": address, "vs_currencies": "usd", "include_market_cap": "true",
+                  "include_24hr_vol": "true", "include_24hr_change": "true"}
+        with metrics.stage("coingecko_price_fetch"):
+            status, data, _ = await gateway.get_json(f"{COINGECKO_API_URL}/simple/token_price/{platform}",
+                                                     params=params)
+        if status != 200 or not isinstance(data, dict):
+            raise ProviderError(f"status code {status}")
+        quote = data.get(address.lower() if address.startswith("0x") else address) or {}
+        if not quote.get("usd"):
+            return None
+        return {"price": quote["usd"], "market_cap": quote.get("usd_market_cap"),
+                "total_volume": quote.get("usd_24h_vol"), "change_24h": quote.get("usd_24h_change")}
+
+
+class DexScreenerProvider(MarketDataProvider):
+    """
+    DexScreener's token pairs endpoint: on-chain pool prices, volume and
+    liquidity, available minutes after a token launches.
+
+    EVM addresses look the same on every chain, so when the token has no
+    pairs on the requested platform its most liquid EVM chain is used.
+    """
+
+    name = "dexscreener"
+
+    def __init__(self, base_url=DEXSCREENER_API_URL, rate_per_minute=DEXSCREENER_RATE_PER_MINUTE):
+        super().__init__()
+        self.base_url = base_url
+        self.bucket = TokenBucket(rate_per_minute / 60.0, max(1, int(rate_per_minute / 60)))
+
+    def supports(self, platform: str) -> bool:
+        return platform in DEX_CHAINS
+
+    async def fetch(self, platform: str, address: str):
+        await self.bucket.acquire()
+        with metrics.stage("dexscreener_fetch"):
+            status, data, _ = await http_pool.request_json(f"{self.base_url}/latest/dex/tokens/{address}")
+        if status == 404:
+            return None
+        if status != 200 or not isinstance(data, dict):
+            raise ProviderError(f"status code {status}")
+
+        evm = address.startswith("0x")
+        pairs = [pair for pair in data.get("pairs") or ()
+                 if _same_address((pair.get("baseToken") or {}).get("address"), address, evm)]
+        chain = DEX_CHAINS[platform]
+        on_chain = [pair for pair in pairs if pair.get("chainId") == chain]
+        if not on_chain and evm and pairs:
+            best = max(pairs, key=lambda pair: (pair.get("liquidity") or {}).get("usd") or 0)
+            chain = best.get("chainId")
+            platform = _DEX_PLATFORMS.get(chain, chain)
+            on_chain = [pair for pair in pairs if pair.get("chainId") == chain]
+        if not on_chain:
+            return None
+        return TokenSnapshot.from_dex_pairs(on_chain, platform, address)
+
+
+def _same_address(a, b, evm) -> bool:
+    return bool(a) and (a.lower() == b.lower() if evm else a == b)
+
+
+PROVIDERS = {
+    "coingecko": CoinGeckoProvider,
+    "dexscreener": DexScreenerProvider,
+}
+
+
+class MarketData:
+    """
+    Hedged market-data lookups across several providers.
+
+    Providers are tried in order of observed latency, each handicapped by
+    `preference` seconds per position in the configured list, so the richer
+    provider listed first keeps the lead unless it is clearly slower. The
+    next provider is asked as soon as the current one fails or does not
+    know the token, or - hedging - when it has not answered within its p90
+    latency. The first snapshot with a price wins and the other requests
+    are cancelled. A circuit breaker per provider skips it while it keeps
+    failing.
+    """
+
+    def __init__(self, providers, timeout=MARKET_DATA_TIMEOUT, hedge_delay=MARKET_DATA_HEDGE_DELAY,
+                 hedge_percentile=MARKET_DATA_HEDGE_PERCENTILE, hedge_min_samples=MARKET_DATA_HEDGE_MIN_SAMPLES,
+                 preference=MARKET_DATA_PREFERENCE):
+        self.providers = list(providers)
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.preference = preference
+        self.stats = {"requests": 0, "no_data": 0, "hedges": 0, "failovers": 0}
+
+    def _expected_latency(self, provider) -> float:
+        if provider.latency.count < self.hedge_min_samples:
+            return self.hedge_delay
+        return provider.latency.percentile(self.hedge_percentile)
+
+    def _ordered(self, platform) -> list:
+        providers = [(self._expected_latency(p) + i * self.preference, i, p)
+                     for i, p in enumerate(self.providers) if p.supports(platform)]
+        # Open circuits go last; they are only tried once their cooldown is over
+        providers.sort(key=lambda entry: (entry[2].breaker.state == "open", entry[0], entry[1]))
+        return [p for _, _, p in providers]
+
+    async def _call(self, provider, ticket, platform, address):
+        """One provider request. Returns a priced snapshot or None; never raises (except when cancelled)."""
+        provider.stats["requests"] += 1
+        started = time.monotonic()
+        try:
+            snapshot = await asyncio.wait_for(provider.fetch(platform, address), self.timeout)
+        except asyncio.CancelledError:
+            provider.stats["cancelled"] += 1
+            provider.breaker.release(ticket)
+            raise
+        except Exception as e:
+            provider.stats["failures"] += 1
+            provider.breaker.record_failure(ticket)
+            metrics.event("market_data_failure", provider=provider.name)
+            print(f"Market data from {provider.name} failed for {address}: {e!r}")
+            return None
+        provider.latency.add(time.monotonic() - started)
+        provider.breaker.record_success(ticket)
+        if snapshot is None or not snapshot.price:
+            provider.stats["not_found"] += 1
+            return None
+        snapshot.source = provider.name
+        return snapshot
+
+    async def fetch(self, platform: str, address: str):
+        """
+        Market data for a contract from whichever provider answers first.
+
+        Returns:
+            TokenSnapshot: The winning provider's data, or None if no provider has the token.
+        """
+        self.stats["requests"] += 1
+        waiting = self._ordered(platform)
+        running = {}
+
+        def launch() -> bool:
+            while waiting:
+                provider = waiting.pop(0)
+                ticket = provider.breaker.allow()
+                if ticket is not None:
+                    running[asyncio.create_task(self._call(provider, ticket, platform, address))] = provider
+                    return True
+                provider.stats["skipped"] += 1
+            return False
+
+        launch()
+        try:
+            while running:
+                newest = list(running.values())[-1]
+                timeout = self._expected_latency(newest) if waiting else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if launch():
+                        self.stats["hedges"] += 1
+                        metrics.event("market_data_hedge")
+                    continue
+                for task in done:
+                    provider = running.pop(task)
+                    snapshot = task.result()
+                    if snapshot is not None:
+                        provider.stats["wins"] += 1
+                        return snapshot
+                    if launch():
+                        self.stats["failovers"] += 1
+        finally:
+            for task in running:
+                task.cancel()
+        self.stats["no_data"] += 1
+        return None
+
+    async def refresh_market(self, platform: str, address: str, snapshot):
+        """
+        Refreshes only the market fields of a CoinGecko snapshot, from the
+        much smaller price endpoint; the metadata is kept as it is.
+
+        Returns:
+            TokenSnapshot: An updated copy, or None if the snapshot needs a full fetch instead
+                           (not from CoinGecko, no quote, or CoinGecko unavailable).
+        """
+        provider = next((p for p in self.providers if isinstance(p, CoinGeckoProvider)), None)
+        if provider is None or snapshot.source != provider.name:
+            return None
+        ticket = provider.breaker.allow()
+        if ticket is None:
+            return None
+        try:
+            fields = await asyncio.wait_for(provider.fetch_market(platform, address), self.timeout)
+        except asyncio.CancelledError:
+            provider.breaker.release(ticket)
+            raise
+        except Exception as e:
+            provider.breaker.record_failure(ticket)
+            print(f"Market data refresh from {provider.name} failed for {address}: {e!r}")
+            return None
+        provider.breaker.record_success(ticket)
+        return snapshot.with_market(**fields) if fields else None
+
+    def snapshot(self) -> dict:
+        providers = {
+            p.name: dict(p.stats, state=p.breaker.state, trips=p.breaker.trips,
+                         p50=round(p.latency.percentile(50), 3), p90=round(p.latency.percentile(90), 3))
+            for p in self.providers
+        }
+        return dict(self.stats, providers=providers)
+
+
+# Shared provider set used by coin_info
+market_data = MarketData(PROVIDERS[name.strip()]() for name in MARKET_DATA_PROVIDERS.split(",") if name.strip())
@@ -0,0 +1,384 @@
+import asyncio
+import os
+import time
+from array import array
+from typing import NamedTuple
+
+from coin_index import coin_index
+from coingecko_gateway import gateway, PRIORITY_LOW
+
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+
+# Mention extraction settings, overridable from the .env file
+MENTION_MIN_CONFIDENCE = float(os.getenv("MENTION_MIN_CONFIDENCE", "0.6"))   # below this the LLM extractor is used
+MENTION_RANKED_PAGES = int(os.getenv("MENTION_RANKED_PAGES", "4"))           # /coins/markets pages of 250 ranked coins
+MENTION_RANKS_REFRESH_SECONDS = float(os.getenv("MENTION_RANKS_REFRESH_SECONDS", "3600"))
+MENTION_BUILD_RETRY_SECONDS = float(os.getenv("MENTION_BUILD_RETRY_SECONDS", "30"))   # doubles per failure
+MENTION_BUILD_RETRY_MAX_SECONDS = 600
+
+# How call messages name chains -> CoinGecko platform ids
+CHAIN_ALIASES = {
+    "ethereum": "ethereum", "eth": "ethereum", "erc20": "ethereum", "erc-20": "ethereum", "mainnet": "ethereum",
+    "solana": "solana", "sol": "solana", "spl": "solana", "pump.fun": "solana", "pumpfun": "solana",
+    "raydium": "solana",
+    "bsc": "binance-smart-chain", "bnb chain": "binance-smart-chain", "bnb smart chain": "binance-smart-chain",
+    "binance smart chain": "binance-smart-chain", "bep20": "binance-smart-chain", "bep-20": "binance-smart-chain",
+    "base": "base",
+    "arbitrum": "arbitrum-one", "arb": "arbitrum-one",
+    "optimism": "optimistic-ethereum",
+    "polygon": "polygon-pos", "matic": "polygon-pos",
+    "avalanche": "avalanche", "avax": "avalanche",
+    "tron": "tron", "trc20": "tron", "trc-20": "tron",
+    "ton": "the-open-network",
+    "sui": "sui",
+    "fantom": "fantom",
+    "blast": "blast",
+    "linea": "linea",
+    "cardano": "cardano",
+    "polkadot": "polkadot",
+    "tezos": "tezos",
+}
+
+# Platform picked for a multi-chain token when the message names no chain
+_PLATFORM_PREFERENCE = ("ethereum", "solana", "binance-smart-chain", "base", "arbitrum-one", "polygon-pos",
+                        "avalanche", "tron")
+
+# Call-channel vocabulary that collides with coin names or symbols; only matched as $TICKER
+_COMMON_WORDS = frozenset((
+    "a", "ai", "all", "alpha", "ape", "at", "ath", "atl", "bag", "based", "best", "big", "buy", "ca", "call", "calls",
+    "chart", "coin", "dev", "dex", "dip", "dyor", "fib", "fomo", "for", "fud", "gem", "gm", "go", "hodl", "hold",
+    "in", "is", "it", "just", "launch", "lfg", "liquidity", "lol", "lp", "max", "mc", "me", "moon", "new", "nfa",
+    "not", "now", "of", "on", "one", "pump", "rsi", "real", "safe", "sell", "ser", "so", "stable", "tax", "team",
+    "the", "this", "to", "today", "token", "top", "up", "usd", "volume", "wen", "win", "x",
+))
+
+
+def _lower(text: str) -> str:
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # A few characters lowercase to two (e.g. "İ"); keep offsets aligned with the original
+        lowered = "".join(char.lower()[:1] for char in text)
+    return lowered
+
+
+def normalize_chain(value: str):
+    """Maps a chain as written in a message ("BSC", "Arbitrum") to its CoinGecko platform id."""
+    if not value:
+        return None
+    key = value.strip().lower()
+    return CHAIN_ALIASES.get(key, key.replace(" ", "-"))
+
+
+class Mention(NamedTuple):
+    coin_id: str
+    symbol: str
+    name: str
+    platform: str
+    address: str
+    confidence: float
+    position: int
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton over lowercase patterns.
+
+    Transitions live in one dict keyed by (node << 21 | code point) and the
+    per-node tables are compact arrays, which keeps a vocabulary the size of
+    CoinGecko's coin list in tens of MB. Terminal nodes only store their
+    pattern's length; callers slice the text to recover the pattern.
+    """
+
+    __slots__ = ("goto", "fail", "length", "output", "patterns")
+
+    def __init__(self, patterns):
+        goto = {}
+        length = [0]
+        children = [[]]
+        self.patterns = 0
+        for pattern in patterns:
+            node = 0
+            for char in pattern:
+                key = node << 21 | ord(char)
+                child = goto.get(key)
+                if child is None:
+                    child = len(length)
+                    goto[key] = child
+                    length.append(0)
+                    children.append([])
+                    children[node].append((ord(char), child))
+                node = child
+            if node and not length[node]:
+                length[node] = len(pattern)
+                self.patterns += 1
+
+        # Breadth-first: fail links point at the longest proper suffix that is
+        # also a trie path; output links skip straight to the next terminal one.
+        fail = array("i", bytes(4 * len(length)))
+        output = array("i", bytes(4 * len(length)))
+        queue = [child for _, child in children[0]]
+        for node in queue:
+            for code, child in children[node]:
+                state = fail[node]
+                while state and (state << 21 | code) not in goto:
+                    state = fail[state]
+                target = goto.get(state << 21 | code, 0)
+                fail[child] = target
+                output[child] = target if length[target] else output[target]
+                queue.append(child)
+        self.goto = goto
+        self.fail = fail
+        self.length = array("i", length)
+        self.output = output
+
+    def __len__(self):
+        return len(self.length)
+
+    def matches(self, text: str):
+        """Yields (start, end) of every pattern occurrence, overlapping ones included, in one pass."""
+        goto, fail, length, output = self.goto, self.fail, self.length, self.output
+        node = 0
+        for end, char in enumerate(text, 1):
+            code = ord(char)
+            while True:
+                child = goto.get(node << 21 | code)
+                if child is not None:
+                    node = child
+                    break
+                if not node:
+                    break
+                node = fail[node]
+            hit = node if length[node] else output[node]
+            while hit:
+                yield end - length[hit], end
+                hit = output[hit]
+
+
+class MentionExtractor:
+    """
+    Finds the tokens a call message names, without a contract address and
+    without an LLM call.
+
+    One Aho-Corasick pass over the message finds every coin name, id,
+    symbol and chain alias from the coin index. $TICKER mentions are
+    trusted most, then names, then bare symbols written in capitals;
+    chain aliases pick the platform. A symbol shared by several coins is
+    resolved by market-cap rank (CoinGecko /coins/markets, refreshed in
+    the background). The automaton is rebuilt in a worker thread whenever
+    the coin index changes; a failed build is retried with a growing
+    backoff, and until one succeeds the extractor finds nothing.
+    """
+
+    def __init__(self, min_confidence=MENTION_MIN_CONFIDENCE, ranked_pages=MENTION_RANKED_PAGES,
+                 ranks_refresh=MENTION_RANKS_REFRESH_SECONDS, build_retry=MENTION_BUILD_RETRY_SECONDS,
+                 index=coin_index):
+        self.min_confidence = min_confidence
+        self.ranked_pages = ranked_pages
+        self.ranks_refresh = ranks_refresh
+        self.build_retry = build_retry
+        self.index = index
+        self.ranks = {}                 # coin_id -> market-cap rank
+        self.automaton = None
+        self._built_version = None
+        self._build_task = None
+        self._build_failures = 0
+        self._build_retry_at = 0.0
+        self._ranks_task = None
+        self._ranks_attempted_at = 0.0
+        self.stats = {"messages": 0, "resolved": 0, "builds": 0, "build_failures": 0}
+
+    # ------------------------------------------------------------------
+    # Vocabulary
+    # ------------------------------------------------------------------
+    def _vocabulary(self) -> list:
+        """Every lowercase pattern; collected on the event loop, where the index is mutated."""
+        patterns = set(self.index.by_name)
+        patterns.update(self.index.by_symbol)
+        patterns.update(self.index.coins)
+        patterns.update(CHAIN_ALIASES)
+        return [pattern for pattern in patterns if len(pattern) >= 2]
+
+    def build(self):
+        """Builds the automaton synchronously, e.g. for scripts and benchmarks."""
+        self.automaton = Automaton(self._vocabulary())
+        self._built_version = self.index.version
+        self.stats["builds"] += 1
+
+    async def _rebuild(self):
+        """Builds the automaton in a worker thread. Failures are logged and retried later, never raised."""
+        version = self.index.version
+        started = time.perf_counter()
+        try:
+            automaton = await asyncio.to_thread(Automaton, self._vocabulary())
+        except Exception as e:
+            self._build_failures += 1
+            self.stats["build_failures"] += 1
+            delay = min(self.build_retry * 2 ** (self._build_failures - 1), MENTION_BUILD_RETRY_MAX_SECONDS)
+            self._build_retry_at = time.monotonic() + delay
+            print(f"Mention extractor build failed ({e!r}), retrying in {delay:.0f}s")
+            return
+        self.automaton = automaton
+        self._built_version = version
+        self._build_failures = 0
+        self.stats["builds"] += 1
+        print(f"Mention extractor built over {self.automaton.patterns} patterns ({len(self.automaton)} nodes) "
+              f"in {time.perf_counter() - started:.2f}s")
+
+    async def refresh_ranks(self) -> bool:
+        """Fetches market-cap ranks for the top coins. Returns False if no page could be fetched."""
+        ranks = {}
+        for page in range(1, self.ranked_pages + 1):
+            params = {"vs_currency": "usd", "order": "market_cap_desc", "per_page": "250", "page": str(page)}
+            try:
+                status, rows, _ = await gateway.get_json(f"{COINGECKO_API_URL}/coins/markets", params=params,
+                                                         priority=PRIORITY_LOW)
+            except Exception as e:
+                print(f"Market-cap ranks request failed: {e!r}")
+                break
+            if status != 200 or not isinstance(rows, list):
+                print(f"Market-cap ranks request failed with status code {status}")
+                break
+            for row in rows:
+                if row.get("id") and row.get("market_cap_rank"):
+                    ranks[row["id"]] = row["market_cap_rank"]
+            if len(rows) < 250:
+                break
+        if not ranks:
+            return False
+        self.ranks = ranks
+        return True
+
+    async def ensure_ready(self) -> bool:
+        """
+        Loads the coin index, (re)builds the automaton if the index changed and keeps ranks fresh.
+
+        Returns:
+            bool: False while there is no automaton yet (the index or the first build failed).
+        """
+        try:
+            await self.index.ensure_loaded()
+        except Exception as e:
+            print(f"Coin index unavailable for mention extraction: {e!r}")
+            return self.automaton is not None
+        now = time.time()
+        if now - self._ranks_attempted_at >= self.ranks_refresh and self.ranked_pages > 0:
+            self._ranks_attempted_at = now
+            self._ranks_task = asyncio.create_task(self.refresh_ranks())
+        if (self._built_version != self.index.version and (self._build_task is None or self._build_task.done())
+                and time.monotonic() >= self._build_retry_at):
+            self._build_task = asyncio.create_task(self._rebuild())
+        if self.automaton is None and self._build_task is not None:
+            # Only the very first build is waited for; later ones swap in when ready
+            await asyncio.shield(self._build_task)
+        return self.automaton is not None
+
+    # ------------------------------------------------------------------
+    # Extraction
+    # ------------------------------------------------------------------
+    def _candidates(self, key, ticker, written):
+        """(coin ids, confidence, lowercase word?) a matched span stands for, or None."""
+        if ticker:
+            return self.index.by_symbol.get(key), 0.9, False
+        if key in _COMMON_WORDS or key in CHAIN_ALIASES:
+            return None
+        ids = list(self.index.by_name.get(key, ()))
+        if key in self.index.coins and key not in ids:
+            ids.append(key)
+        if ids:
+            # Coins trading under the name as their symbol compete too ("Pepe" on Solana)
+            ids += [coin_id for coin_id in self.index.by_symbol.get(key, ()) if coin_id not in ids]
+            # "Bonk" and "dogwifhat" are names; "bonk" in running text might not be
+            if " " in key or written[:1].isupper():
+                return ids, 0.75, False
+            return ids, 0.5, True
+        if len(key) >= 3 and written.isupper():
+            return self.index.by_symbol.get(key), 0.65, False
+        return None
+
+    def _resolve(self, ids, confidence, word, position, chains):
+        """Picks one (coin, platform) for a span's candidate coins, or None if none has a contract."""
+        scored, native_rank = [], float("inf")
+        for coin_id in ids:
+            record = self.index.coins.get(coin_id)
+            if record is None:
+                continue
+            rank = self.ranks.get(coin_id, float("inf"))
+            if not record[2]:
+                # A native coin has no contract to analyse
+                native_rank = min(native_rank, rank)
+                continue
+            on_chain = any(platform in record[2] for platform in chains)
+            scored.append(((not on_chain, rank), coin_id, record))
+        if not scored:
+            return None
+        scored.sort(key=lambda candidate: candidate[0])
+        (off_chain, rank), coin_id, (symbol, name, platforms) = scored[0]
+        if native_rank < rank:
+            return None         # "$ETH" means Ether, not the best-ranked bridged copy
+        if rank == float("inf"):
+            if sum(1 for candidate in scored if candidate[0][0] == off_chain) > 1:
+                confidence *= 0.5   # neither the chain nor a rank tells the candidates apart
+        elif word:
+            confidence += 0.15      # a lowercase word that is also a ranked coin's name
+        platform = next((chain for chain in chains if chain in platforms), None)
+        if platform is None:
+            if len(platforms) > 1:
+                confidence *= 0.9
+            platform = next((p for p in _PLATFORM_PREFERENCE if p in platforms), next(iter(platforms)))
+        return Mention(coin_id, symbol, name, platform, platforms[platform], round(confidence, 3), position)
+
+    def extract(self, text: str) -> list:
+        """
+        Scans a message once and returns every token it mentions that has a contract address.
+
+        Returns:
+            list[Mention]: One per coin, sorted by confidence (highest first), then by position.
+        """
+        if not text or self.automaton is None:
+            return []
+        lowered = _lower(text)
+        spans, chains = [], []
+        for start, end in self.automaton.matches(lowered):
+            # Whole words only; "$" may prefix a ticker
+            if (start and lowered[start - 1].isalnum()) or (end < len(lowered) and lowered[end].isalnum()):
+                continue
+            key = lowered[start:end]
+            ticker = start > 0 and text[start - 1] == "$"
+            chain = CHAIN_ALIASES.get(key)
+            if chain and not ticker and chain not in chains:
+                chains.append(chain)
+            spans.append((start, key, ticker, text[start:end]))
+
+        mentions = {}
+        for start, key, ticker, written in spans:
+            found = self._candidates(key, ticker, written)
+            if not found or not found[0]:
+                continue
+            mention = self._resolve(*found, start, chains)
+            if mention is None:
+                continue
+            current = mentions.get(mention.coin_id)
+            if current is None or mention.confidence > current.confidence:
+                mentions[mention.coin_id] = mention if current is None else \
+                    mention._replace(position=min(mention.position, current.position))
+        return sorted(mentions.values(), key=lambda m: (-m.confidence, m.position))
+
+    async def find_token(self, text: str):
+        """
+        The token a name-only call message is about.
+
+        Returns:
+            Mention: The most confident mention, or None if there is none at min_confidence.
+        """
+        self.stats["messages"] += 1
+        if not await self.ensure_ready():
+            return None
+        mentions = self.extract(text)
+        if not mentions or mentions[0].confidence < self.min_confidence:
+            return None
+        self.stats["resolved"] += 1
+        return mentions[0]
+
+
+# Shared extractor used by gpt_actions
+mention_extractor = MentionExtractor()
@@ -0,0 +1,265 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import deque
+
+from metrics import metrics, correlation_id
+
+# Pipeline settings, overridable from the .env file
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "100"))
+PIPELINE_OVERFLOW = os.getenv("PIPELINE_OVERFLOW", "block")   # block | drop_oldest | drop_duplicates
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_duplicates")
+
+# Marker stored in place of a result for jobs that will never be delivered.
+_SKIPPED = object()
+
+
+class LatencyStats:
+    """Rolling latency window for one pipeline stage."""
+
+    def __init__(self, window: int = 512):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": max(self.samples) if self.samples else 0.0,
+        }
+
+
+class _Job:
+    __slots__ = ("seq", "payload", "key", "enqueued_at", "correlation_id")
+
+    def __init__(self, seq, payload, key):
+        self.seq = seq
+        self.payload = payload
+        self.key = key
+        self.enqueued_at = time.monotonic()
+        # Workers run in their own tasks, so the submitter's ID travels with the job
+        self.correlation_id = correlation_id.get()
+
+
+class MessagePipeline:
+    """
+    Bounded ingest queue feeding N concurrent analysis workers.
+
+    Messages are analysed concurrently, but delivered strictly in the order
+    they were submitted: a finished result waits until every earlier message
+    has been delivered (or dropped), so one slow analysis delays delivery of
+    later results but never their analysis.
+
+    Overflow policies when the queue is full:
+      - block:            submit() waits for space
+      - drop_oldest:      the oldest queued message is discarded
+      - drop_duplicates:  a message whose key is already queued or in flight
+                          is discarded; otherwise submit() waits for space
+
+    A dropped message is neither analysed nor delivered; on_drop(payload)
+    is called for it instead, so the caller can tell whoever was waiting.
+
+    Each job carries the correlation ID current at submit() and restores it
+    while it is analysed and delivered; stage latencies are also recorded
+    in the shared metrics registry as <name>_<stage>.
+    """
+
+    def __init__(self, analyze, deliver, workers=PIPELINE_WORKERS, max_queue=PIPELINE_QUEUE_SIZE,
+                 overflow=PIPELINE_OVERFLOW, name="pipeline", on_drop=None):
+        """
+        Args:
+            analyze (coroutine function): analyze(payload) -> result.
+            deliver (coroutine function): deliver(payload, result); result is None if analysis raised.
+            workers (int): Number of concurrent analysis workers.
+            max_queue (int): Maximum number of queued (not yet started) messages.
+            overflow (str): One of OVERFLOW_POLICIES.
+            name (str): Prefix of the stage metrics.
+            on_drop (coroutine function): Optional on_drop(payload), called for every dropped message.
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        self.analyze = analyze
+        self.deliver = deliver
+        self.on_drop = on_drop
+        self.worker_count = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.overflow = overflow
+        self.name = name
+
+        self._queue = deque()
+        self._active_keys = {}          # key -> number of queued/in-flight jobs
+        self._results = {}              # seq -> result awaiting in-order delivery
+        self._seq = itertools.count()
+        self._next_delivery = 0
+        self._changed = None            # asyncio.Condition, created in start()
+        self._tasks = []
+        self._drop_tasks = set()        # running on_drop callbacks
+
+        self.dropped = 0
+        self.failed = 0
+        self.latency = {stage: LatencyStats() for stage in ("queue", "analyze", "reorder", "deliver", "total")}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    async def start(self):
+        self._changed = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._tasks.append(asyncio.create_task(self._deliverer()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._drop_tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ------------------------------------------------------------------
+    # Ingest
+    # ------------------------------------------------------------------
+    async def submit(self, payload, key=None) -> bool:
+        """
+        Queues a message for analysis.
+
+        Args:
+            payload: Anything analyze() and deliver() understand (e.g. a Telethon message).
+            key: Optional identity used by the drop_duplicates policy (e.g. the contract address).
+
+        Returns:
+            bool: False if the message was dropped as a duplicate.
+        """
+        async with self._changed:
+            if self.overflow == "drop_duplicates" and key is not None and self._active_keys.get(key):
+                self.dropped += 1
+                metrics.event("dropped", reason="duplicate")
+                print(f"Pipeline dropped duplicate message for {key}")
+                self._notify_drop(payload)
+                return False
+
+            if self.overflow == "drop_oldest":
+                while len(self._queue) >= self.max_queue:
+                    self._skip(self._queue.popleft())
+                    self.dropped += 1
+                    metrics.event("dropped", reason="queue_full")
+                    print("Pipeline queue full; dropped the oldest message")
+            else:
+                await self._changed.wait_for(lambda: len(self._queue) < self.max_queue)
+
+            job = _Job(next(self._seq), payload, key)
+            self._queue.append(job)
+            if key is not None:
+                self._active_keys[key] = self._active_keys.get(key, 0) + 1
+            self._changed.notify_all()
+            return True
+
+    def _release_key(self, job):
+        if job.key is not None:
+            remaining = self._active_keys.get(job.key, 1) - 1
+            if remaining:
+                self._active_keys[job.key] = remaining
+            else:
+                self._active_keys.pop(job.key, None)
+
+    def _skip(self, job):
+        self._release_key(job)
+        self._results[job.seq] = (job, _SKIPPED, 0.0)
+        self._notify_drop(job.payload, job.correlation_id)
+
+    def _notify_drop(self, payload, cid=None):
+        """Runs on_drop for a dropped message in its own task; submit() holds the lock and must not wait on it."""
+        if self.on_drop is None:
+            return
+        task = asyncio.create_task(self._run_on_drop(payload, cid))
+        self._drop_tasks.add(task)
+        task.add_done_callback(self._drop_tasks.discard)
+
+    async def _run_on_drop(self, payload, cid):
+        if cid is not None:
+            correlation_id.set(cid)
+        try:
+            await self.on_drop(payload)
+        except Exception as e:
+            print(f"Error in pipeline drop callback: {e}")
+
+    # ------------------------------------------------------------------
+    # Workers / ordered delivery
+    # ------------------------------------------------------------------
+    async def _worker(self):
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self._queue)
+                job = self._queue.popleft()
+                self._changed.notify_all()      # a blocked submit() may proceed
+
+            correlation_id.set(job.correlation_id)
+            started = time.monotonic()
+            self._observe("queue", started - job.enqueued_at)
+            try:
+                result = await self.analyze(job.payload)
+            except Exception as e:
+                self.failed += 1
+                metrics.event("analysis_failed")
+                print(f"Error in pipeline analysis: {e}")
+                result = None
+            finished = time.monotonic()
+            self._observe("analyze", finished - started)
+
+            async with self._changed:
+                self._release_key(job)
+                self._results[job.seq] = (job, result, finished)
+                self._changed.notify_all()
+
+    async def _deliverer(self):
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self._next_delivery in self._results)
+                job, result, finished = self._results.pop(self._next_delivery)
+                self._next_delivery += 1
+
+            if result is _SKIPPED:
+                continue
+            correlation_id.set(job.correlation_id)
+            started = time.monotonic()
+            self._observe("reorder", started - finished)
+            try:
+                await self.deliver(job.payload, result)
+            except Exception as e:
+                print(f"Error in pipeline delivery: {e}")
+            done = time.monotonic()
+            self._observe("deliver", done - started)
+            self._observe("total", done - job.enqueued_at)
+
+    def _observe(self, stage, seconds):
+        self.latency[stage].add(seconds)
+        metrics.record_stage(f"{self.name}_{stage}", seconds)
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "awaiting_delivery": len(self._results),
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "latency": {stage: stats.summary() for stage, stats in self.latency.items()},
+        }
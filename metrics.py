@@ -0,0 +1,308 @@
+import asyncio
+import bisect
+import contextvars
+import itertools
+import json
+import os
+import time
+
+# Metrics settings, overridable from the .env file
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))          # 0 disables the HTTP endpoint
+METRICS_JSON_LOG = os.getenv("METRICS_JSON_LOG", "")           # path for JSON stage logs, "-" = stdout, empty = off
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond detection to multi-second LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Correlation ID of the message being processed; carried across the pipeline by MessagePipeline
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+_correlation_seq = itertools.count(1)
+
+
+def new_correlation_id(prefix=None) -> str:
+    """Starts a new correlation ID (e.g. per incoming message) in the current context and returns it."""
+    value = f"{prefix}-{next(_correlation_seq)}" if prefix is not None else f"m{next(_correlation_seq)}"
+    correlation_id.set(value)
+    return value
+
+
+_INF_LABEL = 'le="+Inf"'
+
+
+def _format_labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}       # sorted label tuple -> value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(key)} {value:g}" for key, value in self._values.items()]
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels (Prometheus semantics)."""
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}       # sorted label tuple -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(sorted(labels.items())))
+        return sum(series[:-1]) if series else 0
+
+    def quantile(self, q: float, **labels) -> float:
+        """Bucket upper bound below which a fraction q of observations fall (coarse, for logs)."""
+        series = self._series.get(tuple(sorted(labels.items())))
+        if not series:
+            return 0.0
+        target, seen = q * sum(series[:-1]), 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), series[:-1]):
+            seen += bucket_count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_format_labels(key, _INF_LABEL)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class _Stage:
+    """Context manager timing one stage; see Metrics.stage()."""
+
+    __slots__ = ("metrics", "name", "labels", "started")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record_stage(self.name, time.perf_counter() - self.started,
+                                  ok=exc_type is None or exc_type is GeneratorExit, **self.labels)
+        return False
+
+
+class Metrics:
+    """
+    In-process metrics registry for the analysis pipeline.
+
+    Every stage timing lands in the analysis_stage_seconds histogram
+    (labelled by stage) and, when JSON logging is enabled, in one JSON line
+    carrying the message's correlation ID. Recording is a dict lookup and a
+    bisect, so it stays on in production. serve() exposes the registry in
+    the Prometheus text format on a local HTTP port.
+
+    Worker processes call capture() and ship take_captured() to the
+    ingester, which merge()s the records into its own registry.
+    """
+
+    def __init__(self, json_log=METRICS_JSON_LOG):
+        self.json_log = json_log
+        self.stage_seconds = Histogram("analysis_stage_seconds", "Duration of each analysis stage in seconds")
+        self.stage_errors = Counter("analysis_stage_errors_total", "Stages that raised, by stage")
+        self.events = Counter("analysis_events_total", "Pipeline events (received, delivered, dropped, ...)")
+        self._gauges = {}           # name -> (help, callable returning a number or {label value: number})
+        self._log_lines = []
+        self._log_task = None
+        self._runner = None
+        self._captured = None       # records kept for another process' registry, see capture()
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+    def stage(self, name: str, **labels) -> _Stage:
+        """
+        Times a block as one stage:
+
+            with metrics.stage("coingecko_fetch"):
+                ...
+        """
+        return _Stage(self, name, labels)
+
+    def record_stage(self, name: str, seconds: float, ok: bool = True, **labels):
+        self.stage_seconds.observe(seconds, stage=name, **labels)
+        if not ok:
+            self.stage_errors.inc(stage=name, **labels)
+        if self._captured is not None:
+            self._captured.append(("stage", name, seconds, ok, labels, correlation_id.get()))
+        if self.json_log:
+            self._log(dict(labels, stage=name, seconds=round(seconds, 6), ok=ok))
+
+    def event(self, name: str, **labels):
+        self.events.inc(event=name, **labels)
+        if self._captured is not None:
+            self._captured.append(("event", name, None, True, labels, correlation_id.get()))
+        if self.json_log:
+            self._log(dict(labels, event=name))
+
+    # ------------------------------------------------------------------
+    # Records from other processes
+    # ------------------------------------------------------------------
+    def capture(self):
+        """
+        Keeps every stage and event recorded from now on for take_captured(),
+        e.g. in a worker process whose registry nobody scrapes. The JSON log is
+        left to the process that merges the records.
+        """
+        self._captured = []
+        self.json_log = False
+
+    def take_captured(self) -> list:
+        """Returns and clears the records kept since the last call (picklable tuples)."""
+        records = self._captured or []
+        if self._captured is not None:
+            self._captured = []
+        return records
+
+    def merge(self, records: list):
+        """Records another process' take_captured() records here, under their own correlation IDs."""
+        current = correlation_id.get()
+        try:
+            for kind, name, seconds, ok, labels, cid in records:
+                correlation_id.set(cid)
+                if kind == "stage":
+                    self.record_stage(name, seconds, ok=ok, **labels)
+                else:
+                    self.event(name, **labels)
+        finally:
+            correlation_id.set(current)
+
+    def register_gauge(self, name: str, help_text: str, read):
+        """
+        Adds a gauge read at scrape time.
+
+        Args:
+            read (callable): Returns a number, or a dict of {label value: number}
+                             exposed with a "name" label.
+        """
+        self._gauges[name] = (help_text, read)
+
+    # ------------------------------------------------------------------
+    # JSON logs
+    # ------------------------------------------------------------------
+    def _log(self, record: dict):
+        record["ts"] = round(time.time(), 6)
+        record["correlation_id"] = correlation_id.get()
+        self._log_lines.append(json.dumps(record, default=str))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self._take_lines())
+            return
+        if self._log_task is None or self._log_task.done():
+            self._log_task = loop.create_task(self._drain())
+
+    def _take_lines(self) -> list:
+        lines, self._log_lines = self._log_lines, []
+        return lines
+
+    def _write(self, lines):
+        if not lines:
+            return
+        text = "\n".join(lines) + "\n"
+        if self.json_log == "-":
+            print(text, end="")
+            return
+        try:
+            with open(self.json_log, "a", encoding="utf-8") as f:
+                f.write(text)
+        except OSError as e:
+            print(f"Metrics JSON log to {self.json_log} failed: {e}")
+
+    async def _drain(self):
+        # Lines logged within ~50ms are written together, off the event loop.
+        await asyncio.sleep(0.05)
+        while self._log_lines:
+            await asyncio.to_thread(self._write, self._take_lines())
+
+    # ------------------------------------------------------------------
+    # Exposition
+    # ------------------------------------------------------------------
+    def expose(self) -> str:
+        """The whole registry in the Prometheus text exposition format."""
+        lines = self.stage_seconds.expose() + self.stage_errors.expose() + self.events.expose()
+        for name, (help_text, read) in self._gauges.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            try:
+                value = read()
+            except Exception as e:
+                print(f"Metrics gauge {name} failed: {e}")
+                continue
+            if isinstance(value, dict):
+                lines += [f'{name}{{name="{label}"}} {number:g}' for label, number in value.items()]
+            else:
+                lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        """Serves GET /metrics on host:port until stop() is called. A port of 0 disables the endpoint."""
+        if port <= 0 or self._runner is not None:
+            return
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.expose(), content_type="text/plain", charset="utf-8",
+                                headers={"X-Prometheus-Format": "0.0.4"})
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        print(f"Metrics served on http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._log_task is not None:
+            await asyncio.gather(self._log_task, return_exceptions=True)
+        if self.json_log:
+            await asyncio.to_thread(self._write, self._take_lines())
+
+
+# Shared registry used across the bot
+metrics = Metrics()
@@ -0,0 +1,188 @@
+import os
+
+try:
+    import tiktoken
+except ImportError:     # optional - falls back to a characters-per-token estimate
+    tiktoken = None
+
+# Prompt settings, overridable from the .env file
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+PROMPT_TOKENIZER_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+
+_encoding = None
+_encoding_failed = False     # tiktoken is installed but its encoding could not be loaded
+
+SYSTEM_PROMPT = (
+    "You are an expert cryptocurrency trader and technical analyst. "
+    "You have comprehensive knowledge of on-chain metrics, volume, price data, "
+    "and market trends. Your task is to analyze the provided token data, "
+    "assess metrics such as trading volume, liquidity, price trends, and risk factors, "
+    "and then provide a detailed technical analysis along with a recommendation "
+    "on whether the token is a good buy."
+)
+
+DATA_PROMPT_INSTRUCTIONS = """You are an expert financial analyst specializing in cryptocurrency markets. You are receiving calls in a Telegram channel on crypto tokens that need to be analyzed.
+The contract address is extracted from the message to query the CoinGecko API and provide you with the results on the token data.
+Please perform a highly detailed and in-depth analysis of the token using the data provided. Only consider the data points pertaining to the price and market data of the token in your analysis.
+
+Your analysis should include:
+
+1. **Detailed Analysis:**
+- For each key metric, discuss its current value, historical context (if provided), and what it might indicate about the token’s performance.
+- Analyze any patterns or anomalies. For example, if there is a significant change in volume or price, discuss potential causes and implications.
+- Evaluate the token's technical signals (such as support/resistance levels, trend lines, moving averages, RSI, MACD, etc.) and explain how they contribute to your overall conclusion.
+
+2. **Comparative Insights and Conclusion:**
+- Based on the metrics, provide an overall assessment of the token’s current state and potential future performance.
+- Explain your reasoning step-by-step, showing how the data supports the conclusion you reach.
+- Include any potential risks or red flags indicated by the data.
+- Conclude with a summary statement that clearly outlines your overall findings.
+
+3. **Transparency in Reasoning:**
+- Ensure that your analysis is comprehensive and shows exactly how each data point influenced your conclusion.
+- Use clear, technical language suitable for an audience familiar with crypto markets, while ensuring that each point is well-explained.
+
+Do not reflect the data used in your analysis in your response. Here is the token data to be used in your analysis:
+"""
+
+NO_DATA_PROMPT_INSTRUCTIONS = """You are an expert financial analyst specializing in cryptocurrency markets. Please perform a highly detailed and in-depth analysis of this token using the data provided.
+
+Only describe your analysis where it is used to educate me on your analysis logic. Otherwise, keep your response concise, but detailed, only mentioning information regarding your analysis. Your analysis should include:
+
+1. **Summary of Key Metrics:**
+- Explain briefly what each metric means in the context of crypto token performance.
+
+2. **Detailed Analysis:**
+- For each key metric, discuss its current value, historical context (if provided), and what it might indicate about the token’s performance.
+- Analyze any patterns or anomalies. For example, if there is a significant change in volume or price, discuss potential causes and implications.
+- Evaluate the token's technical signals (such as support/resistance levels, trend lines, moving averages, RSI, MACD, etc.) and explain how they contribute to your overall conclusion.
+
+3. **Comparative Insights and Conclusion:**
+- Based on the metrics, provide an overall assessment of the token’s current state and potential future performance.
+- Explain your reasoning step-by-step, showing how the data supports the conclusion you reach.
+- Include any potential risks or red flags indicated by the data.
+- Conclude with a summary statement that clearly outlines your overall findings.
+
+4. **Transparency in Reasoning:**
+- Ensure that your analysis is comprehensive and shows exactly how each data point influenced your conclusion.
+- Use clear, technical language suitable for an audience familiar with crypto markets, while ensuring that each point is well-explained.
+"""
+
+MESSAGE_HEADER = ("Here is the Telegram message that calls out the token to be analyzed. "
+                  "Use any token information in this message in your analysis as well, if available.:\n")
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and tiktoken is not None and not _encoding_failed:
+        try:
+            try:
+                _encoding = tiktoken.encoding_for_model(PROMPT_TOKENIZER_MODEL)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # e.g. the BPE file cannot be downloaded on an offline host; not retried
+            _encoding_failed = True
+            print(f"tiktoken encoding unavailable ({e!r}); estimating 4 characters per token")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Counts prompt tokens with the model's tokenizer (about 4 characters per token without tiktoken)."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Truncates text to at most max_tokens tokens, marking the cut with an ellipsis."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max(0, max_tokens * 4 - 1)].rstrip() + "…"
+    return encoding.decode(encoding.encode(text)[:max_tokens - 1]).rstrip() + "…"
+
+
+def _fit_sections(budget: int, fixed: str, sections: list) -> list:
+    """
+    Shrinks variable-length sections until fixed + sections fit in the budget.
+
+    Args:
+        budget (int): Token budget for the whole prompt.
+        fixed (str): Text that is always sent in full.
+        sections (list): Texts in the order they should be shortened (first = least important).
+
+    Returns:
+        list: The (possibly truncated) sections, same order.
+    """
+    sections = list(sections)
+    overflow = count_tokens(fixed) + sum(count_tokens(s) for s in sections) - budget
+    for i, section in enumerate(sections):
+        if overflow <= 0:
+            break
+        size = count_tokens(section)
+        keep = max(0, size - overflow)
+        sections[i] = truncate_tokens(section, keep)
+        overflow -= size - count_tokens(sections[i])
+    return sections
+
+
+def build_data_prompt(snapshot, message: str, budget: int = PROMPT_TOKEN_BUDGET, indicators: str = "") -> str:
+    """
+    Builds the analysis prompt for a token with CoinGecko data.
+
+    The description, exchange list and call message are trimmed (in that
+    order) if the prompt would otherwise exceed the token budget.
+
+    Args:
+        indicators (str): Optional technical indicator table (IndicatorEngine.table()),
+                          always sent in full so the model does not have to guess them.
+    """
+    data_lines = f"""Token Name : {snapshot.name}
+Token Platform : {snapshot.platform}
+Token Price : {snapshot.price}
+Token Market Cap : {snapshot.market_cap}
+Token 24h High : {snapshot.high_24h}
+Token 24h Low : {snapshot.low_24h}
+Token All Time High : {snapshot.ath}
+Token All Time High Date : {snapshot.ath_date}
+Token All Time Low : {snapshot.atl}
+Sentiment Thumbs Up Ratio : {snapshot.sentiment_up}
+Sentiment Thumbs Down Ratio : {snapshot.sentiment_down}
+Price Change Percentage in 1h : {snapshot.change_1h}
+Price Change Percentage in 24h : {snapshot.change_24h}
+Price Change Percentage in 7d : {snapshot.change_7d}
+Price Change Percentage in 14d : {snapshot.change_14d}
+Price Change Percentage in 30d : {snapshot.change_30d}
+Price Change Percentage in 60d : {snapshot.change_60d}
+Price Change Percentage in 200d : {snapshot.change_200d}
+Price Change Percentage in 1y : {snapshot.change_1y}
+Market Cap Rank - All Coins on Coingecko : {snapshot.market_cap_rank}
+Market Cap Change Percentage in 24h : {snapshot.market_cap_change_24h}
+Market Cap to Fully Diluted Valuation Ratio : {snapshot.market_cap_fdv_ratio}
+Twitter Followers : {snapshot.twitter_followers}
+"""
+    if snapshot.liquidity is not None:
+        data_lines += f"DEX Liquidity (USD) : {snapshot.liquidity}\n"
+    if snapshot.pair_created_at:
+        data_lines += f"Trading Pair Created : {snapshot.pair_created_at}\n"
+    data_lines += indicators
+    fixed = DATA_PROMPT_INSTRUCTIONS + data_lines + "Token Description : \nExchanges Listed : \n" + MESSAGE_HEADER
+    description, exchanges, message = _fit_sections(
+        budget, fixed, [snapshot.description or "", " - ".join(snapshot.exchanges), message])
+
+    return (DATA_PROMPT_INSTRUCTIONS + data_lines
+            + f"Token Description : {description}\n"
+            + f"Exchanges Listed : {exchanges or 'n/a'}\n"
+            + MESSAGE_HEADER + message)
+
+
+def build_no_data_prompt(message: str, budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """Builds the analysis prompt used when no CoinGecko data could be found."""
+    fixed = NO_DATA_PROMPT_INSTRUCTIONS + "Message below:\n"
+    (message,) = _fit_sections(budget, fixed, [message])
+    return fixed + message
@@ -0,0 +1,37 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Merges concurrent calls for the same key into one in-flight task.
+
+    The first caller for a key starts the work; every caller that arrives
+    while it is still running awaits the same task instead of repeating it.
+    The work runs as its own task, so one caller being cancelled does not
+    cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """
+        Args:
+            key: Hashable identity of the call.
+            fn (coroutine function): Zero-argument coroutine function doing the work.
+
+        Returns:
+            The result of fn(), shared between all concurrent callers for key.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,151 @@
+"""
+Where the bot's cold start goes.
+
+Measures, in order:
+- module imports, from `python -X importtime` in a fresh interpreter, broken
+  down by the bot's direct imports and by top-level package;
+- building the Telegram client (without logging in or connecting);
+- each service started by crypto_bot_handler.start_services();
+- the background warm-up (coin index and mention automaton), which runs
+  while messages are already being accepted.
+
+The Telegram login and connection depend on the network and are left out.
+
+Usage (from the repository root):
+    python crypto_bot_handler.py --profile-startup
+    python -m startup_profile [--top 15]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import time
+
+from clients import clients
+
+BOT_MODULE = "crypto_bot_handler"
+
+
+def import_times(module: str = BOT_MODULE) -> dict:
+    """
+    Imports a module in a fresh interpreter with -X importtime.
+
+    Args:
+        module (str): The module to import.
+
+    Returns:
+        dict: "wall" seconds for the whole interpreter run, "total" seconds spent importing the module,
+              "direct" {module: cumulative seconds} of the modules it imports itself
+              and "packages" {top-level package: self seconds}.
+    """
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+
+    # A module's line comes after the lines of everything it imports, so the
+    # lines since the previous top-level import make up its subtree
+    subtree, total, direct, packages = [], 0.0, {}, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        try:
+            self_s, cumulative_s = int(self_us) / 1e6, int(cumulative_us) / 1e6
+        except ValueError:      # the header line
+            continue
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        name = name.strip()
+        if depth > 0:
+            subtree.append((depth, name, self_s, cumulative_s))
+            continue
+        if name == module:
+            total = cumulative_s
+            for depth, name, self_s, cumulative_s in subtree:
+                package = name.split(".")[0]
+                packages[package] = packages.get(package, 0.0) + self_s
+                if depth == 1:
+                    direct[name] = direct.get(name, 0.0) + cumulative_s
+        subtree = []
+    return {"wall": wall, "total": total, "direct": direct, "packages": packages}
+
+
+def _top(timings: dict, count: int) -> list:
+    return sorted(timings.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+def profile(bot=None, top: int = 10):
+    """
+    Prints the startup breakdown.
+
+    Args:
+        bot (module): The imported crypto_bot_handler; imported (and timed) here if None.
+        top (int): Rows shown per import table.
+    """
+    print("Import time (fresh interpreter):")
+    imports = import_times()
+    print(f"  {BOT_MODULE}: {imports['total']:.3f}s ({imports['wall']:.3f}s interpreter wall time)")
+    print("  Slowest direct imports (cumulative):")
+    for name, seconds in _top(imports["direct"], top):
+        print(f"    {name:<28} {seconds:.3f}s")
+    print("  Slowest packages (self time):")
+    for name, seconds in _top(imports["packages"], top):
+        print(f"    {name:<28} {seconds:.3f}s")
+
+    steps = []
+    if bot is None:
+        started = time.perf_counter()
+        import crypto_bot_handler as bot
+        steps.append(("import (this process)", time.perf_counter() - started, None))
+
+    clients.get("telegram")
+    steps.append(("telegram client (not connected)", clients.init_seconds["telegram"], None))
+
+    @contextlib.contextmanager
+    def timed(step):
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            steps.append((step, time.perf_counter() - started, error))
+
+    async def start_and_stop():
+        started = time.perf_counter()
+        warm_up_task = await bot.start_services(timed)
+        ready = time.perf_counter() - started
+        await asyncio.gather(warm_up_task, return_exceptions=True)
+        warmed = time.perf_counter() - started
+        await bot.stop_services()
+        return ready, warmed
+
+    def print_steps():
+        print("Startup steps:")
+        for step, seconds, error in steps:
+            print(f"  {step:<32} {seconds:.3f}s" + (f"  FAILED: {error!r}" if error is not None else ""))
+
+    try:
+        ready, warmed = asyncio.run(start_and_stop())
+    finally:
+        print_steps()
+    print(f"Ready to process messages {ready:.3f}s after start_services(); "
+          f"background warm-up done after {warmed:.3f}s")
+    print("(Telegram login and connection are not included.)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=10, help="rows per import table")
+    args = parser.parse_args()
+    profile(top=args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+Local stand-in servers for the external APIs the bot talks to.
+
+Point the bot at a stub through the .env file, e.g.
+    OPENAI_BASE_URL=http://127.0.0.1:8081/v1
+    COINGECKO_API_URL=http://127.0.0.1:8082/api/v3
+    DEXSCREENER_API_URL=http://127.0.0.1:8083
+
+Run standalone:
+    python stub_servers.py openai --port 8081 --latency 0.5 2.0 --error-rate 0.05
+    python stub_servers.py coingecko --port 8082 --latency 0.05 0.3 --distribution lognormal
+    python stub_servers.py dexscreener --port 8083 --latency 0.05 0.2
+
+The telegram stub stands in for the send path only (forward / send / edit);
+benchmarks/replay.py drives it through a minimal client with the same methods.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+
+from aiohttp import web
+
+DEFAULT_REPLY = (
+    "**Detailed Analysis:** Price is consolidating above the 24h low with declining volume. "
+    "**Conclusion:** Neutral - wait for a confirmed breakout before entering. Not financial advice."
+)
+
+
+LATENCY_DISTRIBUTIONS = ("uniform", "lognormal")
+
+
+class StubBehaviour:
+    """
+    Latency / error distribution shared by the stub handlers.
+
+    With the uniform distribution latency is drawn from [min_latency,
+    max_latency]. The lognormal distribution has its median halfway between
+    the two and about 5% of requests above max_latency (a long tail).
+    error_rate is the probability that a request fails with error_status instead.
+    """
+
+    def __init__(self, min_latency=0.0, max_latency=0.0, error_rate=0.0, error_status=500, seed=None,
+                 distribution="uniform"):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {distribution!r}, expected one of {LATENCY_DISTRIBUTIONS}")
+        self.min_latency = min_latency
+        self.max_latency = max(min_latency, max_latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.distribution = distribution
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    def latency(self) -> float:
+        if self.distribution == "lognormal" and self.max_latency > 0:
+            median = (self.min_latency + self.max_latency) / 2
+            sigma = math.log(self.max_latency / median) / 1.645
+            return self.random.lognormvariate(math.log(median), sigma)
+        return self.random.uniform(self.min_latency, self.max_latency)
+
+    async def delay(self):
+        self.requests += 1
+        await asyncio.sleep(self.latency())
+
+    def should_fail(self) -> bool:
+        failed = self.random.random() < self.error_rate
+        self.errors += failed
+        return failed
+
+    def snapshot(self) -> dict:
+        return {"requests": self.requests, "errors": self.errors}
+
+
+# -----------------------------------------------------------------------------
+# OpenAI chat completions
+# -----------------------------------------------------------------------------
+def openai_app(behaviour: StubBehaviour, reply: str = DEFAULT_REPLY, chunk_words: int = 3) -> web.Application:
+    """OpenAI-compatible /v1/chat/completions, with and without stream=True."""
+
+    async def chat_completions(request):
+        body = await request.json()
+        await behaviour.delay()
+        if behaviour.should_fail():
+            return web.json_response(
+                {"error": {"message": "stub failure", "type": "server_error"}}, status=behaviour.error_status)
+
+        created = int(time.time())
+        model = body.get("model", "stub")
+        if not body.get("stream"):
+            prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+            return web.json_response({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": reply}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(reply.split()),
+                          "total_tokens": prompt_tokens + len(reply.split())},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        words = reply.split(" ")
+        try:
+            await response.prepare(request)
+            for i in range(0, len(words), chunk_words):
+                piece = " ".join(words[i:i + chunk_words]) + (" " if i + chunk_words < len(words) else "")
+                chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                await asyncio.sleep(0.01)
+            done = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            await response.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+            await response.write_eof()
+        except ConnectionResetError:
+            pass        # the client hung up mid-stream, e.g. a cancelled hedge
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    return app
+
+
+# -----------------------------------------------------------------------------
+# CoinGecko
+# -----------------------------------------------------------------------------
+def _seeded(*parts) -> random.Random:
+    """Per-token RNG, so the same address always gets the same synthetic market."""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def _coin_document(coin_id: str, platform: str = None, address: str = None) -> dict:
+    """A /coins/{id}-shaped document with plausible, deterministic market data."""
+    rng = _seeded(coin_id)
+    symbol = coin_id.split("-")[-1][:6] or "stub"
+    price = 10 ** rng.uniform(-9, 2)
+    supply = 10 ** rng.uniform(6, 15)
+    change = {period: round(rng.gauss(0, scale), 2)
+              for period, scale in (("24h", 15), ("7d", 30), ("14d", 40), ("30d", 60), ("60d", 80),
+                                    ("200d", 120), ("1y", 200))}
+    sentiment_up = round(rng.uniform(30, 95), 1)
+
+    def usd(value):
+        return {"usd": value}
+
+    return {
+        "id": coin_id,
+        "symbol": symbol,
+        "name": symbol.upper() + " Token",
+        "asset_platform_id": platform,
+        "contract_address": address,
+        "platforms": {platform: address} if platform else {},
+        "description": {"en": f"{symbol.upper()} is a community token. " * rng.randint(1, 40)},
+        "market_cap_rank": rng.randint(50, 5000),
+        "sentiment_votes_up_percentage": sentiment_up,
+        "sentiment_votes_down_percentage": round(100 - sentiment_up, 1),
+        "community_data": {"twitter_followers": rng.randint(0, 500_000)},
+        "market_data": {
+            "current_price": usd(price),
+            "market_cap": usd(price * supply * 0.6),
+            "fully_diluted_valuation": usd(price * supply),
+            "total_volume": usd(price * supply * rng.uniform(0.01, 0.5)),
+            "high_24h": usd(price * 1.08), "low_24h": usd(price * 0.93),
+            "ath": usd(price * rng.uniform(1, 20)), "ath_date": usd("2024-03-14T00:00:00.000Z"),
+            "ath_change_percentage": usd(-round(rng.uniform(0, 95), 2)), "atl": usd(price * rng.uniform(0.01, 1)),
+            "price_change_percentage_1h_in_currency": usd(round(rng.gauss(0, 3), 2)),
+            **{f"price_change_percentage_{period}": value for period, value in change.items()},
+            "market_cap_change_percentage_24h": change["24h"],
+            "market_cap_fdv_ratio": 0.6,
+            "circulating_supply": supply * 0.6, "total_supply": supply,
+        },
+        "tickers": [{"market": {"name": name}} for name in rng.sample(
+            ["Binance", "Raydium", "Uniswap V3", "OKX", "Bybit", "Gate.io", "MEXC", "Orca", "KuCoin"], 4)],
+    }
+
+
+def _listed_on_coingecko(address: str, unlisted_rate: float) -> bool:
+    """Fresh pump.fun mints (and a seeded share of the rest) are not on CoinGecko yet."""
+    return not address.endswith("pump") and _seeded(address, "listed").random() >= unlisted_rate
+
+
+def coingecko_app(behaviour: StubBehaviour, coins: int = 2000, unlisted_rate: float = 0.0) -> web.Application:
+    """
+    The CoinGecko v3 endpoints the bot calls, under /api/v3, serving synthetic
+    but deterministic data: every contract address "exists", except the
+    ones _listed_on_coingecko() rejects, which answer 404.
+    """
+    platforms = ("ethereum", "solana", "binance-smart-chain", "tron", "base")
+    coin_list = []
+    for i in range(coins):
+        rng = _seeded("coin", i)
+        platform = platforms[i % len(platforms)]
+        address = "0x" + "".join(rng.choice("0123456789abcdef") for _ in range(40))
+        coin_list.append({"id": f"stub-coin-{i}", "symbol": f"stub{i}", "name": f"Stub Coin {i}",
+                          "platforms": {platform: address}})
+
+    async def guarded(request, build):
+        await behaviour.delay()
+        if behaviour.should_fail():
+            return web.json_response({"error": "stub failure"}, status=behaviour.error_status)
+        return web.json_response(build())
+
+    def without_tickers(request, document):
+        # Like CoinGecko, leave out the ticker list when the caller switched it off
+        if request.query.get("tickers") == "false":
+            document.pop("tickers", None)
+        return document
+
+    async def contract(request):
+        platform, address = request.match_info["platform"], request.match_info["address"]
+        if not _listed_on_coingecko(address, unlisted_rate):
+            await behaviour.delay()
+            return web.json_response({"error": "coin not found"}, status=404)
+        return await guarded(request, lambda: without_tickers(
+            request, _coin_document(f"{platform}-{address[-6:].lower()}", platform, address)))
+
+    async def coin(request):
+        return await guarded(request, lambda: without_tickers(request, _coin_document(request.match_info["coin_id"])))
+
+    async def coins_list(request):
+        return await guarded(request, lambda: coin_list)
+
+    async def search(request):
+        query = request.query.get("query", "").lower()
+        return await guarded(request, lambda: {"coins": [
+            {"id": c["id"], "name": c["name"], "symbol": c["symbol"]}
+            for c in coin_list if query and (query == c["symbol"] or query in c["name"].lower())][:25]})
+
+    # Market-cap ranking of the coin list, for /coins/markets
+    ranked = sorted(coin_list, key=lambda c: -_seeded(c["id"], "market_cap").random())
+
+    async def markets(request):
+        per_page = int(request.query.get("per_page", "100"))
+        page = int(request.query.get("page", "1"))
+        first = (page - 1) * per_page
+        return await guarded(request, lambda: [
+            {"id": c["id"], "symbol": c["symbol"], "name": c["name"], "market_cap_rank": first + i + 1}
+            for i, c in enumerate(ranked[first:first + per_page])])
+
+    def candles(coin_id, days):
+        rng = _seeded(coin_id, "ohlc")
+        step = 1_800_000 if days <= 2 else 4 * 3_600_000
+        count = int(days * 86_400_000 // step)
+        now = int(time.time() * 1000) // step * step
+        price, rows = 10 ** rng.uniform(-6, 1), []
+        for i in range(count):
+            close = price * math.exp(rng.gauss(0, 0.02))
+            rows.append([now - (count - 1 - i) * step, price, max(price, close) * 1.01, min(price, close) * 0.99, close])
+            price = close
+        return rows
+
+    def token_prices(platform, addresses):
+        # Same base price as the contract document, drifting +-50% over an hour so watchlist alerts fire
+        now = time.time()
+        quotes = {}
+        for address in addresses:
+            coin_id = f"{platform}-{address[-6:].lower()}"
+            rng = _seeded(coin_id)
+            price = 10 ** rng.uniform(-9, 2) * math.exp(0.4 * math.sin(2 * math.pi * now / 3600 + rng.uniform(0, 6.3)))
+            key = address.lower() if address.startswith("0x") else address
+            quotes[key] = {"usd": price, "usd_24h_change": round(rng.gauss(0, 15), 2),
+                           "last_updated_at": int(now // 60 * 60)}
+        return quotes
+
+    async def token_price(request):
+        addresses = [a for a in request.query.get("contract_addresses", "").split(",") if a]
+        return await guarded(request, lambda: token_prices(request.match_info["platform"], addresses))
+
+    async def ohlc(request):
+        days = float(request.query.get("days", "1"))
+        return await guarded(request, lambda: candles(request.match_info["coin_id"], days))
+
+    async def market_chart(request):
+        days = float(request.query.get("days", "1"))
+        rows = candles(request.match_info["coin_id"], days)
+        rng = _seeded(request.match_info["coin_id"], "volume")
+        return await guarded(request, lambda: {
+            "prices": [[row[0], row[4]] for row in rows],
+            "total_volumes": [[row[0], row[4] * 10 ** rng.uniform(6, 9)] for row in rows],
+        })
+
+    app = web.Application()
+    app.router.add_get("/api/v3/coins/list", coins_list)
+    app.router.add_get("/api/v3/search", search)
+    app.router.add_get("/api/v3/coins/markets", markets)
+    app.router.add_get("/api/v3/coins/{platform}/contract/{address}", contract)
+    app.router.add_get("/api/v3/simple/token_price/{platform}", token_price)
+    app.router.add_get("/api/v3/coins/{coin_id}/ohlc", ohlc)
+    app.router.add_get("/api/v3/coins/{coin_id}/market_chart", market_chart)
+    app.router.add_get("/api/v3/coins/{coin_id}", coin)
+    return app
+
+
+# -----------------------------------------------------------------------------
+# DexScreener
+# -----------------------------------------------------------------------------
+def _dex_pairs(address: str) -> list:
+    """
+    DexScreener pair objects for a token: one to three pools on the chain
+    the address belongs to, priced like the CoinGecko contract document.
+    """
+    platform, chain = ("ethereum", "ethereum") if address.startswith("0x") else ("solana", "solana")
+    coin_id = f"{platform}-{address[-6:].lower()}"
+    price = 10 ** _seeded(coin_id).uniform(-9, 2)
+    rng = _seeded(coin_id, "dex")
+    symbol = coin_id.split("-")[-1][:6] or "stub"
+    supply = 10 ** rng.uniform(6, 15)
+    dexes = ["uniswap", "raydium", "pumpswap", "orca", "sushiswap", "meteora"]
+    pairs = []
+    for i in range(rng.randint(1, 3)):
+        pairs.append({
+            "chainId": chain,
+            "dexId": rng.choice(dexes),
+            "pairAddress": f"{address[:10]}pair{i}",
+            "baseToken": {"address": address, "name": symbol.upper() + " Token", "symbol": symbol.upper()},
+            "quoteToken": {"symbol": "WETH" if chain == "ethereum" else "SOL"},
+            "priceUsd": f"{price * rng.uniform(0.99, 1.01):.12g}",
+            "priceChange": {"h1": round(rng.gauss(0, 5), 2), "h24": round(rng.gauss(0, 25), 2)},
+            "volume": {"h24": round(price * supply * rng.uniform(0.001, 0.2), 2)},
+            "liquidity": {"usd": round(price * supply * rng.uniform(0.001, 0.05), 2)},
+            "fdv": round(price * supply, 2),
+            "marketCap": round(price * supply * 0.9, 2),
+            "pairCreatedAt": int((time.time() - rng.uniform(600, 90 * 86400)) * 1000),
+        })
+    return pairs
+
+
+def dexscreener_app(behaviour: StubBehaviour) -> web.Application:
+    """GET /latest/dex/tokens/{addresses}: every address has pools, on Ethereum (0x...) or Solana."""
+
+    async def tokens(request):
+        await behaviour.delay()
+        if behaviour.should_fail():
+            return web.json_response({"error": "stub failure"}, status=behaviour.error_status)
+        addresses = [a for a in request.match_info["addresses"].split(",") if a]
+        return web.json_response({"schemaVersion": "1.0.0",
+                                  "pairs": [pair for address in addresses for pair in _dex_pairs(address)]})
+
+    app = web.Application()
+    app.router.add_get("/latest/dex/tokens/{addresses}", tokens)
+    return app
+
+
+# -----------------------------------------------------------------------------
+# Telegram send path
+# -----------------------------------------------------------------------------
+def telegram_app(behaviour: StubBehaviour) -> web.Application:
+    """
+    POST /forward, /send and /edit with a JSON body; each answers {"id": message_id}.
+    Delivered messages are recorded per chat in app["chats"] for inspection.
+    """
+    message_ids = iter(range(1, 1 << 62))
+    chats = {}
+
+    async def handle(request):
+        body = await request.json()
+        await behaviour.delay()
+        if behaviour.should_fail():
+            return web.json_response({"error": "stub failure"}, status=behaviour.error_status)
+        action = request.path.strip("/")
+        message_id = body.get("message_id") if action == "edit" else next(message_ids)
+        chats.setdefault(str(body.get("chat")), []).append((action, message_id, body.get("source_id")))
+        return web.json_response({"id": message_id})
+
+    app = web.Application()
+    app["chats"] = chats
+    for action in ("forward", "send", "edit"):
+        app.router.add_post(f"/{action}", handle)
+    return app
+
+
+# -----------------------------------------------------------------------------
+# Runner helpers
+# -----------------------------------------------------------------------------
+async def start_app(app: web.Application, host: str = "127.0.0.1", port: int = 0) -> tuple:
+    """
+    Starts an app on a background site.
+
+    Returns:
+        tuple: (runner, base_url) - call `await runner.cleanup()` to stop it.
+    """
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+STUBS = {
+    "openai": openai_app,
+    "coingecko": coingecko_app,
+    "dexscreener": dexscreener_app,
+    "telegram": telegram_app,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("stub", choices=sorted(STUBS))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.0, 0.0), metavar=("MIN", "MAX"))
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default="uniform")
+    args = parser.parse_args()
+
+    behaviour = StubBehaviour(args.latency[0], args.latency[1], args.error_rate, args.error_status,
+                              distribution=args.distribution)
+    web.run_app(STUBS[args.stub](behaviour), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
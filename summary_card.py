@@ -0,0 +1,140 @@
+import calendar
+import math
+import os
+import time
+
+# Summary card settings, overridable from the .env file
+SUMMARY_CARD = os.getenv("SUMMARY_CARD", "true").lower() in ("1", "true", "yes")   # card first, LLM analysis second
+DEEP_ANALYSIS_WORKERS = int(os.getenv("DEEP_ANALYSIS_WORKERS", "4"))
+DEEP_ANALYSIS_MAX_BACKLOG = int(os.getenv("DEEP_ANALYSIS_MAX_BACKLOG", "20"))   # queued deep dives before new ones are skipped
+
+# Red flag thresholds
+MIN_LIQUIDITY_USD = 20_000
+MIN_LIQUIDITY_TO_MARKET_CAP = 0.02
+MIN_CIRCULATING_RATIO = 0.3
+MAX_VOLUME_TO_MARKET_CAP = 3.0
+MIN_VOLUME_TO_MARKET_CAP = 0.005
+MAX_ATH_DRAWDOWN = -90.0
+MAX_DUMP_24H = -30.0
+MAX_PUMP_24H = 100.0
+MIN_PAIR_AGE_HOURS = 24
+MAX_BEARISH_VOTES = 50.0
+CARD_EXCHANGES = 4
+
+SKIPPED_NOTE = "Deep analysis skipped - the bot is under heavy load."
+
+
+def _usd(value) -> str:
+    for limit, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if abs(value) >= limit:
+            return f"${value / limit:.2f}{suffix}"
+    return f"${value:,.2f}"
+
+
+def _price(value) -> str:
+    if value >= 1 or value <= 0:
+        return f"${value:,.4f}".rstrip("0").rstrip(".")
+    # Four significant digits, without scientific notation
+    return f"${value:.{3 - math.floor(math.log10(value))}f}"
+
+
+def _pair_age_hours(created: str):
+    try:
+        return (time.time() - calendar.timegm(time.strptime(created, "%Y-%m-%dT%H:%M:%SZ"))) / 3600
+    except (TypeError, ValueError):
+        return None
+
+
+def red_flags(snapshot) -> list:
+    """
+    Risk heuristics computed from the market data alone.
+
+    Args:
+        snapshot (TokenSnapshot): The token's market state.
+
+    Returns:
+        list: One short, human-readable reason per flag raised, most serious first.
+    """
+    flags = []
+    market_cap, volume, liquidity = snapshot.market_cap, snapshot.total_volume, snapshot.liquidity
+    if liquidity is not None:
+        if liquidity < MIN_LIQUIDITY_USD:
+            flags.append(f"Thin liquidity ({_usd(liquidity)}) - small orders move the price")
+        elif market_cap and liquidity / market_cap < MIN_LIQUIDITY_TO_MARKET_CAP:
+            flags.append(f"Liquidity is only {liquidity / market_cap:.1%} of market cap")
+    if snapshot.price and not market_cap:
+        flags.append("No circulating market cap reported")
+    age = _pair_age_hours(snapshot.pair_created_at)
+    if age is not None and age < MIN_PAIR_AGE_HOURS:
+        flags.append(f"Trading pair is only {age:.0f}h old")
+    if snapshot.change_24h is not None:
+        if snapshot.change_24h <= MAX_DUMP_24H:
+            flags.append(f"Dumped {-snapshot.change_24h:.0f}% in 24h")
+        elif snapshot.change_24h >= MAX_PUMP_24H:
+            flags.append(f"Up {snapshot.change_24h:+.0f}% in 24h - late entries buy the top")
+    if market_cap and volume is not None:
+        if volume / market_cap > MAX_VOLUME_TO_MARKET_CAP:
+            flags.append(f"24h volume is {volume / market_cap:.1f}x market cap - possible wash trading")
+        elif volume / market_cap < MIN_VOLUME_TO_MARKET_CAP:
+            flags.append(f"Barely traded - 24h volume is {volume / market_cap:.2%} of market cap")
+    if snapshot.market_cap_fdv_ratio is not None and snapshot.market_cap_fdv_ratio < MIN_CIRCULATING_RATIO:
+        flags.append(f"Only {snapshot.market_cap_fdv_ratio:.0%} of supply circulating - unlocks can dilute holders")
+    if snapshot.ath_change_percentage is not None and snapshot.ath_change_percentage <= MAX_ATH_DRAWDOWN:
+        flags.append(f"{-snapshot.ath_change_percentage:.0f}% below its all-time high")
+    if len(snapshot.exchanges) == 1:
+        flags.append(f"Trades on a single venue ({snapshot.exchanges[0]})")
+    if snapshot.sentiment_down is not None and snapshot.sentiment_down >= MAX_BEARISH_VOTES:
+        flags.append(f"{snapshot.sentiment_down:.0f}% of community votes are bearish")
+    return flags
+
+
+def render_card(snapshot) -> str:
+    """
+    Formats the summary card posted before the LLM analysis. Deterministic:
+    the same snapshot always renders the same text, and fields the data
+    source does not provide are left out.
+
+    Args:
+        snapshot (TokenSnapshot): The token's market state.
+
+    Returns:
+        str: The card text.
+    """
+    title = snapshot.name or snapshot.symbol or snapshot.contract_address
+    symbol = f" ({snapshot.symbol})" if snapshot.symbol and snapshot.symbol != title else ""
+    lines = [f"📊 **{title}{symbol}** on {snapshot.platform}"]
+
+    changes = [f"{period} {value:+.1f}%" for period, value in (("24h", snapshot.change_24h),
+                                                               ("7d", snapshot.change_7d)) if value is not None]
+    if snapshot.price is not None:
+        lines.append(f"Price: {_price(snapshot.price)}" + (f" ({', '.join(changes)})" if changes else ""))
+    market = []
+    if snapshot.market_cap:
+        market.append(f"Market cap: {_usd(snapshot.market_cap)}")
+    if snapshot.market_cap_fdv_ratio is not None:
+        market.append(f"MC/FDV: {snapshot.market_cap_fdv_ratio:.2f}")
+    if market:
+        lines.append(" | ".join(market))
+    trading = []
+    if snapshot.total_volume is not None:
+        trading.append(f"24h volume: {_usd(snapshot.total_volume)}")
+    if snapshot.liquidity is not None:
+        trading.append(f"Liquidity: {_usd(snapshot.liquidity)}")
+    if trading:
+        lines.append(" | ".join(trading))
+    if snapshot.ath is not None and snapshot.ath_change_percentage is not None:
+        lines.append(f"ATH: {_price(snapshot.ath)} ({snapshot.ath_change_percentage:+.1f}% from ATH)")
+    if snapshot.exchanges:
+        more = len(snapshot.exchanges) - CARD_EXCHANGES
+        lines.append("Exchanges: " + ", ".join(snapshot.exchanges[:CARD_EXCHANGES])
+                     + (f" +{more} more" if more > 0 else ""))
+    if snapshot.sentiment_up is not None and snapshot.sentiment_down is not None:
+        lines.append(f"Sentiment: {snapshot.sentiment_up:.0f}% bullish / {snapshot.sentiment_down:.0f}% bearish")
+
+    flags = red_flags(snapshot)
+    if flags:
+        lines.append("\n⚠️ Red flags:")
+        lines += [f"• {flag}" for flag in flags]
+    else:
+        lines.append("\n✅ No red flags in the market data")
+    return "\n".join(lines)
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import time
+
+from message_pipeline import LatencyStats
+from metrics import metrics
+
+# Streaming settings, overridable from the .env file
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))    # minimum seconds between edits
+TELEGRAM_MESSAGE_LIMIT = int(os.getenv("TELEGRAM_MESSAGE_LIMIT", "4096"))
+STREAM_PLACEHOLDER = os.getenv("STREAM_PLACEHOLDER", "⏳ Analyzing...")
+STREAM_CURSOR = " ▌"
+
+# Time from placeholder creation to the first model text being visible in Telegram
+first_token_latency = LatencyStats()
+
+
+def _split_point(text: str, limit: int) -> int:
+    """Index to cut an over-long message at, preferring a paragraph or line break."""
+    for separator in ("\n\n", "\n", " "):
+        cut = text.rfind(separator, limit // 2, limit)
+        if cut != -1:
+            return cut + len(separator)
+    return limit
+
+
+class StreamingReply:
+    """
+    A Telegram message that is progressively edited as LLM text streams in.
+
+    Chunks are buffered and flushed at most once per min_interval, so a fast
+    stream costs a handful of edits rather than one per token. FloodWait
+    errors push the next edit back instead of failing. When the text outgrows
+    Telegram's message limit the current message is finalised and the rest
+    continues in a reply.
+    """
+
+    def __init__(self, client, entity, min_interval=STREAM_EDIT_INTERVAL, limit=TELEGRAM_MESSAGE_LIMIT,
+                 reply_to=None):
+        self.client = client
+        self.entity = entity
+        self.min_interval = min_interval
+        # Leave room for the typing cursor shown while streaming.
+        self.limit = limit - len(STREAM_CURSOR)
+        self.reply_to = reply_to
+        self.messages = []          # every Telegram message sent for this reply, in order
+        self.text = ""              # text belonging to the current (last) message
+        self.created_at = time.monotonic()
+        self.first_visible_at = None
+        self._shown = None          # text currently displayed in the current message
+        self._next_edit_at = 0.0
+
+    async def start(self, placeholder: str = STREAM_PLACEHOLDER):
+        """Sends the placeholder message. Call as soon as the call is detected."""
+        message = await self._send(placeholder)
+        self.messages.append(message)
+        self._shown = placeholder
+        return message
+
+    async def _send(self, text):
+        from telethon.errors import FloodWaitError
+
+        while True:
+            try:
+                with metrics.stage("telegram_send"):
+                    return await self.client.send_message(entity=self.entity, message=text, reply_to=self.reply_to)
+            except FloodWaitError as e:
+                print(f"Flood wait on send, sleeping {e.seconds}s")
+                await asyncio.sleep(e.seconds)
+
+    async def _edit(self, text, force=False):
+        from telethon.errors import FloodWaitError, MessageNotModifiedError
+
+        if text == self._shown:
+            return
+        now = time.monotonic()
+        if not force and now < self._next_edit_at:
+            return
+        if force and now < self._next_edit_at:
+            await asyncio.sleep(self._next_edit_at - now)
+        try:
+            with metrics.stage("telegram_edit"):
+                await self.client.edit_message(self.entity, self.messages[-1], text)
+        except MessageNotModifiedError:
+            pass
+        except FloodWaitError as e:
+            print(f"Flood wait on edit, deferring edits by {e.seconds}s")
+            self._next_edit_at = time.monotonic() + e.seconds
+            if force:
+                await self._edit(text, force=True)
+            return
+        self._shown = text
+        self._next_edit_at = time.monotonic() + self.min_interval
+        if self.first_visible_at is None and self.text.strip():
+            self.first_visible_at = time.monotonic()
+            first_token_latency.add(self.first_visible_at - self.created_at)
+            metrics.record_stage("first_visible_token", self.first_visible_at - self.created_at)
+
+    async def feed(self, chunk: str):
+        """Appends a streamed chunk, rolling over and editing as needed."""
+        if not chunk:
+            return
+        self.text += chunk
+        while len(self.text) > self.limit:
+            cut = _split_point(self.text, self.limit)
+            head, self.text = self.text[:cut].rstrip(), self.text[cut:]
+            await self._edit(head, force=True)
+            # Continuations reply to the previous part so the thread reads in order.
+            self.reply_to = self.messages[-1]
+            self.messages.append(await self._send("…"))
+            self._shown = "…"
+        await self._edit(self.text + STREAM_CURSOR)
+
+    async def finish(self, fallback: str = "No analysis could be produced for this message."):
+        """Writes the final text (without the cursor) to the current message."""
+        await self._edit(self.text if self.text.strip() else fallback, force=True)
+
+    async def replace(self, text: str):
+        """Shows a complete text (e.g. a summary card) in the current message at once, in place of what it shows."""
+        self.text = text
+        await self._edit(text, force=True)
+
+
+class FanOutReply:
+    """
+    Streams the same text into one StreamingReply per target chat.
+
+    A failing target is logged and dropped; the others keep streaming.
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.text = ""              # the whole streamed text, across message rollovers
+
+    @property
+    def messages(self) -> list:
+        return [message for reply in self.replies for message in reply.messages]
+
+    async def _each(self, action, name):
+        results = await asyncio.gather(*(action(reply) for reply in self.replies), return_exceptions=True)
+        for reply, result in zip(list(self.replies), results):
+            if isinstance(result, Exception):
+                print(f"Streaming {name} to {reply.entity} failed: {result}")
+                self.replies.remove(reply)
+
+    async def feed(self, chunk: str):
+        self.text += chunk
+        await self._each(lambda reply: reply.feed(chunk), "edit")
+
+    async def finish(self, fallback: str = "No analysis could be produced for this message."):
+        await self._each(lambda reply: reply.finish(fallback), "finish")
+
+    async def replace(self, text: str):
+        self.text = text
+        await self._each(lambda reply: reply.replace(text), "edit")
+
+
+async def stream_to_telegram(client, entity, chunks, reply=None, **kwargs) -> StreamingReply:
+    """
+    Streams an async iterable of text chunks into a Telegram message.
+
+    Args:
+        client: Connected TelegramClient.
+        entity: Target chat.
+        chunks: Async iterable of text chunks (e.g. gpt_actions.stream_chatgpt()).
+        reply (StreamingReply or FanOutReply): An already-started reply to continue; one is created otherwise.
+
+    Returns:
+        StreamingReply: The finished reply.
+    """
+    if reply is None:
+        reply = StreamingReply(client, entity, **kwargs)
+        await reply.start()
+    try:
+        async for chunk in chunks:
+            await reply.feed(chunk)
+    finally:
+        await reply.finish()
+    return reply
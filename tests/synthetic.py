@@ -0,0 +1,19 @@
+"""Synthetic market data shared by the tests and the benchmarks."""
+import numpy as np
+
+
+def synthetic_ohlcv(candles, seed=0):
+    """
+    A random-walk 4h candle history.
+
+    Returns:
+        tuple: ([timestamp_ms, open, high, low, close] rows, per-candle volumes), as numpy arrays.
+    """
+    rng = np.random.default_rng(seed)
+    close = np.exp(np.cumsum(rng.normal(0, 0.02, candles))) * 1e-4
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, candles)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, candles)))
+    times = 1_600_000_000_000 + np.arange(candles) * 4 * 3_600_000
+    volume = rng.lognormal(10, 1, candles)
+    return np.column_stack((times, open_, high, low, close)), volume
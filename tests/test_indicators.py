@@ -0,0 +1,174 @@
+"""
+Checks every IndicatorEngine series against straightforward loop-based
+reference implementations (TA-Lib conventions), both for a single batch and
+when candles arrive in random batches with revised last candles.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from indicators import IndicatorEngine
+from tests.synthetic import synthetic_ohlcv
+
+CANDLES = 3000
+SEED = 0
+
+
+# ----------------------------------------------------------------------
+# Reference implementations: one candle at a time
+# ----------------------------------------------------------------------
+def ref_sma(values, period):
+    return [sum(values[i - period + 1:i + 1]) / period if i >= period - 1 else math.nan
+            for i in range(len(values))]
+
+
+def ref_ema(values, period, alpha=None):
+    """EMA over the non-NaN values, seeded with the mean of the first `period` of them."""
+    alpha = alpha if alpha is not None else 2 / (period + 1)
+    out, seed, ema = [], [], None
+    for value in values:
+        if math.isnan(value):
+            out.append(math.nan)
+        elif ema is None:
+            seed.append(value)
+            if len(seed) == period:
+                ema = sum(seed) / period
+            out.append(math.nan if ema is None else ema)
+        else:
+            ema = alpha * value + (1 - alpha) * ema
+            out.append(ema)
+    return out
+
+
+def ref_rsi(close, period):
+    deltas = [math.nan] + [close[i] - close[i - 1] for i in range(1, len(close))]
+    gains = ref_ema([d if math.isnan(d) else max(d, 0.0) for d in deltas], period, 1 / period)
+    losses = ref_ema([d if math.isnan(d) else max(-d, 0.0) for d in deltas], period, 1 / period)
+    return [math.nan if math.isnan(g) else (50.0 if g + l == 0 else 100 * g / (g + l))
+            for g, l in zip(gains, losses)]
+
+
+def ref_bollinger(close, period, k):
+    upper, lower = [], []
+    for i in range(len(close)):
+        if i < period - 1:
+            upper.append(math.nan)
+            lower.append(math.nan)
+            continue
+        window = close[i - period + 1:i + 1]
+        mean = sum(window) / period
+        std = math.sqrt(sum((x - mean) ** 2 for x in window) / period)
+        upper.append(mean + k * std)
+        lower.append(mean - k * std)
+    return upper, lower
+
+
+def ref_atr(high, low, close, period):
+    true_ranges = [high[0] - low[0]] + [
+        max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        for i in range(1, len(close))]
+    return ref_ema(true_ranges, period, 1 / period)
+
+
+def ref_vwap(high, low, close, volume, period):
+    out = []
+    for i in range(len(close)):
+        if i < period - 1:
+            out.append(math.nan)
+            continue
+        window = range(i - period + 1, i + 1)
+        pv = sum((high[j] + low[j] + close[j]) / 3 * volume[j] for j in window)
+        out.append(pv / sum(volume[j] for j in window))
+    return out
+
+
+def reference_series(engine, rows, volume):
+    high, low, close = rows[:, 2].tolist(), rows[:, 3].tolist(), rows[:, 4].tolist()
+    volume = volume.tolist()
+    fast, slow, signal = engine.macd_periods
+    ema_fast, ema_slow = ref_ema(close, fast), ref_ema(close, slow)
+    macd = [a - b for a, b in zip(ema_fast, ema_slow)]
+    macd_signal = ref_ema(macd, signal)
+    bb_upper, bb_lower = ref_bollinger(close, engine.bb_period, engine.bb_k)
+    return {
+        "sma_fast": ref_sma(close, engine.sma_periods[0]),
+        "sma_slow": ref_sma(close, engine.sma_periods[1]),
+        "ema_fast": ema_fast,
+        "ema_slow": ema_slow,
+        "rsi": ref_rsi(close, engine.rsi_period),
+        "macd": macd,
+        "macd_signal": macd_signal,
+        "macd_hist": [a - b for a, b in zip(macd, macd_signal)],
+        "bb_upper": bb_upper,
+        "bb_lower": bb_lower,
+        "atr": ref_atr(high, low, close, engine.atr_period),
+        "vwap": ref_vwap(high, low, close, volume, engine.vwap_period),
+    }
+
+
+SERIES = ("sma_fast", "sma_slow", "ema_fast", "ema_slow", "rsi", "macd", "macd_signal", "macd_hist",
+          "bb_upper", "bb_lower", "atr", "vwap")
+
+
+@pytest.fixture(scope="module")
+def candles():
+    return synthetic_ohlcv(CANDLES, SEED)
+
+
+@pytest.fixture(scope="module")
+def expected(candles):
+    rows, volume = candles
+    return reference_series(IndicatorEngine(), rows, volume)
+
+
+@pytest.fixture(scope="module")
+def batch_engine(candles):
+    rows, volume = candles
+    engine = IndicatorEngine()
+    engine.update(rows, volume)
+    return engine
+
+
+@pytest.fixture(scope="module")
+def incremental_engine(candles):
+    """
+    Fed in random batch sizes, each batch also re-sending a provisional version of
+    its last candle first, the way CoinGecko revises the still-forming candle.
+    """
+    rows, volume = candles
+    rng = np.random.default_rng(SEED + 1)
+    engine = IndicatorEngine()
+    position = 0
+    while position < CANDLES:
+        end = min(CANDLES, position + int(rng.integers(1, 64)))
+        provisional = rows[end - 1].copy()
+        provisional[2:5] *= 1 + rng.normal(0, 0.05)
+        provisional_volume = volume[position:end].copy()
+        provisional_volume[-1] *= 0.5
+        engine.update(np.vstack((rows[position:end - 1], provisional)), provisional_volume)
+        engine.update(rows[end - 1:end], volume[end - 1:end])
+        if end - 1 > position:
+            # Re-sent overlap: already-seen candles must be ignored
+            engine.update(rows[position:end], volume[position:end])
+        position = end
+    return engine
+
+
+def assert_matches(actual, values):
+    values = np.asarray(values)
+    np.testing.assert_allclose(actual, values, rtol=1e-9, atol=1e-12 * np.nanmax(np.abs(values)), equal_nan=True)
+
+
+@pytest.mark.parametrize("name", SERIES)
+def test_single_batch_matches_reference(batch_engine, expected, name):
+    assert_matches(batch_engine.series(name), expected[name])
+
+
+@pytest.mark.parametrize("name", SERIES)
+def test_incremental_updates_match_reference(incremental_engine, expected, name):
+    assert_matches(incremental_engine.series(name), expected[name])
+
+
+def test_incremental_updates_ignore_resent_candles(incremental_engine):
+    assert len(incremental_engine) == CANDLES
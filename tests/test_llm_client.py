@@ -0,0 +1,167 @@
+"""
+Drives LLMClient.complete() and LLMClient.stream() against the OpenAI stub from
+stub_servers.py: retries, the overall deadline, first-chunk hedging, and the
+concurrency slot being given back however a stream ends.
+"""
+import asyncio
+
+import pytest
+
+import llm_client
+import stub_servers
+from llm_client import LLMClient
+from stub_servers import DEFAULT_REPLY, StubBehaviour
+
+MESSAGES = [{"role": "user", "content": "How is $PEPE doing?"}]
+
+
+class ScriptedBehaviour(StubBehaviour):
+    """Plays back (latency, fail) for each request in turn, then answers at once."""
+
+    def __init__(self, *script):
+        super().__init__()
+        self.script = list(script)
+        self._fail = False
+
+    def latency(self) -> float:
+        latency, self._fail = self.script.pop(0) if self.script else (0.0, False)
+        return latency
+
+    def should_fail(self) -> bool:
+        self.errors += self._fail
+        return self._fail
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    # Retry backoff is scaled by random.uniform(); zero keeps the tests fast
+    monkeypatch.setattr(llm_client.random, "uniform", lambda a, b: 0.0)
+
+
+def run(behaviour, body, **client_options):
+    async def main():
+        runner, base_url = await stub_servers.start_app(stub_servers.openai_app(behaviour))
+        client = LLMClient(base_url=base_url + "/v1", **client_options)
+        try:
+            return await body(client)
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+async def collect(client, **kwargs):
+    return "".join([chunk async for chunk in client.stream(MESSAGES, **kwargs)])
+
+
+def assert_slots_free(client):
+    assert client._semaphore._value == client.max_concurrency
+
+
+def test_complete_returns_the_reply():
+    async def body(client):
+        assert await client.complete(MESSAGES) == DEFAULT_REPLY
+        assert_slots_free(client)
+
+    run(StubBehaviour(), body)
+
+
+def test_stream_yields_the_reply_in_chunks():
+    async def body(client):
+        chunks = [chunk async for chunk in client.stream(MESSAGES)]
+        assert len(chunks) > 1
+        assert "".join(chunks) == DEFAULT_REPLY
+        assert client.first_chunk_latency.count == 1
+        assert_slots_free(client)
+
+    run(StubBehaviour(), body)
+
+
+def test_complete_retries_transient_errors():
+    behaviour = ScriptedBehaviour((0.0, True), (0.0, True))
+
+    async def body(client):
+        assert await client.complete(MESSAGES) == DEFAULT_REPLY
+        assert client.stats["retries"] == 2
+
+    run(behaviour, body)
+    assert behaviour.requests == 3
+
+
+def test_stream_retries_transient_errors_before_the_first_chunk():
+    behaviour = ScriptedBehaviour((0.0, True))
+
+    async def body(client):
+        assert await collect(client) == DEFAULT_REPLY
+        assert client.stats["retries"] == 1
+        assert_slots_free(client)
+
+    run(behaviour, body)
+    assert behaviour.requests == 2
+
+
+def test_stream_gives_up_after_max_retries():
+    import openai
+
+    async def body(client):
+        with pytest.raises(openai.InternalServerError):
+            await collect(client)
+        assert client.stats["errors"] == 1
+        assert_slots_free(client)
+
+    run(ScriptedBehaviour((0.0, True), (0.0, True)), body, max_retries=1)
+
+
+@pytest.mark.parametrize("mode", ["complete", "stream"])
+def test_deadline_covers_the_whole_call(mode):
+    async def body(client):
+        with pytest.raises(asyncio.TimeoutError):
+            if mode == "complete":
+                await client.complete(MESSAGES, deadline=0.2)
+            else:
+                await collect(client, deadline=0.2)
+        assert client.stats["timeouts"] == 1
+        assert_slots_free(client)
+
+    run(ScriptedBehaviour((1.0, False)), body)
+
+
+def test_stream_hedges_a_slow_first_chunk():
+    behaviour = ScriptedBehaviour((1.0, False), (0.0, False))
+
+    async def body(client):
+        client.first_chunk_latency.add(0.05)
+        started = asyncio.get_running_loop().time()
+        assert await collect(client) == DEFAULT_REPLY
+        assert asyncio.get_running_loop().time() - started < 0.8
+        assert client.stats["hedged"] == 1
+        assert client.stats["hedge_wins"] == 1
+        assert_slots_free(client)
+
+    run(behaviour, body, hedge=True, hedge_min_samples=1)
+    assert behaviour.requests == 2
+
+
+def test_stream_without_hedging_waits_for_the_primary():
+    behaviour = ScriptedBehaviour((0.3, False))
+
+    async def body(client):
+        client.first_chunk_latency.add(0.05)
+        assert await collect(client) == DEFAULT_REPLY
+        assert client.stats["hedged"] == 0
+
+    run(behaviour, body, hedge=False, hedge_min_samples=1)
+    assert behaviour.requests == 1
+
+
+def test_stream_frees_its_slot_when_the_caller_stops_early():
+    async def body(client):
+        chunks = client.stream(MESSAGES)
+        assert await chunks.__anext__()
+        assert client._semaphore._value == client.max_concurrency - 1
+        await chunks.aclose()
+        assert_slots_free(client)
+
+    run(StubBehaviour(), body)
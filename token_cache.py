@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from token_snapshot import TokenSnapshot
+
+# Cache settings, overridable from the .env file
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+TOKEN_CACHE_META_TTL = float(os.getenv("TOKEN_CACHE_META_TTL", "21600"))     # name, symbol, platforms, links...
+TOKEN_CACHE_MARKET_TTL = float(os.getenv("TOKEN_CACHE_MARKET_TTL", "30"))    # price, market cap, volume...
+TOKEN_CACHE_MAX_STALE = float(os.getenv("TOKEN_CACHE_MAX_STALE", "600"))     # oldest market data we will still serve
+TOKEN_CACHE_DB = os.getenv("TOKEN_CACHE_DB", "token_cache.sqlite3")          # empty string disables persistence
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of token snapshots keyed on (platform, address).
+
+    Metadata and market fields carry separate timestamps and TTLs. Once the
+    market fields pass market_ttl the entry is still served
+    (stale-while-revalidate) and a single background refresh of just the
+    market fields is started; past max_stale the caller waits for that
+    refresh. Only when the metadata passes meta_ttl, or the market refresh
+    cannot be done, is the whole payload fetched again. Entries are written
+    through to a SQLite file and reloaded on startup.
+    """
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE, meta_ttl=TOKEN_CACHE_META_TTL,
+                 market_ttl=TOKEN_CACHE_MARKET_TTL, max_stale=TOKEN_CACHE_MAX_STALE,
+                 db_path=TOKEN_CACHE_DB, encode=TokenSnapshot.to_dict, decode=TokenSnapshot.from_dict):
+        self.max_size = max_size
+        self.meta_ttl = meta_ttl
+        self.market_ttl = market_ttl
+        self.max_stale = max_stale
+        self.db_path = db_path
+        self.encode = encode            # value -> JSON-serialisable object for SQLite
+        self.decode = decode
+        self._entries = OrderedDict()   # (platform, address) -> (data, meta_ts, market_ts)
+        self._refreshing = {}           # (platform, address) -> background refresh task
+        self._db = None
+        self._lock = threading.Lock()   # one connection, used from worker threads
+        self._loaded = False
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0, "refreshes": 0,
+                      "market_refreshes": 0}
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def _connect(self):
+        if self._db is None and self.db_path:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(token_snapshots)")}
+            if "fetched_at" in columns:
+                # Single-timestamp layout; it is only a cache
+                self._db.execute("DROP TABLE token_snapshots")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS token_snapshots ("
+                " platform TEXT NOT NULL, address TEXT NOT NULL, data TEXT NOT NULL,"
+                " meta_ts REAL NOT NULL, market_ts REAL NOT NULL,"
+                " PRIMARY KEY (platform, address))"
+            )
+        return self._db
+
+    def load(self):
+        """
+        Warms the in-memory LRU from the SQLite file (most recent entries first).
+        Rows whose metadata expired are purged; stale market fields are kept and
+        refreshed on first use.
+        """
+        self._loaded = True
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return
+            db.execute("DELETE FROM token_snapshots WHERE meta_ts < ?", (time.time() - self.meta_ttl,))
+            db.commit()
+            rows = db.execute(
+                "SELECT platform, address, data, meta_ts, market_ts FROM token_snapshots"
+                " ORDER BY market_ts DESC LIMIT ?", (self.max_size,)
+            ).fetchall()
+        # Insert oldest first so the most recent rows end up at the MRU end.
+        for platform, address, data, meta_ts, market_ts in reversed(rows):
+            self._entries[(platform, address)] = (self.decode(json.loads(data)), meta_ts, market_ts)
+        print(f"Token cache loaded {len(rows)} entries from {self.db_path}")
+
+    def _write(self, key=None, entry=None, deleted=()):
+        """Writes one entry and removes evicted or invalidated ones, in a worker thread."""
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return
+            if key is not None:
+                data, meta_ts, market_ts = entry
+                db.execute(
+                    "INSERT OR REPLACE INTO token_snapshots (platform, address, data, meta_ts, market_ts)"
+                    " VALUES (?, ?, ?, ?, ?)", (key[0], key[1], json.dumps(self.encode(data)), meta_ts, market_ts)
+                )
+            db.executemany("DELETE FROM token_snapshots WHERE platform = ? AND address = ?", deleted)
+            db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # ------------------------------------------------------------------
+    # Cache operations
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _key(platform, address):
+        # EVM addresses are case-insensitive, base58 addresses are not.
+        if address.startswith("0x"):
+            address = address.lower()
+        return (platform, address)
+
+    def _put(self, key, data, meta_ts=None) -> tuple:
+        """
+        Stores an entry; meta_ts is kept from the previous entry after a market-only refresh.
+        Returns it and the keys evicted to make room.
+        """
+        now = time.time()
+        entry = (data, meta_ts or now, now)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        evicted = []
+        while len(self._entries) > self.max_size:
+            evicted.append(self._entries.popitem(last=False)[0])
+            self.stats["evictions"] += 1
+        return entry, evicted
+
+    async def _fetch_and_store(self, key, fetch):
+        data = await fetch(*key)
+        if data is None:
+            return None
+        entry, evicted = self._put(key, data)
+        await asyncio.to_thread(self._write, key, entry, evicted)
+        return data
+
+    async def _refresh_market(self, key, entry, fetch, fetch_market):
+        """Refreshes the market fields of an entry, falling back to a full fetch. Returns the data or None."""
+        data, meta_ts, _ = entry
+        if fetch_market is not None:
+            fresh = await fetch_market(*key, data)
+            if fresh is not None:
+                self.stats["market_refreshes"] += 1
+                entry, evicted = self._put(key, fresh, meta_ts)
+                await asyncio.to_thread(self._write, key, entry, evicted)
+                return fresh
+        return await self._fetch_and_store(key, fetch)
+
+    async def _refresh(self, key, entry, fetch, fetch_market):
+        try:
+            self.stats["refreshes"] += 1
+            await self._refresh_market(key, entry, fetch, fetch_market)
+        except Exception as e:
+            print(f"Token cache refresh failed for {key}: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get(self, platform: str, address: str, fetch, fetch_market=None):
+        """
+        Returns the cached payload for (platform, address), calling
+        `await fetch(platform, address)` on a miss.
+
+        Args:
+            platform (str): CoinGecko platform identifier.
+            address (str): Contract address.
+            fetch (coroutine function): Loader returning the value, or None on failure.
+            fetch_market (coroutine function): Optional `await fetch_market(platform, address, value)`
+                returning the value with fresh market fields, or None if it needs a full fetch.
+
+        Returns:
+            The cached value (a TokenSnapshot for the shared cache), or None if it is not cached and the fetch failed.
+        """
+        if not self._loaded:
+            await asyncio.to_thread(self.load)
+
+        key = self._key(platform, address)
+        entry = self._entries.get(key)
+        now = time.time()
+
+        if entry is not None and now - entry[1] < self.meta_ttl:
+            data, _, market_ts = entry
+            market_age = now - market_ts
+            if market_age < self.max_stale:
+                self._entries.move_to_end(key)
+                if market_age < self.market_ttl:
+                    self.stats["hits"] += 1
+                else:
+                    self.stats["stale_hits"] += 1
+                    if key not in self._refreshing:
+                        self._refreshing[key] = asyncio.create_task(self._refresh(key, entry, fetch, fetch_market))
+                return data
+            # Metadata still good, market data too old to serve: wait for the market fields only
+            self.stats["misses"] += 1
+            data = await self._refresh_market(key, entry, fetch, fetch_market)
+        else:
+            self.stats["misses"] += 1
+            data = await self._fetch_and_store(key, fetch)
+        if data is None and entry is not None:
+            # Upstream failed; an expired answer beats no answer at all.
+            return entry[0]
+        return data
+
+    async def invalidate(self, platform: str, address: str):
+        key = self._key(platform, address)
+        if self._entries.pop(key, None) is not None:
+            await asyncio.to_thread(self._write, deleted=[key])
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared cache used by coin_info
+token_cache = TokenCache()
@@ -0,0 +1,169 @@
+import copy
+import time
+
+# Query parameters for the CoinGecko coin/contract endpoints that switch off
+# the sections the analysis never reads. Tickers are off too: they are most of
+# the payload and only supply exchange names, so CoinGecko snapshots come
+# without an exchange list. Community data stays on (Twitter followers).
+COINGECKO_SLIM_PARAMS = {
+    "localization": "false",
+    "tickers": "false",
+    "developer_data": "false",
+    "sparkline": "false",
+}
+
+
+def _usd(section: dict, field: str):
+    value = section.get(field)
+    return value.get("usd") if isinstance(value, dict) else value
+
+
+class TokenSnapshot:
+    """
+    The subset of a CoinGecko coin document that the analysis actually uses.
+
+    Built straight from the API response with from_coingecko(); everything
+    else in the (large) payload is discarded. Values are USD / English.
+    DEX pair data maps into the same fields with from_dex_pairs(); fields a
+    source does not have stay None, and source names where the data came from.
+    """
+
+    __slots__ = (
+        "coin_id", "name", "symbol", "platform", "contract_address",
+        "price", "market_cap", "fully_diluted_valuation", "total_volume",
+        "high_24h", "low_24h", "ath", "ath_date", "ath_change_percentage", "atl",
+        "change_1h", "change_24h", "change_7d", "change_14d", "change_30d",
+        "change_60d", "change_200d", "change_1y",
+        "market_cap_rank", "market_cap_change_24h", "market_cap_fdv_ratio",
+        "circulating_supply", "total_supply",
+        "sentiment_up", "sentiment_down", "twitter_followers",
+        "description", "exchanges", "fetched_at",
+        "liquidity", "pair_created_at", "source",
+    )
+
+    def __init__(self, **fields):
+        for slot in self.__slots__:
+            setattr(self, slot, fields.get(slot))
+        if self.exchanges is None:
+            self.exchanges = ()
+        if self.fetched_at is None:
+            self.fetched_at = time.time()
+
+    @classmethod
+    def from_coingecko(cls, data: dict, contract_address: str = None):
+        """Builds a snapshot from a /coins/{id} or /coins/{platform}/contract/{address} response."""
+        market = data.get("market_data") or {}
+        community = data.get("community_data") or {}
+        description = data.get("description") or {}
+        if isinstance(description, dict):
+            description = description.get("en") or ""
+
+        # Unique exchange names, in CoinGecko's ticker order (none when tickers were switched off)
+        exchanges = []
+        for ticker in data.get("tickers") or ():
+            exchange = (ticker.get("market") or {}).get("name")
+            if exchange and exchange not in exchanges:
+                exchanges.append(exchange)
+
+        return cls(
+            coin_id=data.get("id"),
+            name=data.get("name"),
+            symbol=(data.get("symbol") or "").upper(),
+            platform=data.get("asset_platform_id"),
+            contract_address=contract_address or data.get("contract_address"),
+            price=_usd(market, "current_price"),
+            market_cap=_usd(market, "market_cap"),
+            fully_diluted_valuation=_usd(market, "fully_diluted_valuation"),
+            total_volume=_usd(market, "total_volume"),
+            high_24h=_usd(market, "high_24h"),
+            low_24h=_usd(market, "low_24h"),
+            ath=_usd(market, "ath"),
+            ath_date=_usd(market, "ath_date"),
+            ath_change_percentage=_usd(market, "ath_change_percentage"),
+            atl=_usd(market, "atl"),
+            change_1h=_usd(market, "price_change_percentage_1h_in_currency"),
+            change_24h=market.get("price_change_percentage_24h"),
+            change_7d=market.get("price_change_percentage_7d"),
+            change_14d=market.get("price_change_percentage_14d"),
+            change_30d=market.get("price_change_percentage_30d"),
+            change_60d=market.get("price_change_percentage_60d"),
+            change_200d=market.get("price_change_percentage_200d"),
+            change_1y=market.get("price_change_percentage_1y"),
+            market_cap_rank=data.get("market_cap_rank"),
+            market_cap_change_24h=market.get("market_cap_change_percentage_24h"),
+            market_cap_fdv_ratio=market.get("market_cap_fdv_ratio"),
+            circulating_supply=market.get("circulating_supply"),
+            total_supply=market.get("total_supply"),
+            sentiment_up=data.get("sentiment_votes_up_percentage"),
+            sentiment_down=data.get("sentiment_votes_down_percentage"),
+            twitter_followers=community.get("twitter_followers"),
+            description=description.strip(),
+            exchanges=tuple(exchanges),
+            source="coingecko",
+        )
+
+    @classmethod
+    def from_dex_pairs(cls, pairs: list, platform: str, contract_address: str):
+        """
+        Builds a snapshot from DexScreener-style pair objects whose base token is the contract.
+        The most liquid pair sets the price; volume and liquidity are summed over all pairs.
+        """
+        pairs = sorted(pairs, key=lambda pair: -((pair.get("liquidity") or {}).get("usd") or 0))
+        best = pairs[0]
+        base = best.get("baseToken") or {}
+        price_change = best.get("priceChange") or {}
+
+        def total(section, field):
+            values = [(pair.get(section) or {}).get(field) for pair in pairs]
+            values = [value for value in values if value is not None]
+            return sum(values) if values else None
+
+        def number(value):
+            return float(value) if value not in (None, "") else None
+
+        exchanges = []
+        for pair in pairs:
+            if pair.get("dexId") and pair["dexId"] not in exchanges:
+                exchanges.append(pair["dexId"])
+        market_cap, fdv = best.get("marketCap"), best.get("fdv")
+        created = best.get("pairCreatedAt")
+        return cls(
+            name=base.get("name"),
+            symbol=(base.get("symbol") or "").upper(),
+            platform=platform,
+            contract_address=contract_address,
+            price=number(best.get("priceUsd")),
+            market_cap=market_cap,
+            fully_diluted_valuation=fdv,
+            total_volume=total("volume", "h24"),
+            change_1h=price_change.get("h1"),
+            change_24h=price_change.get("h24"),
+            market_cap_fdv_ratio=round(market_cap / fdv, 4) if market_cap and fdv else None,
+            exchanges=tuple(exchanges),
+            liquidity=total("liquidity", "usd"),
+            pair_created_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(created / 1000)) if created else None,
+            source="dexscreener",
+        )
+
+    def with_market(self, **fields):
+        """A copy with fresh market fields; fields given as None keep this snapshot's value."""
+        snapshot = copy.copy(self)
+        for field, value in fields.items():
+            if value is not None:
+                setattr(snapshot, field, value)
+        snapshot.fetched_at = time.time()
+        return snapshot
+
+    def to_dict(self) -> dict:
+        fields = {slot: getattr(self, slot) for slot in self.__slots__}
+        fields["exchanges"] = list(self.exchanges)
+        return fields
+
+    @classmethod
+    def from_dict(cls, fields: dict):
+        snapshot = cls(**fields)
+        snapshot.exchanges = tuple(snapshot.exchanges)
+        return snapshot
+
+    def __repr__(self):
+        return f"TokenSnapshot({self.name!r}, {self.platform!r}, price={self.price!r})"
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+
+import aiohttp
+
+import http_pool
+from coingecko_gateway import TokenBucket
+from singleflight import SingleFlight
+
+TRADINGVIEW_SEARCH_URL = "https://symbol-search.tradingview.com/symbol_search/"
+# It can help to set a common browser User-Agent header.
+TRADINGVIEW_HEADERS = {"User-Agent": "Mozilla/5.0", "Origin": "https://www.tradingview.com"}
+
+# Resolver settings, overridable from the .env file
+TV_SYMBOL_CACHE_SIZE = int(os.getenv("TV_SYMBOL_CACHE_SIZE", "4096"))
+TV_SYMBOL_TTL = float(os.getenv("TV_SYMBOL_TTL", "604800"))                   # resolved symbols, 7 days
+TV_SYMBOL_NEGATIVE_TTL = float(os.getenv("TV_SYMBOL_NEGATIVE_TTL", "3600"))   # "no match" answers
+TV_SYMBOL_CACHE_DB = os.getenv("TV_SYMBOL_CACHE_DB", "tradingview_symbols.sqlite3")  # empty disables persistence
+TV_SYMBOL_RATE_PER_SECOND = float(os.getenv("TV_SYMBOL_RATE_PER_SECOND", "5"))
+TV_SYMBOL_BURST = int(os.getenv("TV_SYMBOL_BURST", "5"))
+TV_SYMBOL_TIMEOUT = float(os.getenv("TV_SYMBOL_TIMEOUT", "5"))
+
+# Quote currencies in order of preference for chart pairs
+PREFERRED_QUOTES = ("USDT", "USD", "USDC")
+
+_HIGHLIGHT_TAGS = re.compile(r"</?em>")
+
+
+def _clean(result: dict) -> dict:
+    """Strips the <em> search highlighting TradingView wraps around matched text."""
+    return {key: _HIGHLIGHT_TAGS.sub("", value) if isinstance(value, str) else value
+            for key, value in result.items()}
+
+
+def rank_symbols(results: list, query: str, exchange: str = None) -> list:
+    """
+    Orders symbol search results best first, deterministically.
+
+    Preference, most important first: the requested exchange, the queried
+    ticker itself (not a longer ticker that merely contains it), a USDT/USD/USDC
+    quote, spot over derivatives. Ties keep TradingView's relevance order.
+
+    Args:
+        results (list): Cleaned symbol_search results.
+        query (str): The searched ticker, e.g. "PEPE".
+        exchange (str): Preferred exchange, e.g. "BINANCE".
+    """
+    query = query.upper()
+    exchange = (exchange or "").upper()
+
+    def score(item):
+        position, result = item
+        symbol = (result.get("symbol") or "").upper()
+        quote = next((q for q in PREFERRED_QUOTES if symbol == query + q), None)
+        derivative = (result.get("type") in ("futures", "swap")) or symbol.endswith(".P")
+        return (
+            0 if exchange and (result.get("exchange") or "").upper() == exchange else 1,
+            0 if quote or symbol == query else 1,
+            PREFERRED_QUOTES.index(quote) if quote else len(PREFERRED_QUOTES),
+            1 if derivative else 0,
+            position,
+        )
+
+    return [result for _, result in sorted(enumerate(results), key=score)]
+
+
+class TradingViewSymbolResolver:
+    """
+    Resolves tickers to TradingView symbols.
+
+    Answers, including "no match", are cached in memory and in SQLite
+    (misses for a shorter time). Lookups go through the shared HTTP pool
+    with a timeout, are paced by a token bucket, and concurrent lookups of
+    the same query share one request.
+    """
+
+    def __init__(self, max_size=TV_SYMBOL_CACHE_SIZE, ttl=TV_SYMBOL_TTL, negative_ttl=TV_SYMBOL_NEGATIVE_TTL,
+                 db_path=TV_SYMBOL_CACHE_DB, rate_per_second=TV_SYMBOL_RATE_PER_SECOND, burst=TV_SYMBOL_BURST,
+                 timeout=TV_SYMBOL_TIMEOUT):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.db_path = db_path
+        self.timeout = timeout
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._flights = SingleFlight()
+        self._entries = OrderedDict()   # (query, exchange, asset_type) -> (result or None, expires_at)
+        self._db = None
+        self._loaded = False
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "requests": 0, "errors": 0}
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def _connect(self):
+        if self._db is None and self.db_path:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tradingview_symbols ("
+                " query TEXT NOT NULL, exchange TEXT NOT NULL, asset_type TEXT NOT NULL,"
+                " result TEXT, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (query, exchange, asset_type))"
+            )
+        return self._db
+
+    def load(self):
+        self._loaded = True
+        db = self._connect()
+        if db is None:
+            return
+        db.execute("DELETE FROM tradingview_symbols WHERE expires_at < ?", (time.time(),))
+        db.commit()
+        rows = db.execute(
+            "SELECT query, exchange, asset_type, result, expires_at FROM tradingview_symbols"
+            " ORDER BY expires_at LIMIT ?", (self.max_size,)).fetchall()
+        for query, exchange, asset_type, result, expires_at in rows:
+            self._entries[(query, exchange, asset_type)] = (json.loads(result) if result else None, expires_at)
+
+    def _persist(self, key, entry):
+        db = self._connect()
+        if db is None:
+            return
+        result, expires_at = entry
+        db.execute(
+            "INSERT OR REPLACE INTO tradingview_symbols (query, exchange, asset_type, result, expires_at)"
+            " VALUES (?, ?, ?, ?, ?)", key + (json.dumps(result) if result else None, expires_at))
+        db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    async def _search(self, query, exchange, asset_type, lang):
+        """One symbol_search request. Returns the cleaned results, or None if the request failed."""
+        params = {"text": query, "exchange": exchange or "", "lang": lang, "type": asset_type}
+        await self._bucket.acquire()
+        self.stats["requests"] += 1
+        try:
+            status, data, _ = await http_pool.request_json(
+                TRADINGVIEW_SEARCH_URL, params=params, headers=TRADINGVIEW_HEADERS, timeout=self.timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            print(f"TradingView symbol search for {query} failed: {e!r}")
+            self.stats["errors"] += 1
+            return None
+        if status != 200 or not isinstance(data, list):
+            print(f"TradingView symbol search for {query} failed with status code {status}")
+            self.stats["errors"] += 1
+            return None
+        return [_clean(result) for result in data if isinstance(result, dict)]
+
+    async def _lookup(self, key, lang):
+        query, exchange, asset_type = key
+        results = await self._search(query, exchange, asset_type, lang)
+        if results is not None and not results and exchange:
+            # Nothing on the requested exchange - fall back to every exchange.
+            results = await self._search(query, "", asset_type, lang)
+        if results is None:
+            return None     # request failed: not cached, the next call tries again
+
+        ranked = rank_symbols(results, query, exchange)
+        result = ranked[0] if ranked else None
+        if result is None:
+            print("No matching symbols found for query:", query)
+        entry = (result, time.time() + (self.ttl if result else self.negative_ttl))
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        await asyncio.to_thread(self._persist, key, entry)
+        return result
+
+    async def resolve(self, query: str, exchange: str = "BINANCE", asset_type: str = "crypto", lang: str = "en"):
+        """
+        Returns the best matching TradingView symbol for a ticker.
+
+        Args:
+            query (str): The search term (e.g., "PEPE", "BTC").
+            exchange (str): The preferred exchange (default is 'BINANCE').
+            asset_type (str): The asset type (default is 'crypto').
+            lang (str): The language for the results (default is 'en').
+
+        Returns:
+            dict or None: The best match's details (symbol, exchange, description, type, ...), or None.
+        """
+        if not self._loaded:
+            await asyncio.to_thread(self.load)
+
+        key = (query.strip().upper(), (exchange or "").upper(), asset_type)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.time():
+            self._entries.move_to_end(key)
+            self.stats["hits" if entry[0] else "negative_hits"] += 1
+            return entry[0]
+
+        self.stats["misses"] += 1
+        return await self._flights.do(key, lambda: self._lookup(key, lang))
+
+    async def resolve_many(self, queries, exchange: str = "BINANCE", asset_type: str = "crypto",
+                           lang: str = "en") -> dict:
+        """
+        Resolves several tickers concurrently; requests are still paced by the rate limit.
+
+        Returns:
+            dict: query -> symbol details, or None for tickers without a match.
+        """
+        queries = list(dict.fromkeys(queries))
+        results = await asyncio.gather(*(self.resolve(query, exchange, asset_type, lang) for query in queries))
+        return dict(zip(queries, results))
+
+
+# Shared resolver used by get_charts
+symbol_resolver = TradingViewSymbolResolver()
@@ -0,0 +1,284 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from coingecko_gateway import gateway, PRIORITY_LOW
+from metrics import metrics
+
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+
+# Watchlist settings, overridable from the .env file
+WATCHLIST_POLL_SECONDS = float(os.getenv("WATCHLIST_POLL_SECONDS", "60"))      # 0 disables polling
+WATCHLIST_BATCH_SIZE = int(os.getenv("WATCHLIST_BATCH_SIZE", "100"))           # addresses per token_price request
+WATCHLIST_MAX_TOKENS = int(os.getenv("WATCHLIST_MAX_TOKENS", "2000"))
+WATCHLIST_MAX_AGE = float(os.getenv("WATCHLIST_MAX_AGE", "604800"))            # seconds a call is followed, 7 days
+WATCHLIST_HISTORY = int(os.getenv("WATCHLIST_HISTORY", "2880"))                # price points kept per token
+# Percent moves from the call price that raise an alert, each once per token
+WATCHLIST_ALERT_MOVES = tuple(float(move) for move in
+                              os.getenv("WATCHLIST_ALERT_MOVES", "-50,-25,25,50,100,200").split(",") if move.strip())
+
+
+class PriceSeries:
+    """
+    Bounded ring buffer of (unix time, USD price) points.
+
+    Stored as uint32 seconds + float32 prices, 8 bytes a point; the arrays
+    grow by doubling up to capacity, then the oldest points are overwritten.
+    """
+
+    __slots__ = ("times", "prices", "capacity", "size", "head")
+
+    def __init__(self, capacity: int = WATCHLIST_HISTORY, initial: int = 32):
+        self.capacity = max(1, capacity)
+        initial = min(initial, self.capacity)
+        self.times = np.zeros(initial, dtype=np.uint32)
+        self.prices = np.zeros(initial, dtype=np.float32)
+        self.size = 0
+        self.head = 0       # next slot to write
+
+    def __len__(self):
+        return self.size
+
+    def append(self, timestamp: float, price: float):
+        if self.size == len(self.times) < self.capacity:
+            grown = min(self.capacity, 2 * len(self.times))
+            self.times = np.resize(self.times, grown)
+            self.prices = np.resize(self.prices, grown)
+            self.head = self.size
+        self.times[self.head] = int(timestamp)
+        self.prices[self.head] = price
+        self.head = (self.head + 1) % len(self.times)
+        self.size = min(self.size + 1, len(self.times))
+
+    def last_time(self) -> int:
+        return int(self.times[self.head - 1]) if self.size else 0
+
+    def view(self) -> tuple:
+        """Returns (times, prices) oldest first, as copies."""
+        if self.size < len(self.times):
+            return self.times[:self.size].copy(), self.prices[:self.size].copy()
+        order = np.r_[self.head:len(self.times), 0:self.head]
+        return self.times[order], self.prices[order]
+
+
+class WatchedToken:
+    __slots__ = ("platform", "address", "symbol", "name", "call_price", "called_at", "series", "change_24h",
+                 "above", "below", "fired")
+
+    def __init__(self, platform, address, symbol, name, call_price, above=None, below=None,
+                 history=WATCHLIST_HISTORY):
+        self.platform = platform
+        self.address = address
+        self.symbol = symbol
+        self.name = name
+        self.call_price = call_price
+        self.called_at = time.time()
+        self.series = PriceSeries(history)
+        self.change_24h = None
+        self.above = above          # absolute USD thresholds, each alerting once
+        self.below = below
+        self.fired = set()          # alert levels already sent
+
+
+class Watchlist:
+    """
+    Follows the price of every called contract after its analysis.
+
+    Tokens are grouped by platform and refreshed with CoinGecko's
+    /simple/token_price/{platform} endpoint, up to batch_size addresses
+    per request, so a poll costs about one request per platform however
+    many tokens are watched. Requests go through the gateway at low
+    priority, behind live analyses. Crossing a percent move from the call
+    price, or an absolute threshold, sends one alert per level through
+    on_alert.
+    """
+
+    def __init__(self, batch_size=WATCHLIST_BATCH_SIZE, max_tokens=WATCHLIST_MAX_TOKENS, max_age=WATCHLIST_MAX_AGE,
+                 history=WATCHLIST_HISTORY, alert_moves=WATCHLIST_ALERT_MOVES):
+        self.batch_size = max(1, batch_size)
+        self.max_tokens = max_tokens
+        self.max_age = max_age
+        self.history = history
+        self.alert_moves = tuple(sorted(alert_moves))
+        self.on_alert = None            # coroutine function on_alert(text), e.g. a Telegram send
+        self.on_prices = None           # on_prices([(platform, address, price, unix time), ...]) after each poll
+        self._tokens = OrderedDict()    # (platform, address key) -> WatchedToken, oldest call first
+        self._poll_task = None
+        self.stats = {"polls": 0, "requests": 0, "errors": 0, "points": 0, "alerts": 0}
+
+    @staticmethod
+    def _key(platform, address):
+        # EVM addresses are case-insensitive and come back lowercased; base58 ones are not
+        return platform, address.lower() if address.startswith("0x") else address
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def watch(self, snapshot, above: float = None, below: float = None):
+        """
+        Starts (or restarts) following a token.
+
+        Args:
+            snapshot (TokenSnapshot): The token as analysed; its price is the call price.
+            above (float): Optional USD price that triggers an alert when reached.
+            below (float): Optional USD price that triggers an alert when reached.
+        """
+        if not snapshot.platform or not snapshot.contract_address or not snapshot.price:
+            return
+        key = self._key(snapshot.platform, snapshot.contract_address)
+        token = self._tokens.pop(key, None)
+        if token is None:
+            token = WatchedToken(snapshot.platform, snapshot.contract_address, snapshot.symbol, snapshot.name,
+                                 snapshot.price, above, below, self.history)
+        else:
+            # Called again: alerts are measured from the new call
+            token.call_price, token.called_at, token.fired = snapshot.price, time.time(), set()
+            token.above, token.below = above or token.above, below or token.below
+        token.series.append(snapshot.fetched_at, snapshot.price)
+        self._tokens[key] = token
+        while len(self._tokens) > self.max_tokens:
+            self._tokens.popitem(last=False)
+
+    def unwatch(self, platform: str, address: str):
+        self._tokens.pop(self._key(platform, address), None)
+
+    def series(self, platform: str, address: str):
+        """Returns (times, prices) for a watched token, or None."""
+        token = self._tokens.get(self._key(platform, address))
+        return token.series.view() if token else None
+
+    # ------------------------------------------------------------------
+    # Polling
+    # ------------------------------------------------------------------
+    def _expire(self, now):
+        while self._tokens:
+            key, token = next(iter(self._tokens.items()))
+            if now - token.called_at < self.max_age:
+                break
+            del self._tokens[key]
+
+    def _batches(self):
+        """(platform, [WatchedToken, ...]) groups of at most batch_size."""
+        by_platform = {}
+        for token in self._tokens.values():
+            by_platform.setdefault(token.platform, []).append(token)
+        for platform, tokens in by_platform.items():
+            for start in range(0, len(tokens), self.batch_size):
+                yield platform, tokens[start:start + self.batch_size]
+
+    async def _fetch_batch(self, platform, tokens):
+        """One token_price request. Returns {address key: price data}, or None if the request failed."""
+        params = {
+            "contract_addresses": ",".join(token.address for token in tokens),
+            "vs_currencies": "usd",
+            "include_24hr_change": "true",
+            "include_last_updated_at": "true",
+        }
+        self.stats["requests"] += 1
+        try:
+            with metrics.stage("watchlist_fetch"):
+                status, data, _ = await gateway.get_json(
+                    f"{COINGECKO_API_URL}/simple/token_price/{platform}", params=params, priority=PRIORITY_LOW)
+        except Exception as e:
+            print(f"Watchlist price request for {platform} failed: {e!r}")
+            self.stats["errors"] += 1
+            return None
+        if status != 200 or not isinstance(data, dict):
+            print(f"Watchlist price request for {platform} failed with status code {status}")
+            self.stats["errors"] += 1
+            return None
+        return {self._key(platform, address)[1]: quote for address, quote in data.items()}
+
+    async def poll(self) -> int:
+        """
+        Refreshes every watched token once and sends any alerts.
+
+        Returns:
+            int: The number of tokens that got a new price point.
+        """
+        now = time.time()
+        self._expire(now)
+        self.stats["polls"] += 1
+        batches = list(self._batches())
+        results = await asyncio.gather(*(self._fetch_batch(platform, tokens) for platform, tokens in batches))
+
+        updated, alerts, prices = 0, [], []
+        for (platform, tokens), quotes in zip(batches, results):
+            if not quotes:
+                continue
+            for token in tokens:
+                quote = quotes.get(self._key(platform, token.address)[1])
+                price = quote.get("usd") if isinstance(quote, dict) else None
+                if not price:
+                    continue
+                timestamp = quote.get("last_updated_at") or now
+                if timestamp <= token.series.last_time():
+                    continue    # CoinGecko has not repriced it since the last poll
+                token.series.append(timestamp, price)
+                token.change_24h = quote.get("usd_24h_change")
+                prices.append((platform, token.address, price, timestamp))
+                updated += 1
+                alerts += self._check_alerts(token, price)
+        self.stats["points"] += updated
+        if prices and self.on_prices is not None:
+            self.on_prices(prices)
+
+        for text in alerts:
+            self.stats["alerts"] += 1
+            metrics.event("watchlist_alert")
+            if self.on_alert is not None:
+                try:
+                    await self.on_alert(text)
+                except Exception as e:
+                    print(f"Watchlist alert could not be sent: {e}")
+        return updated
+
+    def _check_alerts(self, token, price) -> list:
+        move = (price / token.call_price - 1) * 100
+        crossed = [level for level in self.alert_moves
+                   if level not in token.fired and (move >= level > 0 or move <= level < 0)]
+        token.fired.update(crossed)
+        reasons = []
+        if crossed:
+            # Only the furthest level matters when several are crossed in one poll
+            reasons.append(f"{max(crossed, key=abs):+g}% since the call")
+        for name, threshold, reached in (("above", token.above, token.above and price >= token.above),
+                                         ("below", token.below, token.below and price <= token.below)):
+            if reached and name not in token.fired:
+                token.fired.add(name)
+                reasons.append(f"{name} ${threshold:.8g}")
+        if not reasons:
+            return []
+        icon = "📈" if move >= 0 else "📉"
+        change = f", 24h {token.change_24h:+.1f}%" if token.change_24h is not None else ""
+        return [f"{icon} {token.name} ({token.symbol}) {', '.join(reasons)}: ${token.call_price:.8g} → "
+                f"${price:.8g} ({move:+.1f}%{change})\n{token.platform}: {token.address}"]
+
+    async def _poll_loop(self, interval):
+        while True:
+            started = time.monotonic()
+            if self._tokens:
+                await self.poll()
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def start_polling(self, interval=WATCHLIST_POLL_SECONDS):
+        """Schedules periodic polls on the running event loop. An interval of 0 disables them."""
+        if interval > 0 and (self._poll_task is None or self._poll_task.done()):
+            self._poll_task = asyncio.create_task(self._poll_loop(interval))
+        return self._poll_task
+
+    def stop_polling(self):
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    def snapshot(self) -> dict:
+        platforms = {token.platform for token in self._tokens.values()}
+        return dict(self.stats, tokens=len(self._tokens), platforms=len(platforms))
+
+
+# Shared watchlist fed by gpt_actions and polled by crypto_bot_handler
+watchlist = Watchlist()
@@ -0,0 +1,482 @@
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from multiprocessing.managers import BaseManager
+
+from dotenv import load_dotenv
+
+from metrics import metrics, correlation_id
+from token_snapshot import TokenSnapshot
+
+# Remote workers (python -m worker_pool) read the same .env file as the bot
+load_dotenv()
+
+# Worker pool settings, overridable from the .env file
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "0"))              # worker processes (shards); 0 = analyse in-process
+WORKER_BACKEND = os.getenv("WORKER_BACKEND", "multiprocessing")         # multiprocessing | broker
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))          # analyses in flight per worker process
+WORKER_JOB_TIMEOUT = float(os.getenv("WORKER_JOB_TIMEOUT", "300"))      # seconds without news from a job before it fails
+WORKER_BROKER_ADDRESS = os.getenv("WORKER_BROKER_ADDRESS", "127.0.0.1:50055")
+WORKER_BROKER_AUTHKEY = os.getenv("WORKER_BROKER_AUTHKEY", "")          # required for workers on other nodes
+WORKER_SPAWN_LOCAL = os.getenv("WORKER_SPAWN_LOCAL", "true").lower() in ("1", "true", "yes")
+
+BACKENDS = ("multiprocessing", "broker")
+
+# Minimum seconds between starts of one worker, so a crashing worker is not restarted in a tight loop
+_RESTART_INTERVAL = 5.0
+
+# Default token_info of analyze(): the worker resolves the token itself
+_UNRESOLVED = object()
+
+# Seconds between metrics batches from a worker; a job's own records are also sent before its end
+_METRICS_FLUSH_INTERVAL = 1.0
+
+
+class WorkerError(Exception):
+    """An analysis failed (or went silent) in a worker process."""
+
+
+def _parse_address(address: str) -> tuple:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+# -----------------------------------------------------------------------------
+# Broker: job and result queues served over TCP by the ingester, so workers
+# can run on other machines (python -m worker_pool --connect HOST:PORT --shard N).
+# -----------------------------------------------------------------------------
+class _BrokerClient(BaseManager):
+    pass
+
+
+_BrokerClient.register("jobs")
+_BrokerClient.register("results")
+
+
+def _serve_broker(address, authkey, job_queues, results):
+    class _Broker(BaseManager):
+        pass
+
+    _Broker.register("jobs", callable=lambda shard: job_queues[shard])
+    _Broker.register("results", callable=lambda: results)
+    server = _Broker(address=address, authkey=authkey).get_server()
+    threading.Thread(target=server.serve_forever, name="worker-broker", daemon=True).start()
+    return server
+
+
+def _connect_broker(address, authkey, shard) -> tuple:
+    broker = _BrokerClient(address=address, authkey=authkey)
+    broker.connect()
+    return broker.jobs(shard), broker.results()
+
+
+def share_rate_limits(share: float):
+    """
+    Scales this process' CoinGecko and DexScreener rate limits to `share` of
+    the configured ones. Every worker process has its own gateway, so the
+    ingester and the workers each take an equal share to stay within the
+    API limit together.
+    """
+    from coingecko_gateway import gateway
+    from market_data import market_data
+
+    gateway.bucket.scale(share)
+    for provider in market_data.providers:
+        bucket = getattr(provider, "bucket", None)
+        if bucket is not None:
+            bucket.scale(share)
+
+
+# -----------------------------------------------------------------------------
+# Worker process side
+# -----------------------------------------------------------------------------
+def _flush_metrics(results):
+    """Sends the stage timings and events recorded in this worker to the ingester's registry."""
+    records = metrics.take_captured()
+    if records:
+        results.put(("metrics", None, records))
+
+
+async def _flush_metrics_periodically(results):
+    while True:
+        await asyncio.sleep(_METRICS_FLUSH_INTERVAL)
+        _flush_metrics(results)
+
+
+async def _run_job(job, results, slots):
+    import gpt_actions
+
+    job_id, message, mode, job_correlation_id, resolved, token, detections = job
+    correlation_id.set(job_correlation_id)
+    try:
+        if resolved:
+            token_info = TokenSnapshot.from_dict(token) if token is not None else None
+        else:
+            token_info = await gpt_actions.resolve_token_info(message, detections)
+        results.put(("token", job_id, token_info.to_dict() if token_info is not None else None))
+        if mode == "resolve":
+            text = None
+        elif mode == "stream":
+            async for chunk in gpt_actions.analyze_token_stream(message, token_info):
+                results.put(("chunk", job_id, chunk))
+            text = None
+        else:
+            text = await gpt_actions.analyze_token(message, token_info)
+        _flush_metrics(results)     # merged before the job ends, so its stages are in place when it does
+        results.put(("done", job_id, text))
+    except Exception as e:
+        _flush_metrics(results)
+        results.put(("error", job_id, f"{type(e).__name__}: {e}"))
+    finally:
+        slots.release()
+
+
+async def _serve_jobs(shard, jobs, results, concurrency, rate_share):
+    # Imported in the worker only: each process keeps its own token, analysis and indicator caches
+    import http_pool
+    from llm_client import llm_client
+
+    share_rate_limits(rate_share)
+    metrics.capture()       # stage timings go to the ingester's registry
+    flusher = asyncio.create_task(_flush_metrics_periodically(results))
+    print(f"Analysis worker {shard} started (pid {os.getpid()}, {rate_share:.0%} of the API rate limits)")
+    slots = asyncio.Semaphore(max(1, concurrency))
+    running = set()
+    while True:
+        await slots.acquire()
+        job = await asyncio.to_thread(jobs.get)
+        if job is None:
+            break
+        task = asyncio.create_task(_run_job(job, results, slots))
+        running.add(task)
+        task.add_done_callback(running.discard)
+    await asyncio.gather(*running)
+    flusher.cancel()
+    _flush_metrics(results)
+    await llm_client.close()
+    await http_pool.close_session()
+
+
+def run_worker(shard, jobs=None, results=None, concurrency=WORKER_CONCURRENCY, address=None, authkey=None,
+               rate_share=1.0):
+    """
+    Worker process entry point: runs analyses from its shard's job queue until it receives None.
+
+    Args:
+        shard (int): The shard this worker serves.
+        jobs, results: The queues to use (multiprocessing backend), or None to get them from the broker.
+        concurrency (int): Analyses run at the same time.
+        address (tuple): Broker (host, port), for the broker backend.
+        authkey (bytes): Broker authentication key.
+        rate_share (float): This process' share of the CoinGecko/DexScreener rate limits.
+    """
+    if jobs is None:
+        jobs, results = _connect_broker(address, authkey, shard)
+    try:
+        asyncio.run(_serve_jobs(shard, jobs, results, concurrency, rate_share))
+    except KeyboardInterrupt:
+        pass
+
+
+# -----------------------------------------------------------------------------
+# Ingester side
+# -----------------------------------------------------------------------------
+class RemoteAnalysis:
+    """
+    One analysis running in a worker process. Iterating it yields the
+    analysis text as it arrives; token_info is set once the worker has
+    resolved the token.
+    """
+
+    def __init__(self, job_id, shard, timeout, registry):
+        self.job_id = job_id
+        self.shard = shard
+        self.timeout = timeout
+        self._registry = registry   # the pool's in-flight jobs, left when the job ends
+        self.token_info = None
+        self.events = asyncio.Queue()
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        try:
+            while True:
+                try:
+                    kind, value = await asyncio.wait_for(self.events.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    raise WorkerError(f"No news from worker {self.shard} for {self.timeout:.0f}s") from None
+                if kind == "token":
+                    self.token_info = TokenSnapshot.from_dict(value) if value is not None else None
+                elif kind == "chunk":
+                    yield value
+                elif kind == "done":
+                    if value is not None:
+                        yield value
+                    return
+                else:
+                    raise WorkerError(value)
+        finally:
+            self._registry.pop(self.job_id, None)
+
+
+class WorkerPool:
+    """
+    Runs analyses in a pool of worker processes while this process - the
+    ingester - keeps the Telegram session and only receives and sends.
+
+    Work is sharded by key (the contract address), so repeat calls of a
+    token always land in the same worker and find its token, indicator and
+    analysis caches hot. Each worker runs several analyses concurrently and
+    streams its results back over one shared result queue.
+
+    Backends:
+      - multiprocessing:  local worker processes fed through multiprocessing queues
+      - broker:           the queues are served over TCP, so workers can also run
+                          on other nodes (python -m worker_pool --connect HOST:PORT --shard N)
+
+    Local worker processes that die are restarted; their jobs fail with WorkerError.
+    Stage timings and events recorded in the workers come back over the
+    result queue and are merged into this process' metrics registry.
+    The ingester and every worker get an equal share of the CoinGecko and
+    DexScreener rate limits, as each process has its own rate limiter.
+    """
+
+    def __init__(self, workers=ANALYSIS_WORKERS, backend=WORKER_BACKEND, concurrency=WORKER_CONCURRENCY,
+                 job_timeout=WORKER_JOB_TIMEOUT, address=WORKER_BROKER_ADDRESS, authkey=WORKER_BROKER_AUTHKEY,
+                 spawn_local=WORKER_SPAWN_LOCAL):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown worker backend {backend!r}, expected one of {BACKENDS}")
+        self.workers = max(0, workers)
+        self.backend = backend
+        self.concurrency = concurrency
+        self.job_timeout = job_timeout
+        self.address = _parse_address(address)
+        self.authkey = authkey.encode() if authkey else os.urandom(16)
+        self.spawn_local = spawn_local or backend == "multiprocessing"
+        self._context = multiprocessing.get_context("spawn")
+        self._job_queues = []
+        self._results = None
+        self._processes = []
+        self._started_at = []           # monotonic start time per local process
+        self._server = None
+        self._jobs = {}                 # job id -> RemoteAnalysis
+        self._job_ids = itertools.count()
+        self._loop = None
+        self._reader = None
+        self._watchdog = None
+        self.stats = {"jobs": 0, "errors": 0, "restarts": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    @property
+    def rate_share(self) -> float:
+        """Share of the API rate limits per process: the ingester and each worker."""
+        return 1.0 / (self.workers + 1)
+
+    def shard_for(self, key) -> int:
+        """Stable shard of a key; the same contract always maps to the same worker."""
+        return zlib.crc32(str(key).encode()) % self.workers
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def _spawn(self, shard):
+        if self.backend == "broker":
+            kwargs = {"concurrency": self.concurrency, "address": self.address, "authkey": self.authkey,
+                      "rate_share": self.rate_share}
+            args = (shard,)
+        else:
+            kwargs = {"concurrency": self.concurrency, "rate_share": self.rate_share}
+            args = (shard, self._job_queues[shard], self._results)
+        process = self._context.Process(target=run_worker, args=args, kwargs=kwargs,
+                                        name=f"analysis-worker-{shard}", daemon=True)
+        process.start()
+        self._started_at[shard] = time.monotonic()
+        return process
+
+    async def start(self):
+        if not self.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        share_rate_limits(self.rate_share)
+        if self.backend == "broker":
+            self._job_queues = [queue.Queue() for _ in range(self.workers)]
+            self._results = queue.Queue()
+            self._server = _serve_broker(self.address, self.authkey, self._job_queues, self._results)
+            print(f"Worker broker listening on {self.address[0]}:{self.address[1]}")
+        else:
+            self._job_queues = [self._context.Queue() for _ in range(self.workers)]
+            self._results = self._context.Queue()
+        if self.spawn_local:
+            self._started_at = [0.0] * self.workers
+            self._processes = [self._spawn(shard) for shard in range(self.workers)]
+            self._watchdog = asyncio.create_task(self._watch())
+        self._reader = threading.Thread(target=self._read_results, name="worker-results", daemon=True)
+        self._reader.start()
+        print(f"Worker pool started - {self.workers} shard(s), {self.backend} backend")
+
+    async def stop(self):
+        if not self.enabled or self._results is None:
+            return
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+        for jobs in self._job_queues:
+            jobs.put(None)
+        for process in self._processes:
+            await asyncio.to_thread(process.join, 10)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)     # wakes the reader thread
+        await asyncio.to_thread(self._reader.join, 5)
+        if self._server is not None:
+            self._server.stop_event.set()
+        self._processes, self._results = [], None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(1)
+            for shard, process in enumerate(self._processes):
+                if process.is_alive():
+                    continue
+                for job in [job for job in self._jobs.values() if job.shard == shard]:
+                    self._jobs.pop(job.job_id)
+                    self.stats["errors"] += 1
+                    job.events.put_nowait(("error", f"worker {shard} exited"))
+                if time.monotonic() - self._started_at[shard] < _RESTART_INTERVAL:
+                    continue    # new jobs wait in the shard's queue meanwhile
+                print(f"Analysis worker {shard} exited with code {process.exitcode}; restarting")
+                self.stats["restarts"] += 1
+                self._processes[shard] = self._spawn(shard)
+
+    # ------------------------------------------------------------------
+    # Results
+    # ------------------------------------------------------------------
+    def _read_results(self):
+        while True:
+            try:
+                event = self._results.get()
+            except (EOFError, OSError):
+                return
+            if event is None:
+                return
+            self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event):
+        kind, job_id, value = event
+        if kind == "metrics":
+            metrics.merge(value)    # stage timings and events recorded in a worker
+            return
+        job = self._jobs.get(job_id)
+        if job is None:
+            return      # failed or timed out already
+        if kind == "error":
+            self.stats["errors"] += 1
+        if kind in ("done", "error"):
+            self._jobs.pop(job_id)      # even if nobody ever reads the job's events
+        job.events.put_nowait((kind, value))
+
+    # ------------------------------------------------------------------
+    # Submitting work
+    # ------------------------------------------------------------------
+    def _submit(self, message: str, key, mode: str, token_info, detections) -> RemoteAnalysis:
+        job_id = next(self._job_ids)
+        shard = self.shard_for(key if key is not None else message)
+        job = RemoteAnalysis(job_id, shard, self.job_timeout, self._jobs)
+        self._jobs[job_id] = job
+        self.stats["jobs"] += 1
+        metrics.event("worker_job", shard=str(shard))
+        resolved = token_info is not _UNRESOLVED
+        token = token_info.to_dict() if resolved and token_info is not None else None
+        self._job_queues[shard].put((job_id, message, mode, correlation_id.get(), resolved, token, detections))
+        return job
+
+    async def resolve(self, message: str, key=None, detections=None):
+        """
+        Resolves a call message's token in the worker owning `key`, without analysing it.
+        Pass the message's Detections when its addresses were already detected.
+
+        Returns:
+            TokenSnapshot: The token's market data, or None if no token was found.
+
+        Raises:
+            WorkerError: If resolving failed in the worker.
+        """
+        job = self._submit(message, key, "resolve", _UNRESOLVED, detections)
+        with metrics.stage("worker_resolve"):
+            async for _ in job:
+                pass
+        return job.token_info
+
+    async def analyze(self, message: str, key=None, token_info=_UNRESOLVED, detections=None) -> tuple:
+        """
+        Resolves and analyses a call message in the worker owning `key`.
+        Pass token_info (a TokenSnapshot, or None for no data) when the token
+        is already resolved, and the worker only runs the analysis; otherwise
+        pass the message's Detections, if known, so the worker does not detect again.
+
+        Returns:
+            tuple: (TokenSnapshot or None, analysis text).
+
+        Raises:
+            WorkerError: If the analysis failed in the worker.
+        """
+        job = self._submit(message, key, "complete", token_info, detections)
+        with metrics.stage("worker_analysis", mode="complete"):
+            text = "".join([chunk async for chunk in job])
+        return job.token_info, text
+
+    def analyze_stream(self, message: str, key=None, token_info=_UNRESOLVED, detections=None) -> RemoteAnalysis:
+        """
+        Like analyze(), but streamed: iterate the returned RemoteAnalysis for the
+        text chunks; its token_info is set once the token is resolved.
+        """
+        return self._submit(message, key, "stream", token_info, detections)
+
+    def in_flight(self) -> int:
+        return len(self._jobs)
+
+    def snapshot(self) -> dict:
+        shards = [0] * self.workers
+        for job in self._jobs.values():
+            shards[job.shard] += 1
+        alive = sum(process.is_alive() for process in self._processes)
+        return dict(self.stats, in_flight=len(self._jobs), per_shard=shards, local_processes=alive)
+
+
+# Shared pool used by crypto_bot_handler
+worker_pool = WorkerPool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs an analysis worker against a remote worker broker.")
+    parser.add_argument("--connect", default=WORKER_BROKER_ADDRESS, metavar="HOST:PORT")
+    parser.add_argument("--shard", type=int, required=True)
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    parser.add_argument("--authkey", default=WORKER_BROKER_AUTHKEY)
+    parser.add_argument("--workers", type=int, default=ANALYSIS_WORKERS,
+                        help="total shards of the pool; the API rate limits are split across them and the bot")
+    args = parser.parse_args()
+    if not args.authkey:
+        parser.error("--authkey (or WORKER_BROKER_AUTHKEY) must match the bot's")
+    while True:
+        try:
+            run_worker(args.shard, concurrency=args.concurrency, address=_parse_address(args.connect),
+                       authkey=args.authkey.encode(), rate_share=1.0 / (max(args.workers, 1) + 1))
+            return
+        except (ConnectionError, EOFError) as e:
+            print(f"Worker broker at {args.connect} unavailable ({e}); retrying in 5s")
+            time.sleep(5)
+
+
+if __name__ == "__main__":
+    main()